@@ -0,0 +1,109 @@
+"""Counters behind /api/list_files.
+
+Every condition of the api (years, months, ...) is kept up to date one
+image at a time, so answering a request only copies the buckets.
+"""
+import os
+import json
+from .catalog import IMAGE_FOLDER, parse_path
+
+AGGREGATES_SNAPSHOT = os.path.join(IMAGE_FOLDER, 'aggregates.json')
+CONDITIONS = ('years', 'months', 'days', 'year_month', 'hours',
+              'detected_objects', 'tracking_objects')
+
+
+def _increment(accu, key, step):
+    value = accu.get(key, 0) + step
+    if value > 0:
+        accu[key] = value
+    else:
+        accu.pop(key, None)
+
+
+class Aggregates():
+    """Per condition counts of the indexed images.
+
+    The catalog is the source of truth: ``sync`` folds the images indexed
+    since the last call and ``remove`` is called when an image is deleted.
+    The counts are snapshotted to disk so a restart doesn't scan the archive.
+    """
+
+    def __init__(self, snapshot_path=AGGREGATES_SNAPSHOT):
+        self.snapshot_path = snapshot_path
+        self.reset()
+        self.load()
+
+    def reset(self, generation=None, catalog_id=None):
+        self.generation = generation
+        self.catalog_id = catalog_id
+        self.last_id = 0
+        self.counts = {condition: dict() for condition in CONDITIONS}
+
+    def load(self):
+        if not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path) as snapshot:
+                data = json.load(snapshot)
+            self.generation = data['generation']
+            # missing from the older snapshots, which are synced again
+            self.catalog_id = data.get('catalog_id')
+            self.last_id = data['last_id']
+            self.counts.update(data['counts'])
+        except (ValueError, KeyError) as e:
+            print('Ignoring aggregates snapshot:', e)
+            self.reset()
+
+    def save(self):
+        directory = os.path.dirname(self.snapshot_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w') as snapshot:
+            json.dump(dict(generation=self.generation,
+                           catalog_id=self.catalog_id, last_id=self.last_id,
+                           counts=self.counts), snapshot)
+        os.replace(tmp_path, self.snapshot_path)
+
+    def update(self, item, step=1):
+        """Apply a parsed image (see ``catalog.parse_path``) to every
+        condition, ``step=-1`` removes it."""
+        counts = self.counts
+        _increment(counts['years'], item['year'], step)
+        _increment(counts['months'], item['month'], step)
+        _increment(counts['days'], item['day'], step)
+        _increment(counts['hours'], item['hour'], step)
+        months = counts['year_month'].setdefault(item['year'], dict())
+        _increment(months, item['month'], step)
+        if not months:
+            del counts['year_month'][item['year']]
+        for name in item['objects']:
+            _increment(counts['detected_objects'], name, step)
+        for object_id in item['tracking']:
+            _increment(counts['tracking_objects'], str(object_id), step)
+
+    def sync(self, catalog):
+        """Fold the images indexed since the last sync."""
+        generation = catalog.generation()
+        catalog_id = catalog.catalog_id()
+        if (generation, catalog_id) != (self.generation, self.catalog_id):
+            # the catalog was rebuilt or created anew, ids restart from
+            # scratch
+            self.reset(generation, catalog_id)
+        rows = catalog.since(self.last_id)
+        for image_id, path in rows:
+            item = parse_path(path)
+            if item is not None:
+                self.update(item)
+            self.last_id = image_id
+        if rows:
+            self.save()
+
+    def remove(self, path):
+        item = parse_path(path)
+        if item is not None:
+            self.update(item, step=-1)
+            self.save()
+
+    def get(self, condition):
+        return self.counts[condition]
@@ -0,0 +1,183 @@
+"""Serving the WSGI app from an asyncio event loop.
+
+The development server of Flask gives each request a thread, a request
+waiting for a camera frame or a forward pass holds it until the end. Under
+an ASGI server the requests are coroutines and only their blocking steps
+run in executors: ``io`` for waits and WSGI requests, ``cpu`` sized to the
+cores for inference and encoding, so one process serves many clients and
+the model never runs more than ``cpu`` times at once. The MJPEG streams
+wait for their frames in ``streams``, the viewers past its size queue
+there instead of taking the threads of the other requests.
+"""
+import os
+import sys
+import asyncio
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+
+IO_WORKERS = 64
+STREAM_WORKERS = 32
+STREAMING = 'multipart/x-mixed-replace'
+
+io = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix='io')
+cpu = ThreadPoolExecutor(max_workers=os.cpu_count() or 1,
+                         thread_name_prefix='cpu')
+streams = ThreadPoolExecutor(max_workers=STREAM_WORKERS,
+                             thread_name_prefix='stream')
+
+
+def offload(executor, function, *args):
+    """Run ``function(*args)`` in ``executor`` from a coroutine."""
+    return asyncio.get_event_loop().run_in_executor(executor, function, *args)
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body', False):
+            return body
+
+
+def environ(scope, body):
+    """WSGI environ of an ASGI http request."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode(
+            'latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('ascii'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'REMOTE_ADDR': client[0],
+        'SERVER_PROTOCOL': 'HTTP/{}'.format(scope['http_version']),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin1').upper().replace('-', '_')
+        value = value.decode('latin1')
+        if name == 'CONTENT_TYPE' or name == 'CONTENT_LENGTH':
+            environ[name] = value
+            continue
+        name = 'HTTP_' + name
+        if name in environ:
+            value = environ[name] + ',' + value
+        environ[name] = value
+    return environ
+
+
+def response_start(status, headers):
+    return {'type': 'http.response.start', 'status': status,
+            'headers': [(name.encode('latin1'), value.encode('latin1'))
+                        for name, value in headers]}
+
+
+async def send_response(send, status, headers, body=b''):
+    await send(response_start(status, headers))
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class WsgiApp():
+    """ASGI app running a WSGI app in the ``io`` executor.
+
+    Each chunk of a streamed response is waited for in the executor, so a
+    stream only holds a thread while a chunk is on its way. The chunks of
+    the MJPEG streams, which wait for the camera, are read in the
+    ``stream_executor`` instead. The stream is closed when the client
+    disconnects.
+    """
+
+    def __init__(self, wsgi_app, executor=io, stream_executor=streams):
+        self.wsgi_app = wsgi_app
+        self.executor = executor
+        self.stream_executor = stream_executor
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await lifespan(receive, send)
+        body = await read_body(receive)
+        response = dict()
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = headers
+
+        chunks = await offload(
+                self.executor, self._start, environ(scope, body),
+                start_response, response)
+        executor = self.executor
+        if streaming(response['headers']):
+            executor = self.stream_executor
+        disconnected = asyncio.ensure_future(wait_disconnect(receive))
+        try:
+            await send(response_start(response['status'],
+                                      response['headers']))
+            while not disconnected.done():
+                chunk = await offload(executor, next, chunks, None)
+                if chunk is None:
+                    break
+                await send({'type': 'http.response.body', 'body': chunk,
+                            'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+            await offload(executor, chunks.close)
+
+    def _start(self, environ, start_response, response):
+        chunks = iter(self.wsgi_app(environ, start_response))
+        first = None
+        if 'status' not in response:
+            # the status is known once the first chunk is produced
+            first = next(chunks, None)
+        return Chained(first, chunks)
+
+
+class Chained():
+    """Iterator of the response chunks, the first one already read."""
+
+    def __init__(self, first, chunks):
+        self.first = first
+        self.chunks = chunks
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.first is not None:
+            first, self.first = self.first, None
+            return first
+        return next(self.chunks)
+
+    def close(self):
+        if hasattr(self.chunks, 'close'):
+            self.chunks.close()
+
+
+def streaming(headers):
+    return any(name.lower() == 'content-type' and value.startswith(STREAMING)
+               for name, value in headers)
+
+
+async def wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
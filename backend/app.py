@@ -1,26 +1,25 @@
 #!/usr/bin/env python3
 import os
 import re
-import glob
-import cv2
 import json
 import yaml
-import pandas as pd
-from functools import reduce
-from importlib import import_module
-from itertools import islice
+import threading
+from collections.abc import Mapping
 from dotenv import load_dotenv
 from datetime import datetime
 from multiprocessing import Process
 from flask import Flask, Response, send_from_directory, request, Blueprint, abort
-from .utils import (reduce_year, reduce_year_month, reduce_month,
-        reduce_day, reduce_year, reduce_hour, reduce_object, reduce_tracking,
-        img_to_base64)
-from .camera import Camera
-
-with open("config.yml", "r") as yamlfile:
-    config = yaml.load(yamlfile, Loader=yaml.FullLoader)
-    jobs = dict()
+from .utils import img_to_base64
+from .inference import InferenceService
+from .dnn import ModelSpec
+from .stream import MIMETYPE
+from .catalog import Catalog, split_values
+from .aggregates import Aggregates, CONDITIONS
+from .thumbnails import ThumbnailCache
+from .metrics import registry as metrics
+from .config import get_config
+
+jobs = dict()
 
 WIDTH = 320
 HEIGHT = 240
@@ -32,18 +31,92 @@ else:
     PORT=5000
 
 folder_regex = re.compile('imgs/webcam|imgs/pi')
-
-cameras = dict()
-for camera_config in config['cameras']:
-    cameras[camera_config['name']] = Camera(camera_config)
+catalog = Catalog()
+aggregates = Aggregates()
+thumbnails = ThumbnailCache()
+
+inference = None
+multiplexer = None
+services_lock = threading.Lock()
+
+
+def model_specs():
+    """Distinct models of the config, the global one and the cameras'."""
+    config = get_config()
+    models = [config['model']] + [
+        camera_config['model'] for camera_config in config['cameras']
+        if 'model' in camera_config]
+    return list(dict.fromkeys(map(ModelSpec.parse, models)))
+
+
+def inference_service():
+    """Shared inference process, started on first use when enabled."""
+    global inference
+    config = get_config()
+    with services_lock:
+        if inference is None and config.get('inference_service'):
+            # load the models once and share them with every task
+            inference = InferenceService(model_specs())
+            inference.start()
+    return inference
+
+
+class Cameras(Mapping):
+    """Cameras of the config, each one opened on first use.
+
+    The camera module, OpenCV and the capture devices are only loaded when
+    a route or a task needs a camera, so the gallery starts without them.
+    """
+
+    def __init__(self):
+        self.opened = dict()
+        self.lock = threading.Lock()
+
+    def configs(self):
+        return {camera_config['name']: camera_config
+                for camera_config in get_config()['cameras']}
+
+    def __getitem__(self, name):
+        with self.lock:
+            if name not in self.opened:
+                camera_config = self.configs()[name]
+                from .camera import Camera
+                camera = Camera(camera_config, get_config())
+                if camera.shared_capture:
+                    camera.start_shared_capture()
+                if inference_service() is not None:
+                    camera.inference = inference_service().client()
+                self.opened[name] = camera
+            return self.opened[name]
+
+    def __contains__(self, name):
+        return name in self.configs()
+
+    def __iter__(self):
+        return iter(self.configs())
+
+    def __len__(self):
+        return len(self.configs())
+
+
+cameras = Cameras()
+
+
+def fair_multiplexer():
+    """Turns of the cameras in the multiplexed detection task."""
+    global multiplexer
+    from .camera import fair_scheduler
+    opened = list(cameras.values())
+    with services_lock:
+        if multiplexer is None:
+            multiplexer = fair_scheduler(opened)
+    return multiplexer
 
 if os.getenv('BASEURL') and os.getenv('BASEURL') is not None:
     BASEURL=os.getenv('BASEURL').replace('\\', '')
 else:
     BASEURL='/'
 
-app = Flask(__name__)
-
 # static html
 blueprint_html = Blueprint('html', __name__, url_prefix=BASEURL)
 
@@ -51,7 +124,6 @@ blueprint_html = Blueprint('html', __name__, url_prefix=BASEURL)
 @blueprint_html.route('/<path:filename>')
 def show_pages(filename):
     return send_from_directory('../dist', filename)
-app.register_blueprint(blueprint_html)
 
 # API
 blueprint_api = Blueprint('api', __name__, url_prefix=BASEURL)
@@ -63,21 +135,12 @@ def image_preview(filename):
     date = request.args.get('date', None)
 
     try:
-        im = cv2.imread(os.path.join(IMAGE_FOLDER, filename))
-        if w and h:
-            w, h = int(w), int(h)
-            im = cv2.resize(im, (w, h))
-        elif date:
-            date = (datetime
-                    .strptime(date, "%Y%m%d_%H%M%S")
-                    .strftime("%d %b %-H:%M")
-                    )
-            img_h, img_w = im.shape[:-1]
-            cv2.putText(
-                    im, "{}".format(date), (0, int(img_h*0.98)),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-        return Response(cv2.imencode('.jpg', im)[1].tobytes(),
-                        mimetype='image/jpeg')
+        if (w and h) or date:
+            return Response(
+                    thumbnails.get(os.path.join(IMAGE_FOLDER, filename),
+                                   w=w, h=h, date=date),
+                    mimetype='image/jpeg')
+        return send_from_directory('../' + IMAGE_FOLDER, filename)
 
     except Exception as e:
         print(e)
@@ -87,9 +150,16 @@ def image_preview(filename):
 
 @blueprint_api.route('/api/delete', methods=['POST'])
 def delete_image():
+    from .recorder import clip_path
     filename = request.form.get('filename', None)
     try:
         os.remove(filename)
+        if os.path.exists(clip_path(filename)):
+            os.remove(clip_path(filename))
+        thumbnails.invalidate(filename)
+        aggregates.sync(catalog)
+        if catalog.remove(filename):
+            aggregates.remove(filename)
         return json.dumps({'status': filename})
     except Exception as e:
         print(e)
@@ -110,81 +180,29 @@ def get_data(item):
     else:
         return dict(path=item)
 
-def get_range(units, digit_number):
-    dec = []
-    for digit in range(digit_number):
-        dec.append(set())
-    for digit_candidate in str(units).split(","):
-        if len(digit_candidate) == digit_number:
-            for digit in range(digit_number):
-                dec[digit].add(digit_candidate[digit])
-        else:
-            for digit in range(digit_number):
-                if digit == (digit_number - 1):
-                    dec[digit].add(digit_candidate)
-                else:
-                    dec[digit].add("0")
-    return "".join(["[" + "".join(x) + "]" for x in dec])
-
 @blueprint_api.route('/api/images')
 def api_images():
     page = int(request.args.get('page', 0))
     page_size = int(request.args.get('page_size', 16))
     mydate = request.args.get('date', None)
-    myyear = request.args.get('years', "????")
-    mymonth = request.args.get('months', "??")
-    myday = request.args.get('days', "??")
-    myhour = request.args.get('hours', "??")
-    myminutes = request.args.get('minutes', "??")
-    mydetection = request.args.get('detected_object', "*")
+    date = None
     if mydate is not None:
         date = (datetime
                   .strptime(mydate, "%d/%m/%Y")
                   .strftime("%Y%m%d")
                   )
-    else:
-        if myyear != "????":
-            if myyear:
-                myyear = get_range(myyear, 4)
-            else:
-                myyear = "????"
-
-        if mymonth != "??":
-            if mymonth:
-                mymonth = get_range(mymonth, 2)
-            else:
-                mymonth = "??"
-
-        if myday != "??":
-            if myday:
-                myday = get_range(myday, 2)
-            else:
-                myday = "??"
-
-        date = f"{myyear}{mymonth}{myday}"
-
-    if myhour != "??":
-        if myhour:
-            myhour = get_range(myhour, 2)
-        else:
-            myhour = "??"
-
-    if myminutes != "??":
-        if myminutes:
-            myminutes = get_range(myminutes, 2)
-        else:
-            myminutes = "??"
-
-    mypath = os.path.join(
-                          IMAGE_FOLDER,
-                          '*',
-                          f'{date}',
-                          f'{myhour.zfill(2)}{myminutes}??*{mydetection}*.jpg').replace('***', '*')
-    myiter = glob.iglob(mypath, recursive=True)
-    start = page * page_size
-    end = (page + 1) * page_size
-    result = [get_data(i) for i in islice(myiter, start, end)]
-    print('->> Start', start, 'end', end, 'len', len(result))
+    images = catalog.query(
+            page=page,
+            page_size=page_size,
+            date=date,
+            years=split_values(request.args.get('years', ''), 4),
+            months=split_values(request.args.get('months', ''), 2),
+            days=split_values(request.args.get('days', ''), 2),
+            hours=split_values(request.args.get('hours', ''), 2),
+            minutes=split_values(request.args.get('minutes', ''), 2),
+            detected_object=request.args.get('detected_object', None),
+            )
+    result = [get_data(i) for i in images]
     return dict(page=page, page_size=page_size, images=result)
 
 
@@ -196,41 +214,59 @@ def single_image():
     frame = None
     if camera_name:
         frame = cameras[camera_name].get_frame()
+    return single_image_body(camera_name, frame, detection, tracking)
+
+def single_image_body(camera_name, frame, detection, tracking):
+    """Annotate and encode the frame of /api/single_image, shared with the
+    ASGI route."""
+    if frame is None:
+        # no camera, or no frame from it in time
+        return dict(msg='no image')
     if detection == 'true':
         frame = cameras[camera_name].prediction(frame, conf_th=0.3, conf_class=[])
     elif tracking == 'true':
         frame = cameras[camera_name].object_track(frame, conf_th=0.5, conf_class=[1])
-    if frame is not None:
-        return json.dumps(dict(img=img_to_base64(frame),
-                          width=WIDTH,
-                          height=HEIGHT))
-    else:
-        return dict(msg='no image')
-
-myconditions = dict(
-        years=reduce_year,
-        months=reduce_month,
-        days=reduce_day,
-        year_month=reduce_year_month,
-        hours=reduce_hour,
-        detected_objects=reduce_object,
-        tracking_objects=reduce_tracking,
-        )
+    return json.dumps(dict(img=img_to_base64(frame),
+                      width=WIDTH,
+                      height=HEIGHT))
 
+@blueprint_api.route('/api/stream')
+def stream():
+    camera_name = request.args.get('cameraName', None)
+    detection = request.args.get('detection', 'false')
+    tracking = request.args.get('tracking', 'false')
+    if camera_name not in cameras:
+        return abort(404)
+    camera = cameras[camera_name]
+    if detection == 'true':
+        chunks = camera.overlay_stream('detection', camera.keepalive)
+    elif tracking == 'true':
+        chunks = camera.overlay_stream('tracking', camera.keepalive)
+    else:
+        chunks = camera.stream.subscribe(keepalive=camera.keepalive)
+    return Response(chunks, mimetype=MIMETYPE)
 
 @blueprint_api.route('/api/list_files')
 def list_folder():
     condition = request.args.get('condition', 'years')
-    myiter = glob.iglob(os.path.join(IMAGE_FOLDER, '**', '*.jpg'),
-                        recursive=True)
-    newdict = reduce(lambda a, b: myconditions[condition](a,b), myiter, dict())
-    # year = item.split('/')[2][:4]
-    # month = item.split('/')[2][4:6]
-    # day = item.split('/')[2][6:8]
-    # hour = item.split('/')[3][:2]
-    # minutes = item.split('/')[3][2:4]
-    # return json.dumps({k: v for k, v in sorted(newdict.items(), key=lambda item: item[1], reverse=True)})
-    return newdict
+    if condition not in CONDITIONS:
+        return abort(404)
+    aggregates.sync(catalog)
+    return aggregates.get(condition)
+
+def preload_models():
+    """Load the models in the web server before forking a task, when
+    enabled and the tasks don't use the inference service."""
+    config = get_config()
+    if config.get('preload_models') and inference_service() is None:
+        from .preload import preload
+        preload(model_specs())
+
+def task_inference():
+    """Own inference client of a task process, None without service."""
+    if inference_service() is None:
+        return None
+    return inference_service().client()
 
 @blueprint_api.route('/api/task/start')
 def task_launch():
@@ -243,8 +279,39 @@ def task_launch():
     job_name = f"{camera_name}_{task_name}"
     if job_name in jobs and jobs[job_name].is_alive():
         return dict(msg="Task already running")
-    if task_name == 'tracking':
-        jobs[job_name] = Process(target=cameras[camera_name].ObjectTracking)
+    from .camera import PeriodicBatchCapture, MultiplexedDetection, run_task
+    preload_models()
+    if task_name == 'detection' and camera_name == 'all':
+        # a single detector predicting the frames of every camera at once
+        jobs[job_name] = Process(target=PeriodicBatchCapture,
+                                 args=(list(cameras.values()),),
+                                 name=job_name)
+        jobs[job_name].start()
+        jobs[job_name].date = datetime.today().strftime('%Y-%m-%d %H:%M:%S')
+        return dict(
+            running=jobs[job_name].is_alive(),
+            pid=jobs[job_name].pid,
+            name=jobs[job_name].name,
+            date=jobs[job_name].date
+            )
+    elif task_name == 'multiplex' and camera_name == 'all':
+        # a single detector serving the cameras in turn
+        jobs[job_name] = Process(target=MultiplexedDetection,
+                                 args=(list(cameras.values()),
+                                       fair_multiplexer(), task_inference()),
+                                 name=job_name)
+        jobs[job_name].start()
+        jobs[job_name].date = datetime.today().strftime('%Y-%m-%d %H:%M:%S')
+        return dict(
+            running=jobs[job_name].is_alive(),
+            pid=jobs[job_name].pid,
+            name=jobs[job_name].name,
+            date=jobs[job_name].date
+            )
+    elif task_name == 'tracking':
+        jobs[job_name] = Process(target=run_task, args=(
+            cameras[camera_name], 'ObjectTracking', task_inference()),
+            name=job_name)
         jobs[job_name].start()
         jobs[job_name].date = datetime.today().strftime('%Y-%m-%d %H:%M:%S')
         return dict(
@@ -254,7 +321,9 @@ def task_launch():
             date=jobs[job_name].date
             )
     elif task_name == 'detection':
-        jobs[job_name] = Process(target=cameras[camera_name].PeriodicCaptureContinous)
+        jobs[job_name] = Process(target=run_task, args=(
+            cameras[camera_name], 'PeriodicCaptureContinous', task_inference()),
+            name=job_name)
         jobs[job_name].start()
         jobs[job_name].date = datetime.today().strftime('%Y-%m-%d %H:%M:%S')
         return dict(
@@ -330,22 +399,101 @@ def task_jobs():
         'end': job.end
         } for job_name,job in jobs.items()])
 
+@blueprint_api.route('/api/inference')
+def inference_stats():
+    # polled, so it reports on the service without starting it
+    if not get_config().get('inference_service'):
+        return dict(msg="Inference service is disabled")
+    if inference is None:
+        return dict(msg="Inference service is not started")
+    return dict(models=dict(inference.stats))
+
+@blueprint_api.route('/api/preload')
+def preload_stats():
+    """Load and warm up time of the preloaded models, and the memory of
+    the web server and of each running task, shared with the web server
+    when the models are preloaded."""
+    from .preload import timings, memory
+    return dict(
+            models=timings,
+            server=memory(os.getpid()),
+            tasks={job_name: memory(job.pid)
+                   for job_name, job in jobs.items() if job.is_alive()})
+
+@blueprint_api.route('/api/motion_gate')
+def motion_gate_stats():
+    """Frames skipped by the motion gate of each camera versus the frames
+    that went through the model, the cameras not opened yet have none."""
+    with cameras.lock:
+        opened = dict(cameras.opened)
+    stats = {name: dict(msg="Camera is not started")
+             for name in cameras if name not in opened}
+    stats.update({name: camera.motion_gate.stats()
+                  for name, camera in opened.items()
+                  if camera.motion_gate is not None})
+    return stats
+
+@blueprint_api.route('/api/storage')
+def storage_stats():
+    """Images written and dropped by the storage writer of each camera,
+    the cameras not opened yet have written none."""
+    with cameras.lock:
+        opened = dict(cameras.opened)
+    return {name: opened[name].storage.stats() if name in opened
+            else dict(msg="Camera is not started") for name in cameras}
+
+@blueprint_api.route('/api/scheduler')
+def scheduler_stats():
+    """Effective beat rate, current interval and load of each camera,
+    the cameras not opened yet have no running task."""
+    with cameras.lock:
+        opened = dict(cameras.opened)
+    return {name: opened[name].scheduler.stats() if name in opened
+            else dict(msg="Camera is not started") for name in cameras}
+
+@blueprint_api.route('/api/multiplex')
+def multiplex_stats():
+    """Achieved fps, wait before each turn and missed deadlines of each
+    camera in the multiplexed detection task."""
+    if multiplexer is None:
+        return dict(msg="Multiplex task is not started")
+    return multiplexer.stats()
+
+@blueprint_api.route('/api/metrics')
+def prometheus_metrics():
+    """Metrics of the web server and of the task processes."""
+    return Response(metrics.render(),
+                    mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 @blueprint_api.route('/api/config')
 def read_config():
-    return config
+    return get_config()
 
 @blueprint_api.route('/api/config/write')
 def write_config():
     with open('data.yml', 'w') as outfile:
-        yaml.dump(config, outfile, default_flow_style=False)
+        yaml.dump(get_config(), outfile, default_flow_style=False)
     return dict(msg="ok")
 
-app.register_blueprint(blueprint_api)
+
+def create_app():
+    """Flask app of the gallery, the camera streams and the tasks.
+
+    Nothing is opened here, the config, the cameras and the models are
+    loaded by the first request needing them.
+    """
+    app = Flask(__name__)
+    app.register_blueprint(blueprint_html)
+    app.register_blueprint(blueprint_api)
+    return app
+
+
+app = create_app()
 
 if __name__ == '__main__':
     app.run(
             host='0.0.0.0',
             debug=bool(os.getenv('DEBUG')),
-            threaded=False,
+            threaded=True,
             port=PORT
             )
@@ -0,0 +1,48 @@
+"""ASGI entry point of the web server.
+
+    uvicorn backend.asgi:app --host 0.0.0.0 --port 5000
+
+The routes and the BASEURL prefix are the ones of the Flask app, which
+serves every request but /api/single_image from the ``io`` executor. That
+route is a coroutine waiting for the camera in the ``io`` executor and
+running the model and the JPEG encoding in the ``cpu`` one, so slow
+detections no longer hold back the gallery and the task polls.
+"""
+import os
+import json
+from urllib.parse import parse_qs
+from .aio import WsgiApp, offload, read_body, send_response, io, cpu
+from .app import app as flask_app, cameras, single_image_body, BASEURL
+
+SINGLE_IMAGE = os.path.join(BASEURL, 'api/single_image')
+
+
+class App(WsgiApp):
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == SINGLE_IMAGE:
+            args = {key: values[-1] for key, values in
+                    parse_qs(scope['query_string'].decode()).items()}
+            camera_name = args.get('cameraName')
+            if camera_name is None or camera_name in cameras:
+                await read_body(receive)
+                return await self.single_image(send, camera_name, args)
+        return await super().__call__(scope, receive, send)
+
+    async def single_image(self, send, camera_name, args):
+        frame = None
+        if camera_name:
+            frame = await offload(io, cameras[camera_name].get_frame)
+        body = await offload(
+                cpu, single_image_body, camera_name, frame,
+                args.get('detection', 'false'), args.get('tracking', 'false'))
+        if isinstance(body, dict):
+            content_type = 'application/json'
+            body = json.dumps(body)
+        else:
+            content_type = 'text/html; charset=utf-8'
+        await send_response(send, 200, [('content-type', content_type)],
+                            body.encode())
+
+
+app = App(flask_app)
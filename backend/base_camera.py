@@ -1,85 +1,59 @@
 import time
 import threading
-try:
-    from greenlet import getcurrent as get_ident
-except ImportError:
-    try:
-        from thread import get_ident
-    except ImportError:
-        from _thread import get_ident
-
-
-class CameraEvent(object):
-    """An Event-like class that signals all active clients when a new frame is
-    available.
-    """
-    def __init__(self):
-        self.events = {}
-
-    def wait(self):
-        """Invoked from each client's thread to wait for the next frame."""
-        ident = get_ident()
-        if ident not in self.events:
-            # this is a new client
-            # add an entry for it in the self.events dict
-            # each entry has two elements, a threading.Event() and a timestamp
-            self.events[ident] = [threading.Event(), time.time()]
-        return self.events[ident][0].wait()
-
-    def set(self):
-        """Invoked by the camera thread when a new frame is available."""
-        now = time.time()
-        remove = None
-        for ident, event in self.events.items():
-            if not event[0].isSet():
-                # if this client's event is not set, then set it
-                # also update the last set timestamp to now
-                event[0].set()
-                event[1] = now
-            else:
-                # if the client's event is already set, it means the client
-                # did not process a previous frame
-                # if the event stays set for more than 5 seconds, then assume
-                # the client is gone and remove it
-                if now - event[1] > 5:
-                    remove = ident
-        if remove:
-            del self.events[remove]
-
-    def clear(self):
-        """Invoked from each client's thread after a frame was processed."""
-        self.events[get_ident()][0].clear()
+import cv2
+from .channel import FrameChannel
+from .stream import FrameBroadcast
 
 
 class BaseCamera(object):
     thread = None  # background thread that reads frames from camera
     frame = None  # current frame is stored here by background thread
+    frame_timestamp = None  # capture time of the frame, set by the source
     last_access = 0  # time of last client access to the camera
-    event = CameraEvent()
 
-    def launch_thread(self):
+    def __init__(self):
+        # frames of this camera only, numbered for the waiting clients
+        self.channel = FrameChannel()
+        # raw frames encoded once for every streaming client
+        self.stream = FrameBroadcast()
+        # a single background thread however many clients start it at once
+        self.thread_lock = threading.Lock()
+
+    def launch_thread(self, timeout=10):
         """Start the background camera thread if it isn't running yet."""
-        if self.thread is None:
+        with self.thread_lock:
+            if self.thread is not None:
+                return
             self.last_access = time.time()
+            seq = self.channel.seq
 
             # start background frame thread
             self.thread = threading.Thread(target=self._thread)
             self.thread.start()
 
-            # wait until frames are available
-            while self.get_frame() is None:
-                time.sleep(0)
+        # wait until frames are available
+        self.channel.wait_newer(seq, timeout=timeout)
 
-    def get_frame(self):
-        """Return the current camera frame."""
+    def get_frame(self, timeout=10):
+        """Return the next camera frame."""
         self.launch_thread()
         self.last_access = time.time()
 
-        # wait for a signal from the camera thread
-        self.event.wait()
-        self.event.clear()
+        # wait for the camera thread to publish a frame we haven't seen
+        return self.channel.next_frame(timeout)
+
+    def get_frame_info(self, timeout=10):
+        """Return the newest frame, its capture timestamp and the number of
+        frames the calling thread missed since its previous call."""
+        self.launch_thread(timeout)
+        self.last_access = time.time()
+        return self.channel.next_frame_info(timeout)
 
-        return self.frame
+    def keepalive(self):
+        """Keep the camera thread running for a client that doesn't call
+        get_frame, like a streaming viewer."""
+        self.launch_thread()
+        self.last_access = time.time()
 
     @staticmethod
     def frames():
@@ -95,16 +69,24 @@ class BaseCamera(object):
         """Camera background thread."""
         print('Starting camera thread.')
         frames_iterator = self.frames()
-        for frame in frames_iterator:
-            self.frame = frame
-            self.event.set()  # send signal to clients
-            time.sleep(0)
-
-            # if there hasn't been any clients asking for frames in
-            # the last 10 seconds then stop the thread
-            if time.time() - self.last_access > 10:
-                frames_iterator.close()
-                self.release()
-                print('Stopping camera thread due to inactivity.')
-                break
-        self.thread = None
+        try:
+            for frame in frames_iterator:
+                self.frame = frame
+                # send signal to clients
+                self.channel.publish(frame, self.frame_timestamp)
+                if self.stream.viewers > 0:
+                    self.stream.publish(
+                            cv2.imencode('.jpg', frame)[1].tobytes())
+
+                # if there hasn't been any clients asking for frames in
+                # the last 10 seconds then stop the thread
+                if time.time() - self.last_access > 10:
+                    print('Stopping camera thread due to inactivity.')
+                    break
+        finally:
+            # also when the source ended or failed, so that the next
+            # client starts the camera again
+            frames_iterator.close()
+            self.release()
+            with self.thread_lock:
+                self.thread = None
@@ -3,29 +3,82 @@ import io
 import cv2
 import glob
 import time
-import yaml
+import threading
 import numpy as np
 from functools import reduce
-from importlib import import_module
+from multiprocessing import Process, current_process
 from datetime import datetime, timedelta
 from .centroidtracker import CentroidTracker
 from .base_camera import BaseCamera
+from .stream import FrameBroadcast
+from .catalog import Catalog
+from .thumbnails import ThumbnailCache
+from .overlay import Overlay, detections_overlay, PALETTE, GREEN
+from .framebuffer import FrameRing, SLOTS, shared_memory
+from .grabber import FrameGrabber
+from .motion import MotionGate
+from .regions import Regions
+from .storage import StorageWriter
+from .recorder import EventRecorder, clip_path
+from .scheduler import BeatScheduler, CpuBudget, FairScheduler
+from .metrics import registry as metrics
+from .preload import get_detector, first_detection, preloaded
+from .dnn import ModelSpec
 from .utils import reduce_tracking, gstreamer_pipeline
-
-with open("config.yml", "r") as yamlfile:
-    config = yaml.load(yamlfile, Loader=yaml.FullLoader)
+from .config import get_config
 
 IMAGE_FOLDER = "imgs"
+SAVED_CLASSES = 'person|bird|cat|wine glass|cup|sandwich'
+# seconds the multiplex task waits for a frame of a camera, and sits the
+# camera out after it failed
+MULTIPLEX_TIMEOUT = 1
+MULTIPLEX_RETRY = 5
+catalog = Catalog()
+thumbnails = ThumbnailCache()
+# load of every camera task, bounded by scheduler: cpu_budget
+budget = None
+
+
+def cpu_budget():
+    """Budget shared by the tasks, created with the first camera so the
+    forked tasks inherit it."""
+    global budget
+    if budget is None:
+        settings = get_config().get('scheduler') or {}
+        budget = CpuBudget(settings.get('cpu_budget'))
+    return budget
+
+
+def scheduler_settings(config, camera_config=None):
+    """Settings of the beat scheduler, the camera overriding the global
+    scheduler section."""
+    settings = dict(config.get('scheduler') or {})
+    if camera_config is not None:
+        settings.update(camera_config.get('scheduler') or {})
+    settings.pop('cpu_budget', None)
+    return settings
+
 
 class Camera(BaseCamera):
     # default value
     video_source = 0
     rotation = None
     detector = None
+    inference = None  # client of the shared inference service
     camera = None
     ct = None
+    motion_gate = None
+    recorder = None
+    since_detection = None  # frames since the last detection
+    task_started = None  # until the first detection of the task
 
-    def __init__(self, camera_config):
+    def __init__(self, camera_config, config=None):
+        super().__init__()
+        self.config = get_config() if config is None else config
+        # annotated streams, one producer thread per overlay mode
+        self.overlays = dict()
+        self.overlays_lock = threading.Lock()
+        self.detector_lock = threading.Lock()
         if 'source' in camera_config:
             self.video_source = camera_config['source']
         if 'rotation' in camera_config:
@@ -36,22 +89,84 @@ class Camera(BaseCamera):
             self.frames = self.frames_jetson
         else:
             self.frames = self.frames_pc
+        self.name = camera_config.get('name', str(self.video_source))
+        # detector module and settings, the camera's or the global ones
+        self.model = ModelSpec.parse(
+                camera_config.get('model', self.config['model']))
+        # confidence threshold of the model settings, over the previews' own
+        self.conf_th = dict(self.model.settings).get('conf_th')
+        # grab the frames of live sources ahead, only the newest is decoded
+        self.latest_frame = camera_config.get('latest_frame', False)
+        self.shared_capture = camera_config.get('shared_capture', False)
+        if self.shared_capture and shared_memory is None:
+            print('{}: shared_capture needs python 3.8 or newer, each '
+                  'process reads the device.'.format(self.name))
+            self.shared_capture = False
+        if self.shared_capture:
+            # the device is read by a single capture process, every other
+            # process reads its frames from shared memory
+            self.device_frames = self.frames
+            self.frames = self.frames_shared
+        # images are encoded and written by a thread of each task process
+        self.storage = StorageWriter(camera=self.name,
+                                     **self.config.get('storage', {}))
+        if 'recorder' in self.config:
+            # events are recorded as clips with a poster image
+            self.recorder = EventRecorder(**(self.config['recorder'] or {}))
+        # model inputs, crops of the frame with the masked areas blacked out
+        self.regions = Regions(camera_config.get('roi'),
+                               camera_config.get('mask'))
+        if 'motion_gate' in camera_config:
+            # only run the model on frames with motion
+            self.motion_gate = MotionGate(**(camera_config['motion_gate'] or {}))
+        # share of the multiplexed detector, see FairScheduler
+        self.priority = camera_config.get('priority', 1)
+        self.max_rate = camera_config.get('max_rate')
+        self.deadline = camera_config.get('deadline')
+        # pace of the tasks, faster while the camera sees something
+        self.scheduler = BeatScheduler(
+                self.name, self.config['beat_interval'], budget=cpu_budget(),
+                **scheduler_settings(self.config, camera_config))
 
     def frames_pc(self):
         if self.camera is None or not self.camera.isOpened():
             self.load_camera()
+        if self.latest_frame:
+            yield from self.frames_latest()
+            return
         while True:
             # read current frame
             _, img = self.camera.read()
+            self.frame_timestamp = time.time()
+            yield self.rotate(img)
 
-            if self.rotation:
-                if self.rotation == 90:
-                    img = cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
-                if self.rotation == 180:
-                    img = cv2.rotate(img, cv2.ROTATE_180)
-                if self.rotation == 270:
-                    img = cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
-            yield img
+    def frames_latest(self):
+        grabber = FrameGrabber(self.camera)
+        dropped = 0
+        try:
+            while True:
+                _, timestamp, img = grabber.read(timeout=10)
+                if img is None:
+                    # ended or stalled, the next client restarts the camera
+                    print('No frames from {}.'.format(self.name))
+                    return
+                self.frame_timestamp = timestamp
+                metrics.inc('dropped_frames_total', grabber.dropped - dropped,
+                            camera=self.name, consumer='capture')
+                dropped = grabber.dropped
+                yield self.rotate(img)
+        finally:
+            grabber.close()
+
+    def rotate(self, img):
+        if self.rotation:
+            if self.rotation == 90:
+                img = cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
+            if self.rotation == 180:
+                img = cv2.rotate(img, cv2.ROTATE_180)
+            if self.rotation == 270:
+                img = cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
+        return img
 
     def frames_pi(self):
         from picamera.array import PiRGBArray
@@ -96,27 +211,134 @@ class Camera(BaseCamera):
 
             yield img
 
+    def frames_shared(self):
+        try:
+            ring = FrameRing.attach(self.ring_name())
+        except RuntimeError as e:
+            print(e)
+            return
+        try:
+            seq = 0
+            while True:
+                seq, timestamp, img = ring.wait_newer(seq, timeout=10)
+                # the slot is reused once the ring wraps around, the
+                # consumers may hold on to the frame longer than that
+                if img is None:
+                    continue
+                frame = img.copy()
+                if ring.is_valid(seq):
+                    self.frame_timestamp = timestamp
+                    yield frame
+        finally:
+            ring.close()
+
+    def ring_name(self):
+        return 'objdet_{}'.format(self.name)
+
+    def start_shared_capture(self):
+        """Start the process reading the device for every consumer."""
+        process = Process(target=self.SharedCapture, daemon=True)
+        process.start()
+        return process
+
+    def SharedCapture(self):
+        """Decode the frames of the device once into the shared ring."""
+        slots = SLOTS
+        if not isinstance(self.shared_capture, bool):
+            slots = int(self.shared_capture)
+        ring = None
+        try:
+            for img in self.device_frames():
+                if ring is None:
+                    ring = FrameRing.create(self.ring_name(), img.shape, slots)
+                ring.write(img, self.frame_timestamp)
+        finally:
+            if ring is not None:
+                ring.close()
 
     def release(self):
+        if self.shared_capture or self.camera is None:
+            return
         if self.video_source == 'picamera':
             self.camera.close()
         else:
             self.camera.release()
 
     def load_detector(self, startID=0):
-        Detector = import_module(f"backend.{config['model']}").Detector
-        self.detector = Detector()
-        self.ct = CentroidTracker(maxDisappeared=50, startID=startID)
+        if self.inference is None:
+            self.detector = get_detector(self.model)
+        tracker = self.config.get('tracker', {})
+        self.ct = CentroidTracker(
+                maxDisappeared=50, startID=startID,
+                maxDistance=tracker.get('max_distance'),
+                metric=tracker.get('metric', 'centroid'))
+
+    def track(self, image, **kwargs):
+        """Detections and tracked objects of a frame.
+
+        With ``detect_every: N`` in the tracker config the model only runs
+        every N frames, or sooner when a track was predicted to move more
+        than ``max_drift`` pixels. On the other frames the tracks follow
+        their estimated velocity and the detections are None.
+        """
+        tracker = self.config.get('tracker', {})
+        if self.since_detection is not None:
+            self.since_detection += 1
+            if (self.since_detection < tracker.get('detect_every', 1)
+                    and self.ct.drift() <= tracker.get('max_drift', np.inf)):
+                return None, self.ct.predict()
+        self.since_detection = 0
+        detections = self.detect(image, **kwargs)
+        return detections, self.ct.update(detections.boxes)
+
+    def tracking_overlay(self):
+        """Overlay of the predicted boxes and ids of the tracks."""
+        overlay = Overlay()
+        _, boxes = self.ct.tracks()
+        overlay.add_boxes(boxes, [GREEN] * len(boxes))
+        overlay.add_tracking(self.ct.objects)
+        return overlay
+
+    def detect(self, image, **kwargs):
+        """Detections of the configured model, ``kwargs`` go to the
+        detector's filter_prediction."""
+        if self.regions:
+            crops, offsets = self.regions.split(image)
+            return self.regions.join(self.detect_crops(crops, **kwargs),
+                                     offsets)
+        if self.inference is not None:
+            return self.inference.detect(self.model, image, **kwargs)
+        output = self.detector.prediction(image)
+        return self.detector.filter_prediction(output, image, **kwargs)
+
+    def detect_crops(self, crops, **kwargs):
+        if not crops:
+            return []
+        if self.inference is not None:
+            return self.inference.detect_batch(self.model, crops,
+                                               **kwargs)
+        outputs = self.detector.predict_batch(crops)
+        return [self.detector.filter_prediction(output, crop, **kwargs)
+                for output, crop in zip(outputs, crops)]
+
+    def detections_overlay(self, detections):
+        if self.detector is not None:
+            return self.detector.overlay(detections)
+        return detections_overlay(detections, PALETTE)
 
     def load_camera(self):
         self.camera = cv2.VideoCapture(self.video_source)
         if not self.camera.isOpened():
             raise RuntimeError('Could not start camera.')
 
-    def CaptureContinous(self):
-        if self.detector is None:
-            self.load_detector()
-        if self.video_source == 'picamera':
+    def capture_image(self, timeout=10):
+        with metrics.timer('stage_seconds', stage='capture', camera=self.name):
+            image = self.read_image(timeout)
+        metrics.inc('frames_total', camera=self.name)
+        return image
+
+    def read_image(self, timeout=10):
+        if self.video_source == 'picamera' and not self.shared_capture:
             WIDTH = 640
             HEIGHT = 480
             with self.PiCamera() as camera:
@@ -125,122 +347,312 @@ class Camera(BaseCamera):
                 camera.framerate = 10
                 with self.PiRGBArray(camera, size=(WIDTH, HEIGHT)) as output:
                     camera.capture(output, 'bgr', resize=(WIDTH, HEIGHT))
-                    image = output.array
-        else:
-            image = self.get_frame()
-        output = self.detector.prediction(image)
-        df = self.detector.filter_prediction(output, image)
-        if len(df) > 0:
-            if (df['class_name']
-                    .str
-                    .contains('person|bird|cat|wine glass|cup|sandwich')
-                    .any()):
+                    return output.array
+        image, timestamp, dropped = self.get_frame_info(timeout)
+        consumer = threading.current_thread().name
+        if consumer == 'MainThread':
+            consumer = current_process().name
+        if timestamp is not None:
+            metrics.observe('frame_age_seconds', time.time() - timestamp,
+                            camera=self.name)
+        if dropped:
+            metrics.inc('dropped_frames_total', dropped, camera=self.name,
+                        consumer=consumer)
+        return image
+
+    def CaptureContinous(self):
+        if self.ct is None:
+            self.load_detector()
+        image = self.capture_image()
+        if image is None:
+            return None
+        if self.motion_gate is not None and not self.motion_gate.allow(image):
+            return None
+        detections = self.detect(image)
+        self.save_detection(image, detections)
+        return detections
+
+    def save_detection(self, image, detections, detector=None):
+        self.count_detections(detections)
+        if len(detections) > 0:
+            classes = SAVED_CLASSES
+            if self.recorder is not None and self.recorder.classes:
+                classes = self.recorder.classes
+            if detections.contains(classes):
                 day = datetime.now().strftime("%Y%m%d")
                 directory = os.path.join(IMAGE_FOLDER, 'webcam', day)
-                if not os.path.exists(directory):
-                    os.makedirs(directory)
-                image = self.detector.draw_boxes(image, df)
-                classes = df['class_name'].unique().tolist()
+                # the writer annotates a copy, the raw frame is shared with
+                # the other clients of the camera
+                if detector is None:
+                    overlay = self.detections_overlay(detections)
+                else:
+                    overlay = detector.overlay(detections)
+                classes = detections.unique_classes()
                 hour = datetime.now().strftime("%H%M%S")
                 filename_output = os.path.join(
                         directory, "{}_{}_.jpg".format(hour, "-".join(classes))
                         )
-                cv2.imwrite(filename_output, image)
+                if self.record(filename_output):
+                    self.save(filename_output, image, overlay)
+
+    def record(self, poster):
+        """Start or extend the event clip, True if the image ``poster``
+        should be stored, that is once per event with the recorder."""
+        if self.recorder is None:
+            return True
+        return self.recorder.trigger(clip_path(poster))
+
+    def start_recorder(self):
+        if self.recorder is not None:
+            self.recorder.start(self.get_frame)
+
+    def count_detections(self, detections):
+        if self.task_started is not None:
+            first_detection(self.name, self.task_started,
+                            self.inference is None
+                            and self.model in preloaded)
+            self.task_started = None
+        names, counts = np.unique(detections.class_name, return_counts=True)
+        for name, count in zip(names.tolist(), counts.tolist()):
+            metrics.inc('detections_total', count, camera=self.name,
+                        **{'class': name})
+
+    def save(self, filename, image, overlay):
+        if not self.storage.submit(filename, image, overlay, self.stored):
+            metrics.inc('dropped_total', camera=self.name)
+
+    def stored(self, filename, image):
+        """Called by the storage writer once an image is on disk."""
+        metrics.inc('saves_total', camera=self.name)
+        catalog.add(filename)
+        self.pregenerate_thumbnails(filename, image)
+
+    def pregenerate_thumbnails(self, filename, image):
+        """Fill the preview cache while the capture is still decoded."""
+        for w, h in self.config.get('thumbnail_sizes', []):
+            thumbnails.get(filename, w=w, h=h, image=image)
 
     def prediction(self, img, conf_th=0.3, conf_class=[]):
-        if self.detector is None:
-            self.load_detector()
-        output = self.detector.prediction(img)
-        df = self.detector.filter_prediction(output, img, conf_th=conf_th, conf_class=conf_class)
-        img = self.detector.draw_boxes(img, df)
-        return img
+        if self.conf_th is not None:
+            conf_th = self.conf_th
+        with self.detector_lock:
+            if self.ct is None:
+                self.load_detector()
+            detections = self.detect(img, conf_th=conf_th, conf_class=conf_class)
+        with metrics.timer('stage_seconds', stage='draw', camera=self.name):
+            return self.detections_overlay(detections).compose(img)
 
     def object_track(self, img, conf_th=0.3, conf_class=[]):
-        if self.detector is None:
-            self.load_detector()
-        output = self.detector.prediction(img)
-        df = self.detector.filter_prediction(output, img, conf_th=conf_th, conf_class=conf_class)
-        img = self.detector.draw_boxes(img, df)
-        boxes = df[['x1', 'y1', 'x2', 'y2']].values
-        objects = self.ct.update(boxes)
-        if len(boxes) > 0 and (df['class_name'].str.contains('person').any()):
-            for (objectID, centroid) in objects.items():
-                text = "ID {}".format(objectID)
-                cv2.putText(img, text, (centroid[0] - 10, centroid[1] - 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-                cv2.circle(img, (centroid[0], centroid[1]), 4, (0, 255, 0), -1)
-        return img
+        if self.conf_th is not None:
+            conf_th = self.conf_th
+        with self.detector_lock:
+            if self.ct is None:
+                self.load_detector()
+            detections, objects = self.track(
+                    img, conf_th=conf_th, conf_class=conf_class)
+            if detections is None:
+                overlay = self.tracking_overlay()
+        if detections is not None:
+            overlay = self.detections_overlay(detections)
+            if len(detections) > 0 and detections.contains('person'):
+                overlay.add_tracking(objects)
+        with metrics.timer('stage_seconds', stage='draw', camera=self.name):
+            return overlay.compose(img)
 
+    def overlay_stream(self, mode, keepalive=None):
+        """Subscribe to the frames annotated by ``mode`` ('detection' or
+        'tracking'), starting their producer if needed."""
+        with self.overlays_lock:
+            if mode not in self.overlays:
+                self.overlays[mode] = FrameBroadcast()
+                threading.Thread(target=self._overlay_thread,
+                                 args=(mode, self.overlays[mode]),
+                                 name='{}_{}'.format(self.name, mode),
+                                 daemon=True).start()
+            # counted as a viewer before the producer can see it idle
+            return self.overlays[mode].subscribe(keepalive=keepalive)
+
+    def _overlay_thread(self, mode, broadcast):
+        """Annotate and encode each frame once for every viewer of an
+        overlay stream."""
+        try:
+            while True:
+                with self.overlays_lock:
+                    # removed with the check, a new viewer either keeps it
+                    # running or starts a new producer
+                    if broadcast.idle_for() >= 10:
+                        del self.overlays[mode]
+                        print('Stopping {} stream due to inactivity.'.format(
+                            mode))
+                        return
+                img = self.get_frame()
+                if img is None:
+                    # no frame in time, the camera thread restarts
+                    continue
+                if mode == 'detection':
+                    img = self.prediction(img, conf_th=0.3, conf_class=[])
+                else:
+                    img = self.object_track(img, conf_th=0.5, conf_class=[1])
+                broadcast.publish(cv2.imencode('.jpg', img)[1].tobytes())
+        except Exception:
+            # the next viewer starts a new producer
+            with self.overlays_lock:
+                del self.overlays[mode]
+            raise
 
     def PeriodicCaptureContinous(self):
-        interval=config['beat_interval']
+        self.start_recorder()
         while True:
-            self.CaptureContinous()
-            time.sleep(interval)
+            detections = self.CaptureContinous()
+            self.scheduler.beat(
+                    active=detections is not None and len(detections) > 0)
 
     def ObjectTracking(self):
-        interval=config['beat_interval']
         if False:
             # search startID
             myiter = glob.iglob(os.path.join(IMAGE_FOLDER, '**', '*.jpg'),
                                 recursive=True)
             newdict = reduce(lambda a, b: reduce_tracking(a,b), myiter, dict())
             startID = max(map(int, newdict.keys()), default=0) + 1
-        if self.detector is None:
+        if self.ct is None:
             self.load_detector()
+        self.start_recorder()
 
         try:
             while True:
-                if self.video_source == 'picamera':
-                    WIDTH = 640
-                    HEIGHT = 480
-                    with self.PiCamera() as camera:
-                        camera.resolution = (1280, 960)  # twice height and widht
-                        camera.rotation = self.rotation
-                        camera.framerate = 10
-                        with self.PiRGBArray(camera, size=(WIDTH, HEIGHT)) as output:
-                            camera.capture(output, 'bgr', resize=(WIDTH, HEIGHT))
-                            img = output.array
-                else:
-                    img = self.get_frame()
-                output = self.detector.prediction(img)
-                df = self.detector.filter_prediction(output, img)
-                img = self.detector.draw_boxes(img, df)
-                boxes = df[['x1', 'y1', 'x2', 'y2']].values
+                img = self.capture_image()
+                if img is None:
+                    self.scheduler.beat()
+                    continue
                 previous_object_ID = self.ct.nextObjectID
-                objects = self.ct.update(boxes)
-                if len(boxes) > 0 and (df['class_name'].str.contains('person').any()) and previous_object_ID in list(objects.keys()):
-                    for (objectID, centroid) in objects.items():
-                        text = "ID {}".format(objectID)
-                        cv2.putText(img, text, (centroid[0] - 10, centroid[1] - 10),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-                        cv2.circle(img, (centroid[0], centroid[1]), 4, (0, 255, 0), -1)
+                detections, objects = self.track(img)
+                if detections is None:
+                    # new objects only come from the detections
+                    self.scheduler.beat(active=len(objects) > 0)
+                    continue
+                self.count_detections(detections)
+                overlay = self.detections_overlay(detections)
+                boxes = detections.boxes
+                if len(boxes) > 0 and detections.contains('person') and previous_object_ID in list(objects.keys()):
+                    overlay.add_tracking(objects)
 
                     day = datetime.now().strftime("%Y%m%d")
                     directory = os.path.join(IMAGE_FOLDER, 'webcam', day)
-                    if not os.path.exists(directory):
-                        os.makedirs(directory)
                     ids = "-".join(list([str(i) for i in objects.keys()]))
                     hour = datetime.now().strftime("%H%M%S")
                     filename_output = os.path.join(
                             directory, "{}_person_{}_.jpg".format(hour, ids)
                             )
-                    cv2.imwrite(filename_output, img)
-                time.sleep(interval)
+                    if self.record(filename_output):
+                        self.save(filename_output, img, overlay)
+                self.scheduler.beat(active=len(objects) > 0)
         except KeyboardInterrupt:
             print('interrupted!')
-            camera.release()
+            self.release()
             print(type(objects))
             print(objects)
         except Exception as e:
             print('interrupted! by:')
             print(e)
-            camera.release()
+            self.release()
             print(type(objects))
             print(objects)
 
 
+def run_task(camera, task, inference=None):
+    """Process target running a task of a camera, with its own inference
+    client when the models are served by the inference service."""
+    camera.inference = inference
+    camera.task_started = time.time()
+    getattr(camera, task)()
+
+
+def PeriodicBatchCapture(cameras):
+    """Detection task for several cameras sharing one detector.
+
+    Each beat the frames of every camera go through the model in a single
+    batch instead of one forward pass per camera.
+    """
+    config = get_config()
+    scheduler = BeatScheduler('all', config['beat_interval'],
+                              budget=cpu_budget(), **scheduler_settings(config))
+    # a single batch, so the global model rather than the cameras' own
+    detector = get_detector(config['model'])
+    for camera in cameras:
+        camera.task_started = time.time()
+        camera.start_recorder()
+    while True:
+        images = [camera.capture_image() for camera in cameras]
+        # the cameras without a frame in time are left out of this beat
+        moving = [(camera, image) for camera, image in zip(cameras, images)
+                  if image is not None
+                  and (camera.motion_gate is None
+                       or camera.motion_gate.allow(image))]
+        if not moving:
+            scheduler.beat()
+            continue
+        # the regions of every camera go through the model together
+        splits = [camera.regions.split(image) for camera, image in moving]
+        crops = [crop for split in splits for crop in split[0]]
+        outputs = detector.predict_batch(crops) if crops else []
+        detections = [detector.filter_prediction(output, crop)
+                      for output, crop in zip(outputs, crops)]
+        start = 0
+        for (camera, image), (_, offsets) in zip(moving, splits):
+            end = start + len(offsets)
+            camera.save_detection(
+                    image, Regions.join(detections[start:end], offsets),
+                    detector)
+            start = end
+        scheduler.beat(active=any(len(d) > 0 for d in detections))
+
+
+def fair_scheduler(cameras):
+    """Turns of ``cameras`` on a shared detector, from their config."""
+    scheduler = FairScheduler()
+    for camera in cameras:
+        scheduler.add(camera.name, camera.priority, camera.max_rate,
+                      camera.deadline)
+    return scheduler
+
+
+def MultiplexedDetection(cameras, scheduler, inference=None):
+    """Detection task of every camera with a single detector.
+
+    The cameras take turns as decided by ``scheduler``, each turn runs the
+    model on the newest frame of one camera, so a busy camera uses the
+    time left by the idle ones and a new camera slows all of them evenly.
+    """
+    detectors = dict()
+    cameras = {camera.name: camera for camera in cameras}
+    for camera in cameras.values():
+        # the cameras with the same model settings share a detector
+        if inference is None and camera.model not in detectors:
+            detectors[camera.model] = get_detector(camera.model)
+        camera.detector = detectors.get(camera.model)
+        camera.inference = inference
+        camera.task_started = time.time()
+        camera.start_recorder()
+    while True:
+        camera = cameras[scheduler.next()]
+        retry_after = 0
+        try:
+            # a camera without frames holds the detector for a short
+            # while only, then sits out a few seconds
+            image = camera.capture_image(timeout=MULTIPLEX_TIMEOUT)
+            if image is None:
+                retry_after = MULTIPLEX_RETRY
+            elif (camera.motion_gate is None
+                    or camera.motion_gate.allow(image)):
+                camera.save_detection(image, camera.detect(image))
+        except Exception as e:
+            print('{}: detection failed, {}'.format(camera.name, e))
+            retry_after = MULTIPLEX_RETRY
+        finally:
+            scheduler.done(retry_after)
+
+
 if __name__ == '__main__':
-    camera = Camera(config['cameras'][0])
+    camera = Camera(get_config()['cameras'][0])
     camera.CaptureContinous()
     #camera.ObjectTracking()
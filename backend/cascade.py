@@ -1,14 +1,16 @@
 import cv2
 import numpy as np
-import pandas as pd
 from backend.utils import timeit
+from backend.overlay import detections_overlay
+from backend.detections import Detections
+from backend.dnn import set_threads
 
 
 class Detector():
     """Class cascade"""
 
     @timeit
-    def __init__(self):
+    def __init__(self, threads=None):
         # self.model = cv2.CascadeClassifier(
         #         "models/cascade/fullbody_recognition_model.xml")
         # self.model = cv2.CascadeClassifier(
@@ -16,46 +18,45 @@ class Detector():
         self.model = cv2.CascadeClassifier(
                 "models/cascade/facial_recognition_model.xml")
         self.colors = np.random.uniform(0, 255, size=(100, 3))
+        # OpenCV threads, set before each detection, None is the default
+        self.threads = threads
 
-    @timeit
-    def prediction(self, image):
-        objects = self.model.detectMultiScale(
+    def preprocess(self, image):
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return image
+
+    def forward(self, image):
+        set_threads(self.threads)
+        return self.model.detectMultiScale(
                 image,
                 scaleFactor=1.1,
                 minNeighbors=5,
                 minSize=(30, 30),
                 flags=cv2.CASCADE_SCALE_IMAGE
                 )
-        return objects
+
+    @timeit
+    def prediction(self, image):
+        return self.forward(self.preprocess(image))
+
+    @timeit
+    def predict_batch(self, images):
+        """Cascade classifiers take a single image, predict each in turn."""
+        return [self.prediction(image) for image in images]
 
     @timeit
     def filter_prediction(self, output, image):
-        df = pd.DataFrame(
-                output,
-                columns=[
-                    'x1', 'y1', 'w', 'h'])
-        df = df.assign(
-                x2=lambda x: (x['x1'] + x['w']),
-                y2=lambda x: (x['y1'] + x['h']),
-                label=lambda x: x.index.astype(str),
-                class_name=lambda x: x.index.astype(str),
-                )
-        return df
+        rects = np.array(output).reshape(-1, 4)
+        boxes = np.concatenate([rects[:, :2], rects[:, :2] + rects[:, 2:]], axis=1)
+        # detected objects are numbered, their number is the class name
+        return Detections.from_arrays(boxes, np.arange(len(boxes)))
 
-    def draw_boxes(self, image, df):
-        for idx, box in df.iterrows():
-            color = self.colors[int(box['label'])]
-            cv2.rectangle(
-                    image,
-                    (box['x1'], box['y1']),
-                    (box['x2'], box['y2']),
-                    color, 6)
-            cv2.putText(
-                    image,
-                    box['label'],
-                    (box['x1'], box['y1'] - 5),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-        return image
+    def overlay(self, detections):
+        return detections_overlay(detections, self.colors, thickness=6, boxed=False)
+
+    def draw_boxes(self, image, detections):
+        return self.overlay(detections).draw(image)
 
 
 if __name__ == "__main__":
@@ -64,7 +65,7 @@ if __name__ == "__main__":
 
     detector = Detector()
     output = detector.prediction(image)
-    df = detector.filter_prediction(output, image)
-    image = detector.draw_boxes(image, df)
+    detections = detector.filter_prediction(output, image)
+    image = detector.draw_boxes(image, detections)
 
     cv2.imwrite("./imgs/outputcv.jpg", image)
@@ -0,0 +1,227 @@
+"""Persistent index of the captured detection images.
+
+Images are stored as ``imgs/<camera>/<YYYYMMDD>/<HHMMSS>_<classes>_[<ids>_].jpg``.
+The catalog keeps one row per file in a SQLite database so the gallery can
+be paginated with indexed queries instead of globbing the whole archive.
+"""
+import os
+import re
+import glob
+import sqlite3
+import threading
+
+IMAGE_FOLDER = 'imgs'
+CATALOG_DB = os.path.join(IMAGE_FOLDER, 'catalog.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL UNIQUE,
+    camera TEXT NOT NULL,
+    year TEXT NOT NULL,
+    month TEXT NOT NULL,
+    day TEXT NOT NULL,
+    hour TEXT NOT NULL,
+    minute TEXT NOT NULL,
+    stamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS images_stamp ON images (stamp, path);
+CREATE INDEX IF NOT EXISTS images_camera_stamp ON images (camera, stamp);
+CREATE TABLE IF NOT EXISTS objects (
+    image_id INTEGER NOT NULL REFERENCES images (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    PRIMARY KEY (name, image_id)
+);
+CREATE INDEX IF NOT EXISTS objects_image ON objects (image_id);
+CREATE TABLE IF NOT EXISTS tracking (
+    image_id INTEGER NOT NULL REFERENCES images (id) ON DELETE CASCADE,
+    object_id INTEGER NOT NULL,
+    PRIMARY KEY (object_id, image_id)
+);
+CREATE INDEX IF NOT EXISTS tracking_image ON tracking (image_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', 0);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('catalog_id', abs(random()));
+"""
+
+
+def parse_path(path):
+    """Split an image path into its catalog fields.
+
+    Returns None for files that don't follow the capture naming scheme.
+    """
+    parts = path.replace(os.sep, '/').split('/')
+    if len(parts) < 4 or not path.endswith('.jpg'):
+        return None
+    camera, day, filename = parts[-3], parts[-2], parts[-1]
+    names = filename.split('_')
+    if len(day) != 8 or not day.isdigit() or len(names) < 3:
+        return None
+    hour = names[0]
+    if len(hour) != 6 or not hour.isdigit():
+        return None
+    objects = [name for name in names[1].split('-') if name]
+    # tracking captures are named HHMMSS_person_<id>-<id>_.jpg
+    tracking = []
+    if len(names) > 3:
+        tracking = [int(i) for i in names[2].split('-') if i.isdigit()]
+    return dict(
+            path=path, camera=camera,
+            year=day[:4], month=day[4:6], day=day[6:8],
+            hour=hour[:2], minute=hour[2:4], stamp=day + hour,
+            objects=objects, tracking=tracking)
+
+
+def split_values(units, digit_number):
+    """Turn the comma separated filter of the api ("1,12") into zero
+    padded values (["01", "12"])."""
+    return [value.zfill(digit_number)
+            for value in str(units).split(',') if value and '?' not in value]
+
+
+class Catalog():
+    """SQLite index of the image archive.
+
+    Connections are opened lazily, one per process and thread, so a catalog
+    object created in the Flask process can be inherited by the task
+    processes started with multiprocessing.
+    """
+
+    def __init__(self, db_path=CATALOG_DB, image_folder=IMAGE_FOLDER):
+        self.db_path = db_path
+        self.image_folder = image_folder
+        self._local = threading.local()
+
+    def _connect(self):
+        local = self._local
+        if getattr(local, 'pid', None) == os.getpid():
+            return local.connection
+        is_new = not os.path.exists(self.db_path)
+        directory = os.path.dirname(self.db_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA foreign_keys=ON')
+        connection.executescript(SCHEMA)
+        local.connection = connection
+        local.pid = os.getpid()
+        if is_new:
+            self.rebuild()
+        return connection
+
+    def add(self, path):
+        """Index a newly written image."""
+        item = parse_path(path)
+        if item is None:
+            return None
+        connection = self._connect()
+        with connection:
+            return self._insert(connection, item)
+
+    def _insert(self, connection, item):
+        cursor = connection.execute(
+                'INSERT OR IGNORE INTO images '
+                '(path, camera, year, month, day, hour, minute, stamp) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (item['path'], item['camera'], item['year'], item['month'],
+                 item['day'], item['hour'], item['minute'], item['stamp']))
+        if cursor.rowcount == 0:
+            return None
+        image_id = cursor.lastrowid
+        connection.executemany(
+                'INSERT OR IGNORE INTO objects (image_id, name) VALUES (?, ?)',
+                [(image_id, name) for name in item['objects']])
+        connection.executemany(
+                'INSERT OR IGNORE INTO tracking (image_id, object_id) '
+                'VALUES (?, ?)',
+                [(image_id, object_id) for object_id in item['tracking']])
+        return image_id
+
+    def remove(self, path):
+        """Drop an image from the index, returns True if it was indexed."""
+        connection = self._connect()
+        with connection:
+            cursor = connection.execute(
+                    'DELETE FROM images WHERE path = ?', (path,))
+        return cursor.rowcount > 0
+
+    def rebuild(self):
+        """Re-index every image found under the image folder."""
+        connection = self._connect()
+        pattern = os.path.join(self.image_folder, '*', '*', '*.jpg')
+        with connection:
+            connection.execute('DELETE FROM images')
+            connection.execute(
+                    "UPDATE meta SET value = value + 1 "
+                    "WHERE key = 'generation'")
+            count = 0
+            for path in glob.iglob(pattern):
+                item = parse_path(path)
+                if item is not None and self._insert(connection, item):
+                    count += 1
+        return count
+
+    def generation(self):
+        """Counter bumped on every rebuild, image ids are only comparable
+        within a generation."""
+        return self._connect().execute(
+                "SELECT value FROM meta WHERE key = 'generation'").fetchone()[0]
+
+    def catalog_id(self):
+        """Random id of the database, drawn when it is created, so a new
+        database starting its generations over is told apart."""
+        return self._connect().execute(
+                "SELECT value FROM meta WHERE key = 'catalog_id'").fetchone()[0]
+
+    def since(self, last_id):
+        """Return (id, path) of the images indexed after ``last_id``."""
+        return self._connect().execute(
+                'SELECT id, path FROM images WHERE id > ? ORDER BY id',
+                (last_id,)).fetchall()
+
+    def query(self, page=0, page_size=16, date=None, years=None, months=None,
+              days=None, hours=None, minutes=None, detected_object=None,
+              camera=None):
+        """Return a page of image paths, newest first.
+
+        ``date`` is a YYYYMMDD string, the other time filters are lists of
+        zero padded values. ``detected_object`` matches the images with an
+        object whose name contains it, as the file name pattern of the
+        gallery did: ``dog`` also finds ``hotdog``.
+        """
+        clauses = []
+        params = []
+        if date is not None:
+            clauses.append('stamp >= ? AND stamp < ?')
+            params.extend([date, date + 'Z'])
+        for column, values in (('year', years), ('month', months),
+                               ('day', days), ('hour', hours),
+                               ('minute', minutes)):
+            if values:
+                clauses.append('{} IN ({})'.format(
+                    column, ', '.join('?' * len(values))))
+                params.extend(values)
+        if camera is not None:
+            clauses.append('camera = ?')
+            params.append(camera)
+        if detected_object and detected_object != '*':
+            clauses.append(
+                    'id IN (SELECT image_id FROM objects '
+                    "WHERE name LIKE ? ESCAPE '\\')")
+            params.append('%{}%'.format(re.sub(r'([\\%_])', r'\\\1',
+                                                 detected_object)))
+        sql = 'SELECT path FROM images'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY stamp DESC, path DESC LIMIT ? OFFSET ?'
+        params.extend([page_size, page * page_size])
+        return [row[0] for row in self._connect().execute(sql, params)]
+
+
+if __name__ == "__main__":
+    catalog = Catalog()
+    print('Indexed {} images in {}'.format(catalog.rebuild(), catalog.db_path))
@@ -1,156 +1,247 @@
-from datetime import datetime, timedelta
 import numpy as np
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # optional, falls back to the greedy matching
+    linear_sum_assignment = None
+
+CAPACITY = 64
+# weight of the last measured velocity against the previous estimate
+SMOOTHING = 0.5
+# per track arrays, compacted together when tracks are dropped
+STATE = ('ids', 'centroids', 'boxes', 'missing', 'measured', 'velocity',
+         'steps')
+
+
+def centroids_of(rects):
+    """Integer centroids of an (N, 4) array of x1, y1, x2, y2 boxes."""
+    rects = np.asarray(rects, dtype=float).reshape(-1, 4)
+    return ((rects[:, :2] + rects[:, 2:]) / 2.0).astype(int)
+
+
+def centroid_cost(centroids, rects):
+    """Distance matrix between the tracked centroids (rows) and the
+    centroids of the input boxes (columns)."""
+    a = centroids.astype(np.float32)
+    b = centroids_of(rects).astype(np.float32)
+    dx = np.subtract.outer(a[:, 0], b[:, 0])
+    dy = np.subtract.outer(a[:, 1], b[:, 1])
+    dx *= dx
+    dy *= dy
+    dx += dy
+    return np.sqrt(dx, out=dx)
+
+
+def iou_cost(boxes, rects):
+    """1 - IoU matrix between the tracked boxes (rows) and the input boxes
+    (columns)."""
+    a = boxes.astype(np.float32)
+    b = np.asarray(rects, dtype=np.float32).reshape(-1, 4)
+    w = np.minimum.outer(a[:, 2], b[:, 2])
+    w -= np.maximum.outer(a[:, 0], b[:, 0])
+    h = np.minimum.outer(a[:, 3], b[:, 3])
+    h -= np.maximum.outer(a[:, 1], b[:, 1])
+    np.clip(w, 0, None, out=w)
+    np.clip(h, 0, None, out=h)
+    inter = np.multiply(w, h, out=w)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = np.add.outer(area_a, area_b)
+    union -= inter
+    iou = np.divide(inter, union, out=h, where=union > 0)
+    iou[union <= 0] = 0
+    return np.subtract(1, iou, out=iou)
+
+
+def greedy_assignment(cost):
+    """Match the cheapest pairs first, each row and column at most once.
+
+    Pairs that are each other's nearest are taken together in one step,
+    the greedy matching would take them anyway, so only a few passes over
+    the matrix are needed.
+    """
+    active_rows = np.arange(cost.shape[0])
+    active_cols = np.arange(cost.shape[1])
+    rows = []
+    cols = []
+    while len(active_rows) and len(active_cols):
+        sub = cost[np.ix_(active_rows, active_cols)]
+        best_cols = sub.argmin(axis=1)
+        best_rows = sub.argmin(axis=0)
+        mutual = best_rows[best_cols] == np.arange(len(active_rows))
+        rows.append(active_rows[mutual])
+        cols.append(active_cols[best_cols[mutual]])
+        taken = np.zeros(len(active_cols), dtype=bool)
+        taken[best_cols[mutual]] = True
+        active_rows = active_rows[~mutual]
+        active_cols = active_cols[~taken]
+    if not rows:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    return np.concatenate(rows), np.concatenate(cols)
+
 
 class CentroidTracker():
-    def __init__(self, maxDisappeared=50, startID=0):
-        # initialize the next unique object ID along with two ordered
-        # dictionaries used to keep track of mapping a given object
-        # ID to its centroid and number of consecutive frames it has
-        # been marked as "disappeared", respectively
-        self.nextObjectID = startID
-        self.objects = dict()
-        self.disappeared = dict()
+    """Track objects from frame to frame by matching their boxes.
 
-        # store the number of maximum consecutive frames a given
-        # object is allowed to be marked as "disappeared" until we
-        # need to deregister the object from tracking
-        self.maxDisappeared = maxDisappeared
+    The state of the tracks lives in preallocated arrays, grown when more
+    objects are tracked than they can hold. Each update builds the full
+    tracks x boxes cost matrix, either centroid distances or 1 - IoU, and
+    solves it with the Hungarian algorithm when scipy is installed, with a
+    greedy matching otherwise. Pairs costing more than ``maxDistance``
+    aren't matched, the box becomes a new object.
 
-    def register(self, centroid):
-        # when registering an object we use the next available object
-        # ID to store the centroid
-        self.objects[self.nextObjectID] = centroid
-        self.disappeared[self.nextObjectID] = 0
-        self.nextObjectID += 1
-        #day = datetime.now().strftime("%Y%m%d")
-        #hour = datetime.now().strftime("%H%M%S")
-        #myCsvRow = "{},{},\"{}\",\"{}\"\n".format(day, hour, list(self.objects.keys()),[x.tolist() for x in list(self.objects.values())])
-        #with open('imgs/tracking.csv','a') as fd:
-        #    fd.write(myCsvRow)
+    Between two updates ``predict`` moves the tracks by their velocity,
+    estimated from the successive matches, so the detector doesn't need to
+    run on every frame.
+
+    ``objects`` maps the id of each tracked object to its centroid.
+    """
+
+    def __init__(self, maxDisappeared=50, startID=0, maxDistance=None,
+                 metric='centroid', optimal=True, capacity=CAPACITY):
+        self.nextObjectID = startID
+        # number of consecutive frames an object can be missing before
+        # it is deregistered
+        self.maxDisappeared = maxDisappeared
+        self.maxDistance = np.inf if maxDistance is None else maxDistance
+        self.cost = iou_cost if metric == 'iou' else centroid_cost
+        self.metric = metric
+        self.optimal = optimal and linear_sum_assignment is not None
+        self.count = 0
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.centroids = np.zeros((capacity, 2), dtype=np.float32)
+        self.boxes = np.zeros((capacity, 4), dtype=np.float32)
+        self.missing = np.zeros(capacity, dtype=np.int32)
+        # last matched centroid, velocity in pixels per step and steps
+        # (updates or predictions) since the last match
+        self.measured = np.zeros((capacity, 2), dtype=np.float32)
+        self.velocity = np.zeros((capacity, 2), dtype=np.float32)
+        self.steps = np.zeros(capacity, dtype=np.int32)
+        self._objects = None
+
+    @property
+    def objects(self):
+        if self._objects is None:
+            n = self.count
+            self._objects = dict(zip(self.ids[:n].tolist(),
+                                     np.rint(self.centroids[:n]).astype(int)))
+        return self._objects
+
+    @property
+    def disappeared(self):
+        n = self.count
+        return dict(zip(self.ids[:n].tolist(), self.missing[:n].tolist()))
+
+    def tracks(self):
+        """Ids and (N, 4) integer boxes of the tracked objects."""
+        n = self.count
+        return self.ids[:n].copy(), np.rint(self.boxes[:n]).astype(int)
+
+    def drift(self):
+        """Largest predicted move since a track was last matched, in
+        pixels."""
+        n = self.count
+        if n == 0:
+            return 0.
+        moves = np.hypot(self.velocity[:n, 0], self.velocity[:n, 1])
+        return float((moves * self.steps[:n]).max())
+
+    def _grow(self, size):
+        capacity = len(self.ids)
+        while capacity < size:
+            capacity *= 2
+        for name in STATE:
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def register(self, rects):
+        """Start tracking each of the boxes as a new object."""
+        rects = np.asarray(rects, dtype=int).reshape(-1, 4)
+        n, k = self.count, len(rects)
+        if n + k > len(self.ids):
+            self._grow(n + k)
+        self.ids[n:n+k] = np.arange(self.nextObjectID, self.nextObjectID + k)
+        self.centroids[n:n+k] = centroids_of(rects)
+        self.boxes[n:n+k] = rects
+        self.missing[n:n+k] = 0
+        self.measured[n:n+k] = self.centroids[n:n+k]
+        self.velocity[n:n+k] = 0
+        self.steps[n:n+k] = 0
+        self.nextObjectID += k
+        self.count += k
+        self._objects = None
 
     def deregister(self, objectID):
-        # to deregister an object ID we delete the object ID from
-        # both of our respective dictionaries
-        self.objects.pop(objectID)
-        self.disappeared.pop(objectID)
+        self._keep(self.ids[:self.count] != objectID)
+
+    def _keep(self, mask):
+        """Compact the tracks, keeping the rows where ``mask`` is True."""
+        k = int(mask.sum())
+        if k == self.count:
+            return
+        for name in STATE:
+            array = getattr(self, name)
+            array[:k] = array[:self.count][mask]
+        self.count = k
+        self._objects = None
+
+    def _age(self, rows):
+        """Count a missed frame for the tracks of ``rows``, dropping those
+        missing for too long."""
+        self.missing[rows] += 1
+        self._keep(self.missing[:self.count] <= self.maxDisappeared)
+
+    def match(self, rects):
+        """Rows of the tracks and columns of the boxes matched together."""
+        cost = self.cost(
+                self.centroids[:self.count] if self.metric != 'iou'
+                else self.boxes[:self.count], rects)
+        if self.optimal:
+            # gated pairs get a cost no valid assignment can beat
+            gated = np.where(cost > self.maxDistance, 1e9, cost)
+            rows, cols = linear_sum_assignment(gated)
+        else:
+            rows, cols = greedy_assignment(cost)
+        valid = cost[rows, cols] <= self.maxDistance
+        return rows[valid], cols[valid]
+
+    def predict(self):
+        """Move the tracks one step at their estimated velocity."""
+        n = self.count
+        self.centroids[:n] += self.velocity[:n]
+        self.boxes[:n] += np.tile(self.velocity[:n], 2)
+        self.steps[:n] += 1
+        self._objects = None
+        return self.objects
 
     def update(self, rects):
-        # check to see if the list of input bounding box rectangles
-        # is empty
+        rects = np.asarray(rects, dtype=int).reshape(-1, 4)
+        self._objects = None
+        if self.count == 0:
+            self.register(rects)
+            return self.objects
         if len(rects) == 0:
-            # loop over any existing tracked objects and mark them
-            # as disappeared
-            for objectID in list(self.disappeared.keys()):
-                self.disappeared[objectID] += 1
-
-                # if we have reached a maximum number of consecutive
-                # frames where a given object has been marked as
-                # missing, deregister it
-                if self.disappeared[objectID] > self.maxDisappeared:
-                    self.deregister(objectID)
-
-            # return early as there are no centroids or tracking info
-            # to update
+            self.steps[:self.count] += 1
+            self._age(np.arange(self.count))
             return self.objects
 
-        # initialize an array of input centroids for the current frame
-        inputCentroids = np.zeros((len(rects), 2), dtype="int")
-
-        # loop over the bounding box rectangles
-        for (i, (startX, startY, endX, endY)) in enumerate(rects):
-            # use the bounding box coordinates to derive the centroid
-            cX = int((startX + endX) / 2.0)
-            cY = int((startY + endY) / 2.0)
-            inputCentroids[i] = (cX, cY)
-
-        # if we are currently not tracking any objects take the input
-        # centroids and register each of them
-        if len(self.objects) == 0:
-            for i in range(0, len(inputCentroids)):
-                self.register(inputCentroids[i])
-
-        # otherwise, are are currently tracking objects so we need to
-        # try to match the input centroids to existing object
-        # centroids
-        else:
-            # grab the set of object IDs and corresponding centroids
-            objectIDs = list(self.objects.keys())
-            objectCentroids = list(self.objects.values())
-
-            # compute the distance between each pair of object
-            # centroids and input centroids, respectively -- our
-            # goal will be to match an input centroid to an existing
-            # object centroid
-            D = np.linalg.norm(np.array(objectCentroids) - inputCentroids, axis=1, keepdims=True)
-
-            # in order to perform this matching we must (1) find the
-            # smallest value in each row and then (2) sort the row
-            # indexes based on their minimum values so that the row
-            # with the smallest value as at the *front* of the index
-            # list
-            rows = D.min(axis=1).argsort()
-
-            # next, we perform a similar process on the columns by
-            # finding the smallest value in each column and then
-            # sorting using the previously computed row index list
-            cols = D.argmin(axis=1)[rows]
-
-            # in order to determine if we need to update, register,
-            # or deregister an object we need to keep track of which
-            # of the rows and column indexes we have already examined
-            usedRows = set()
-            usedCols = set()
-
-            # loop over the combination of the (row, column) index
-            # tuples
-            for (row, col) in zip(rows, cols):
-                # if we have already examined either the row or
-                # column value before, ignore it
-                # val
-                if row in usedRows or col in usedCols:
-                    continue
-
-                # otherwise, grab the object ID for the current row,
-                # set its new centroid, and reset the disappeared
-                # counter
-                objectID = objectIDs[row]
-                self.objects[objectID] = inputCentroids[col]
-                self.disappeared[objectID] = 0
-
-                # indicate that we have examined each of the row and
-                # column indexes, respectively
-                usedRows.add(row)
-                usedCols.add(col)
-
-            # compute both the row and column index we have NOT yet
-            # examined
-            unusedRows = set(range(0, D.shape[0])).difference(usedRows)
-            unusedCols = set(range(0, D.shape[1])).difference(usedCols)
-
-            # in the event that the number of object centroids is
-            # equal or greater than the number of input centroids
-            # we need to check and see if some of these objects have
-            # potentially disappeared
-            if D.shape[0] >= D.shape[1]:
-                # loop over the unused row indexes
-                for row in unusedRows:
-                    # grab the object ID for the corresponding row
-                    # index and increment the disappeared counter
-                    objectID = objectIDs[row]
-                    self.disappeared[objectID] += 1
-
-                    # check to see if the number of consecutive
-                    # frames the object has been marked "disappeared"
-                    # for warrants deregistering the object
-                    if self.disappeared[objectID] > self.maxDisappeared:
-                        self.deregister(objectID)
-
-            # otherwise, if the number of input centroids is greater
-            # than the number of existing object centroids we need to
-            # register each new input centroid as a trackable object
-            else:
-                for col in unusedCols:
-                    self.register(inputCentroids[col])
-
-        # return the set of trackable objects
+        rows, cols = self.match(rects)
+        centroids = centroids_of(rects[cols])
+        speed = ((centroids - self.measured[rows]) /
+                 (self.steps[rows] + 1)[:, None])
+        self.velocity[rows] = (SMOOTHING * speed +
+                               (1 - SMOOTHING) * self.velocity[rows])
+        self.measured[rows] = centroids
+        self.centroids[rows] = centroids
+        self.boxes[rows] = rects[cols]
+        self.missing[rows] = 0
+        self.steps[:self.count] += 1
+        self.steps[rows] = 0
+        unmatched_rows = np.ones(self.count, dtype=bool)
+        unmatched_rows[rows] = False
+        unmatched_cols = np.ones(len(rects), dtype=bool)
+        unmatched_cols[cols] = False
+        self._age(np.flatnonzero(unmatched_rows))
+        self.register(rects[unmatched_cols])
         return self.objects
@@ -0,0 +1,81 @@
+import time
+import threading
+from collections import OrderedDict
+try:
+    from greenlet import getcurrent as get_ident
+except ImportError:
+    try:
+        from thread import get_ident
+    except ImportError:
+        from _thread import get_ident
+
+MAX_CLIENTS = 64
+
+
+class FrameChannel(object):
+    """Latest frame of a single producer, numbered with a monotonically
+    increasing sequence number.
+
+    Consumers ask for a frame newer than the last sequence number they saw,
+    so they only wake up for frames of their own camera and never spin.
+    """
+
+    def __init__(self, max_clients=MAX_CLIENTS):
+        self.condition = threading.Condition()
+        self.seq = 0
+        self.frame = None
+        self.timestamp = None
+        # last sequence number handed to each client thread, oldest first
+        self.clients = OrderedDict()
+        self.max_clients = max_clients
+
+    def publish(self, frame, timestamp=None):
+        """Invoked by the producer when a new frame is available."""
+        with self.condition:
+            self.frame = frame
+            self.timestamp = time.time() if timestamp is None else timestamp
+            self.seq += 1
+            self.condition.notify_all()
+            return self.seq
+
+    def wait_newer(self, seq, timeout=None):
+        """Return (seq, frame) of the first frame newer than ``seq``.
+
+        On timeout the frame is None and the sequence number unchanged, a
+        frame that was already handed out is never returned twice.
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.seq > seq, timeout):
+                return seq, None
+            return self.seq, self.frame
+
+    def next_frame(self, timeout=None):
+        """Return the frame following the last one the calling thread got.
+
+        The per-thread bookkeeping is bounded to ``max_clients`` entries, the
+        least recently served client is forgotten first.
+        """
+        return self.next_frame_info(timeout)[0]
+
+    def next_frame_info(self, timeout=None):
+        """Return the newest frame, its timestamp and the number of frames
+        the calling thread skipped since its previous call.
+
+        A slow client always gets the latest frame, the ones published in
+        between are counted as dropped for that client only. On timeout
+        (None, None, 0) is returned, so a stalled producer is noticed rather
+        than its last frame being processed again.
+        """
+        ident = get_ident()
+        with self.condition:
+            last_seq = self.clients.pop(ident, 0)
+            self.clients[ident] = last_seq
+            while len(self.clients) > self.max_clients:
+                self.clients.popitem(last=False)
+            if not self.condition.wait_for(lambda: self.seq > last_seq,
+                                           timeout):
+                return None, None, 0
+            dropped = max(self.seq - last_seq - 1, 0) if last_seq else 0
+            if ident in self.clients:
+                self.clients[ident] = self.seq
+            return self.frame, self.timestamp, dropped
@@ -0,0 +1,20 @@
+"""Settings of config.yml.
+
+The file is parsed on first use and the result is shared by the whole
+process, the task processes forked from the web server inherit it instead
+of parsing it again.
+"""
+import yaml
+
+CONFIG_FILE = 'config.yml'
+
+_config = None
+
+
+def get_config():
+    """Settings of ``CONFIG_FILE``, parsed once."""
+    global _config
+    if _config is None:
+        with open(CONFIG_FILE, 'r') as yamlfile:
+            _config = yaml.load(yamlfile, Loader=yaml.FullLoader)
+    return _config
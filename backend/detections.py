@@ -0,0 +1,139 @@
+"""Result type shared by every detector."""
+import re
+import json
+import functools
+import numpy as np
+
+DTYPE = np.dtype([
+    ('x1', np.int32), ('y1', np.int32), ('x2', np.int32), ('y2', np.int32),
+    ('class_id', np.int32), ('confidence', np.float32)])
+BOX_FIELDS = ['x1', 'y1', 'x2', 'y2']
+
+
+@functools.lru_cache(maxsize=None)
+def load_labels(path):
+    """Class names of a labels.json file, read by the first detector
+    using them."""
+    with open(path) as json_data:
+        return json.load(json_data)
+
+
+def class_lookup(class_names):
+    """Turn a labels.json mapping ({"1": "person"}) into an array indexed by
+    class id, ids missing from the mapping keep their number as name."""
+    size = max(int(class_id) for class_id in class_names) + 1
+    lookup = np.array([str(i) for i in range(size)], dtype=object)
+    for class_id, name in class_names.items():
+        lookup[int(class_id)] = name
+    return lookup
+
+
+class Detections():
+    """Boxes found in a frame, stored in a numpy structured array.
+
+    Class names and labels are only built when asked for. Detectors without
+    a score (motion, cascade) use NaN confidences, their label is just the
+    class name.
+    """
+    __slots__ = ('data', 'class_names', '_names', '_labels')
+
+    def __init__(self, data=None, class_names=None):
+        self.data = np.zeros(0, dtype=DTYPE) if data is None else data
+        self.class_names = class_names
+        self._names = None
+        self._labels = None
+
+    @classmethod
+    def from_arrays(cls, boxes, class_ids, confidences=None, class_names=None):
+        data = np.zeros(len(class_ids), dtype=DTYPE)
+        if len(data) > 0:
+            boxes = np.asarray(boxes).reshape(-1, 4)
+            data['x1'] = boxes[:, 0]
+            data['y1'] = boxes[:, 1]
+            data['x2'] = boxes[:, 2]
+            data['y2'] = boxes[:, 3]
+            data['class_id'] = class_ids
+            data['confidence'] = np.nan if confidences is None else confidences
+        return cls(data, class_names)
+
+    @classmethod
+    def concatenate(cls, detections):
+        """Detections of several crops or detectors as a single one."""
+        detections = list(detections)
+        if not detections:
+            return cls()
+        if len(detections) == 1:
+            return detections[0]
+        return cls(np.concatenate([d.data for d in detections]),
+                   detections[0].class_names)
+
+    def shift(self, dx, dy):
+        """Boxes moved by (dx, dy), from crop to frame coordinates."""
+        if dx == 0 and dy == 0:
+            return self
+        data = self.data.copy()
+        data['x1'] += dx
+        data['x2'] += dx
+        data['y1'] += dy
+        data['y2'] += dy
+        return Detections(data, self.class_names)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            if key == 'class_name':
+                return self.class_name
+            if key == 'label':
+                return self.label
+            return self.data[key]
+        return Detections(np.atleast_1d(self.data[key]), self.class_names)
+
+    def __repr__(self):
+        return 'Detections({})'.format(
+                ', '.join(self.label.tolist()) if len(self) else '')
+
+    @property
+    def boxes(self):
+        """(N, 4) integer array of x1, y1, x2, y2."""
+        return np.stack([self.data[field] for field in BOX_FIELDS], axis=1)
+
+    @property
+    def class_name(self):
+        if self._names is None:
+            class_ids = self.data['class_id']
+            self._names = class_ids.astype(str).astype(object)
+            if self.class_names is not None:
+                known = class_ids < len(self.class_names)
+                self._names[known] = self.class_names[class_ids[known]]
+        return self._names
+
+    @property
+    def label(self):
+        if self._labels is None:
+            self._labels = np.array([
+                name if np.isnan(confidence)
+                else '{}: {}'.format(name, str(confidence)[:4])
+                for name, confidence in zip(
+                    self.class_name, self.data['confidence'])],
+                dtype=object)
+        return self._labels
+
+    def contains(self, pattern):
+        """True if a class name matches the regular expression, like
+        ``df['class_name'].str.contains(pattern).any()``."""
+        regex = re.compile(pattern)
+        return any(regex.search(name) for name in self.unique_classes())
+
+    def unique_classes(self):
+        """Class names in order of appearance."""
+        return list(dict.fromkeys(self.class_name.tolist()))
+
+    def to_frame(self):
+        """Detections as a pandas DataFrame."""
+        import pandas as pd
+        df = pd.DataFrame(self.data)
+        df['class_name'] = self.class_name
+        df['label'] = self.label
+        return df
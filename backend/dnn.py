@@ -0,0 +1,99 @@
+"""Model of a camera and the OpenCV DNN settings of its detector.
+
+The ``model`` of config.yml, globally or for a camera, is either the name
+of a detector module or a mapping with its settings::
+
+    model:
+      name: yolo_detection
+      input_size: 320
+      backend: opencv
+      target: cpu
+      threads: 2
+      conf_th: 0.4
+
+Every setting but ``name`` goes to the ``Detector`` constructor.
+"""
+from collections import namedtuple
+from importlib import import_module
+
+BACKENDS = ('default', 'opencv', 'inference_engine', 'cuda', 'vkcom',
+            'timvx', 'cann')
+TARGETS = ('cpu', 'cpu_fp16', 'opencl', 'opencl_fp16', 'myriad', 'vulkan',
+           'cuda', 'cuda_fp16', 'npu')
+# OpenCV threads of the process before the detectors set their own
+default_threads = None
+
+
+class ModelSpec(namedtuple('ModelSpec', ['name', 'settings'])):
+    """Detector module and settings, hashable so the loaded detectors and
+    the inference service can be keyed by it."""
+
+    @classmethod
+    def parse(cls, model):
+        """Spec of a ``model`` entry of config.yml."""
+        if isinstance(model, cls):
+            return model
+        if isinstance(model, str):
+            return cls(model, ())
+        settings = dict(model)
+        name = settings.pop('name')
+        return cls(name, tuple(sorted(
+            (key, tuple(value) if isinstance(value, list) else value)
+            for key, value in settings.items())))
+
+    def __str__(self):
+        if not self.settings:
+            return self.name
+        return '{}({})'.format(self.name, ', '.join(
+            '{}={}'.format(key, value) for key, value in self.settings))
+
+    def load(self):
+        return import_module(f"backend.{self.name}").Detector(
+                **dict(self.settings))
+
+
+def network_size(size, default):
+    """(width, height) of the network input, ``size`` is a side or a
+    [width, height] pair."""
+    if size is None:
+        return default
+    if isinstance(size, int):
+        return (size, size)
+    return tuple(size)
+
+
+def constant(prefix, name, names):
+    """cv2.dnn constant of a backend or target ``name``, some are missing
+    from older OpenCV builds."""
+    import cv2
+    value = getattr(cv2.dnn, prefix + name.upper(), None)
+    if name not in names or value is None:
+        raise ValueError('Unknown DNN {} {}, one of {}'.format(
+            prefix.split('_')[1].lower(), name, ', '.join(
+                known for known in names
+                if hasattr(cv2.dnn, prefix + known.upper()))))
+    return value
+
+
+def configure(model, backend=None, target=None):
+    """Select the backend and the target of an OpenCV DNN model."""
+    if backend is not None:
+        model.setPreferableBackend(
+                constant('DNN_BACKEND_', backend, BACKENDS))
+    if target is not None:
+        model.setPreferableTarget(constant('DNN_TARGET_', target, TARGETS))
+
+
+def set_threads(threads):
+    """Set the OpenCV threads of a forward pass, the default count of the
+    process when ``threads`` is None.
+
+    The count is process-wide, so every detector sets its own before each
+    pass rather than run with the count of the detector before it.
+    """
+    global default_threads
+    import cv2
+    if default_threads is None:
+        # read before any detector changed it
+        default_threads = cv2.getNumThreads()
+    cv2.setNumThreads(default_threads if threads is None else threads)
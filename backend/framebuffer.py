@@ -0,0 +1,144 @@
+"""Ring buffer of decoded frames in shared memory.
+
+The capture process of a camera writes every frame once, the detection and
+tracking tasks and the web server read numpy views of the same memory.
+"""
+import time
+import numpy as np
+try:
+    from multiprocessing import shared_memory, resource_tracker
+except ImportError:  # python < 3.8, see Camera.shared_capture
+    shared_memory = None
+
+SLOTS = 8
+POLL_INTERVAL = 0.005
+HEADER = np.dtype([
+    ('slots', np.int64), ('height', np.int64), ('width', np.int64),
+    ('channels', np.int64), ('head', np.int64)])
+SLOT = np.dtype([('seq', np.int64), ('timestamp', np.float64)])
+
+
+class FrameRing():
+    """Fixed number of frame slots, each with a sequence number and a
+    capture timestamp.
+
+    The writer marks a slot with seq -1 while it copies a frame into it, so
+    readers can tell a slot being overwritten. Views returned by ``latest``
+    stay valid until the writer wraps around to their slot, ``is_valid``
+    tells if that happened.
+
+    Needs python 3.8 or newer. Only the owner unlinks the memory: a reader
+    may run its own resource tracker, when it was forked before the parent
+    started one, so the readers unregister the memory from theirs instead
+    of leaving the tracker to unlink it when they exit.
+    """
+
+    def __init__(self, shm, owner=False):
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray((1,), dtype=HEADER, buffer=shm.buf)[0]
+        slots = int(self.header['slots'])
+        shape = (int(self.header['height']), int(self.header['width']),
+                 int(self.header['channels']))
+        offset = HEADER.itemsize
+        self.meta = np.ndarray((slots,), dtype=SLOT, buffer=shm.buf,
+                               offset=offset)
+        offset += SLOT.itemsize * slots
+        self.frames = np.ndarray((slots,) + shape, dtype=np.uint8,
+                                 buffer=shm.buf, offset=offset)
+        self.slots = slots
+
+    @classmethod
+    def create(cls, name, shape, slots=SLOTS):
+        if shared_memory is None:
+            raise RuntimeError('Shared capture needs python 3.8 or newer.')
+        if len(shape) == 2:
+            shape = shape + (1,)
+        size = (HEADER.itemsize + SLOT.itemsize * slots +
+                slots * int(np.prod(shape)))
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # left behind by a capture process that didn't exit cleanly
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray((1,), dtype=HEADER, buffer=shm.buf)
+        header[0] = (slots,) + tuple(shape) + (0,)
+        ring = cls(shm, owner=True)
+        ring.meta['seq'] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, name, timeout=10):
+        """Open the ring of a running capture process, waiting for it to
+        be created."""
+        if shared_memory is None:
+            raise RuntimeError('Shared capture needs python 3.8 or newer.')
+        deadline = time.time() + timeout
+        while True:
+            try:
+                shm = shared_memory.SharedMemory(name=name)
+                break
+            except FileNotFoundError:
+                if time.time() > deadline:
+                    raise RuntimeError('No capture process for {}'.format(name))
+                time.sleep(0.1)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return cls(shm)
+
+    def write(self, frame, timestamp=None):
+        seq = int(self.header['head']) + 1
+        slot = seq % self.slots
+        self.meta[slot]['seq'] = -1
+        self.frames[slot].reshape(frame.shape)[...] = frame
+        self.meta[slot]['timestamp'] = (time.time() if timestamp is None
+                                        else timestamp)
+        self.meta[slot]['seq'] = seq
+        self.header['head'] = seq
+        return seq
+
+    def latest(self):
+        """Return (seq, timestamp, frame) of the newest frame, the frame is
+        a read only view of the shared memory."""
+        while True:
+            seq = int(self.header['head'])
+            if seq == 0:
+                return 0, None, None
+            slot = seq % self.slots
+            meta = self.meta[slot]
+            timestamp = float(meta['timestamp'])
+            if meta['seq'] == seq:
+                view = self.frames[slot]
+                if view.shape[2] == 1:
+                    view = view[:, :, 0]
+                view = view.view()
+                view.flags.writeable = False
+                return seq, timestamp, view
+            # the writer wrapped around to the slot, wait for its next frame
+            time.sleep(POLL_INTERVAL)
+
+    def is_valid(self, seq):
+        """True while the slot of frame ``seq`` hasn't been overwritten."""
+        return self.meta[seq % self.slots]['seq'] == seq
+
+    def wait_newer(self, seq, timeout=None):
+        """Poll until a frame newer than ``seq`` is written, on timeout the
+        frame is None and ``seq`` is returned unchanged."""
+        deadline = None if timeout is None else time.time() + timeout
+        while int(self.header['head']) <= seq:
+            if deadline is not None and time.time() > deadline:
+                return seq, None, None
+            time.sleep(POLL_INTERVAL)
+        return self.latest()
+
+    def close(self):
+        self.header = self.meta = self.frames = None
+        if self.owner:
+            self.shm.unlink()
+        try:
+            self.shm.close()
+        except BufferError:
+            # views handed to the readers are still alive
+            pass
@@ -0,0 +1,80 @@
+"""Latest frame capture for live sources.
+
+OpenCV queues the frames of RTSP and other network sources until they are
+read, so a reader slower than the source sees older and older frames. The
+grabber keeps the queue empty by grabbing every frame as it arrives, and
+only decodes the frames that are actually asked for.
+"""
+import time
+import threading
+import cv2
+
+# seconds close waits for the grabbing thread
+JOIN_TIMEOUT = 2
+
+
+class FrameGrabber():
+    """Thread grabbing the frames of a ``cv2.VideoCapture``.
+
+    ``read`` returns the first frame grabbed after the call, its sequence
+    number and the time it was grabbed. The frames grabbed in between are
+    never decoded, ``dropped`` counts them.
+    """
+
+    def __init__(self, capture):
+        capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.capture = capture
+        self.condition = threading.Condition()
+        self.seq = 0
+        # the reader's request, served by the grabbing thread which is the
+        # only one touching the capture
+        self.requested = False
+        self.frame = None
+        self.frame_seq = 0
+        self.frame_timestamp = None
+        self.dropped = 0
+        self.running = True
+        self.thread = threading.Thread(target=self._grab, daemon=True)
+        self.thread.start()
+
+    def _grab(self):
+        while self.running:
+            ok = self.capture.grab()
+            timestamp = time.time()
+            with self.condition:
+                if not ok:
+                    self.running = False
+                    self.condition.notify_all()
+                    break
+                self.seq += 1
+                if self.requested:
+                    self.requested = False
+                    _, self.frame = self.capture.retrieve()
+                    self.dropped += max(self.seq - self.frame_seq - 1, 0)
+                    self.frame_seq = self.seq
+                    self.frame_timestamp = timestamp
+                    self.condition.notify_all()
+
+    def read(self, timeout=None):
+        """Return (seq, timestamp, frame) of the next grabbed frame, the
+        frame is None once the source is closed."""
+        with self.condition:
+            seq = self.frame_seq
+            self.requested = True
+            self.condition.wait_for(
+                    lambda: self.frame_seq > seq or not self.running, timeout)
+            if self.frame_seq == seq:
+                return seq, None, None
+            return self.frame_seq, self.frame_timestamp, self.frame
+
+    def close(self, timeout=JOIN_TIMEOUT):
+        """Stop grabbing. A thread stuck in ``grab`` on a stalled source is
+        unblocked by releasing the capture, if even that doesn't stop it
+        the daemon thread is left behind rather than hanging the caller."""
+        self.running = False
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            self.capture.release()
+            self.thread.join(timeout)
+        if self.thread.is_alive():
+            print('Grabbing thread still blocked, left behind.')
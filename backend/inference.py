@@ -0,0 +1,141 @@
+"""Shared inference service.
+
+A single long-lived process loads each model once and runs the detections
+requested by every task, instead of one model copy per task process.
+"""
+import time
+import queue
+import multiprocessing
+from collections import deque
+from .dnn import ModelSpec
+
+BATCH_SIZE = 4
+LATENCY_WINDOW = 100
+
+
+class InferenceService():
+    """Process owning the detectors.
+
+    Requests from all the clients go through a single queue. The service
+    drains it, groups the pending frames by model and runs them with
+    ``predict_batch``, so busy periods amortize the forward pass. The
+    per-model queue depth and latency are published in ``stats``.
+
+    Stateful detectors (motion) keep a single background for all the
+    cameras, they are better run locally by each task.
+    """
+
+    def __init__(self, models, batch_size=BATCH_SIZE):
+        # names or ModelSpec of the models loaded at start
+        self.models = [ModelSpec.parse(model) for model in models]
+        self.batch_size = batch_size
+        self.manager = multiprocessing.Manager()
+        self.requests = multiprocessing.Queue()
+        self.stats = self.manager.dict()
+        self.process = None
+
+    def start(self):
+        self.process = multiprocessing.Process(target=self._run, daemon=True)
+        self.process.start()
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join()
+        self.manager.shutdown()
+
+    def client(self):
+        """Client with its own reply queue, one per process or thread."""
+        return InferenceClient(self.requests, self.manager.Queue())
+
+    def _load(self, model):
+        if model not in self.detectors:
+            self.detectors[model] = model.load()
+            self.pending[model] = deque()
+            self.latencies[model] = deque(maxlen=LATENCY_WINDOW)
+            self.served[model] = 0
+        return self.detectors[model]
+
+    def _run(self):
+        self.detectors = dict()
+        self.pending = dict()
+        self.latencies = dict()
+        self.served = dict()
+        for model in self.models:
+            self._load(model)
+        while True:
+            # block until there is work, then take everything queued
+            requests = [self.requests.get()]
+            try:
+                while True:
+                    requests.append(self.requests.get_nowait())
+            except queue.Empty:
+                pass
+            for request in requests:
+                try:
+                    model = ModelSpec.parse(request[0])
+                    self._load(model)
+                except Exception as e:
+                    request[3].put(e)
+                    continue
+                self.pending[model].append(request)
+            for model, jobs in self.pending.items():
+                while jobs:
+                    self._serve(model, jobs)
+
+    def _serve(self, model, jobs):
+        """Run one batch of the pending jobs of a model."""
+        detector = self.detectors[model]
+        depth = len(jobs)
+        batch = [jobs.popleft() for _ in range(min(depth, self.batch_size))]
+        try:
+            outputs = detector.predict_batch(
+                    [image for _, image, _, _, _ in batch])
+            results = [detector.filter_prediction(output, image, **kwargs)
+                       for (_, image, kwargs, _, _), output
+                       in zip(batch, outputs)]
+        except Exception as e:
+            results = [e] * len(batch)
+        now = time.time()
+        latencies = self.latencies[model]
+        for (_, _, _, reply, submitted), result in zip(batch, results):
+            reply.put(result)
+            latencies.append(now - submitted)
+        self.served[model] += len(batch)
+        window = sorted(latencies)
+        self.stats[str(model)] = dict(
+                queue_depth=depth,
+                batch_size=len(batch),
+                requests=self.served[model],
+                latency_ms=1000 * sum(window) / len(window),
+                latency_p95_ms=1000 * window[int(0.95 * len(window))],
+                )
+
+
+class InferenceClient():
+    """Handle used by a task to get detections from the service."""
+
+    def __init__(self, requests, replies):
+        self.requests = requests
+        self.replies = replies
+
+    def detect(self, model, image, **kwargs):
+        """Detections of ``model`` on ``image``, ``kwargs`` are passed to
+        the detector's ``filter_prediction``."""
+        self.requests.put((model, image, kwargs, self.replies, time.time()))
+        result = self.replies.get()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def detect_batch(self, model, images, **kwargs):
+        """Detections of several images, queued together so the service
+        can run them in a single batch."""
+        now = time.time()
+        for image in images:
+            self.requests.put((model, image, kwargs, self.replies, now))
+        results = [self.replies.get() for _ in images]
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
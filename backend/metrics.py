@@ -0,0 +1,228 @@
+"""Counters and latency histograms of every process of the app.
+
+Each process records in its own registry, which is written every few
+seconds as a JSON snapshot in ``METRICS_FOLDER``. The web server merges
+the snapshots of the live processes, the detection tasks included, and
+serves them in the Prometheus text format.
+"""
+import os
+import json
+import time
+import atexit
+import bisect
+import threading
+
+METRICS_FOLDER = 'cache/metrics'
+FLUSH_INTERVAL = 5
+PREFIX = 'objdet_'
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+           2.5, 5.0, 10.0)
+HELP = {
+    'stage_seconds': 'Duration of each processing stage.',
+    'frames_total': 'Frames processed by a task.',
+    'detections_total': 'Objects detected, by class.',
+    'saves_total': 'Images saved.',
+    'dropped_total': 'Images dropped by the storage writer.',
+    'dropped_frames_total': 'Frames skipped by a slow consumer, or grabbed '
+                            'and never decoded by the capture.',
+    'first_detection_seconds': 'Time from the start of a task to its first '
+                               'detection.',
+    'beats_total': 'Iterations of the scheduled tasks.',
+    'scheduler_wait_seconds': 'Wait of a camera for its turn on the '
+                              'multiplexed detector.',
+    'frame_age_seconds': 'Time from the capture of a frame to its read by '
+                         'a consumer.',
+}
+
+
+class Registry():
+    """Counters and histograms of the current process.
+
+    Recording is a dictionary lookup and a few additions under a lock, the
+    snapshot is only written when ``FLUSH_INTERVAL`` has elapsed.
+    """
+
+    def __init__(self, folder=METRICS_FOLDER, flush_interval=FLUSH_INTERVAL):
+        self.folder = folder
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.reset()
+        os.register_at_fork(after_in_child=self.after_fork)
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.counters = dict()
+        self.histograms = dict()
+        self.next_flush = time.time() + self.flush_interval
+
+    def after_fork(self):
+        # forked task, the values of the parent are its own
+        self.lock = threading.Lock()
+        self.reset()
+
+    def _check(self):
+        if time.time() >= self.next_flush:
+            self.next_flush = time.time() + self.flush_interval
+            self.flush()
+
+    def inc(self, name, value=1, **labels):
+        key = self.key(name, **labels)
+        with self.lock:
+            self._check()
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        self.observe_key(self.key(name, **labels), seconds)
+
+    def observe_key(self, key, seconds):
+        """``observe`` with a key built once by ``key``, for the hot
+        paths."""
+        with self.lock:
+            self._check()
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                # bucket counts, then the sum of the values
+                histogram = self.histograms[key] = [0] * (len(BUCKETS) + 2)
+            histogram[bisect.bisect_left(BUCKETS, seconds)] += 1
+            histogram[-1] += seconds
+
+    @staticmethod
+    def key(name, **labels):
+        return (name, tuple(sorted(labels.items())))
+
+    def timer(self, name, **labels):
+        """Context manager recording its duration in a histogram."""
+        return Timer(self, name, labels)
+
+    def snapshot(self):
+        with self.lock:
+            return self._snapshot()
+
+    def _snapshot(self):
+        return dict(
+                counters=[[name, dict(labels), value] for
+                          (name, labels), value in self.counters.items()],
+                histograms=[[name, dict(labels), list(values)] for
+                            (name, labels), values in
+                            self.histograms.items()])
+
+    def flush(self):
+        """Write the snapshot of this process, the recording methods call
+        it with the lock held."""
+        if self.pid != os.getpid():
+            return
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            path = os.path.join(self.folder, '{}.json'.format(self.pid))
+            data = json.dumps(self._snapshot())
+            with open(path + '.tmp', 'w') as f:
+                f.write(data)
+            os.replace(path + '.tmp', path)
+        except OSError:
+            pass
+
+    def collect(self):
+        """Merge the snapshots of the live processes with this one."""
+        counters = dict()
+        histograms = dict()
+        snapshots = [self.snapshot()]
+        if os.path.isdir(self.folder):
+            for filename in os.listdir(self.folder):
+                pid, extension = os.path.splitext(filename)
+                if extension != '.json' or not pid.isdigit():
+                    continue
+                path = os.path.join(self.folder, filename)
+                if int(pid) == os.getpid():
+                    continue
+                if not alive(int(pid)):
+                    os.remove(path)
+                    continue
+                try:
+                    with open(path) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        for snapshot in snapshots:
+            for name, labels, value in snapshot['counters']:
+                key = (name, tuple(sorted(labels.items())))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, values in snapshot['histograms']:
+                key = (name, tuple(sorted(labels.items())))
+                merged = histograms.setdefault(key, [0] * len(values))
+                for i, value in enumerate(values):
+                    merged[i] += value
+        return counters, histograms
+
+    def render(self):
+        """Metrics of every process in the Prometheus text format."""
+        counters, histograms = self.collect()
+        lines = []
+        for name in sorted({name for name, _ in counters}):
+            lines += header(name, 'counter')
+            for (key_name, labels), value in sorted(counters.items()):
+                if key_name == name:
+                    lines.append('{}{}{} {}'.format(
+                        PREFIX, name, format_labels(labels), value))
+        for name in sorted({name for name, _ in histograms}):
+            lines += header(name, 'histogram')
+            for (key_name, labels), values in sorted(histograms.items()):
+                if key_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), values[:-1]):
+                    cumulative += count
+                    lines.append('{}{}_bucket{} {}'.format(
+                        PREFIX, name,
+                        format_labels(labels + (('le', str(bound)),)),
+                        cumulative))
+                lines.append('{}{}_sum{} {}'.format(
+                    PREFIX, name, format_labels(labels), values[-1]))
+                lines.append('{}{}_count{} {}'.format(
+                    PREFIX, name, format_labels(labels), cumulative))
+        return '\n'.join(lines) + '\n'
+
+
+class Timer():
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.name, time.perf_counter() - self.start,
+                              **self.labels)
+
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def header(name, kind):
+    lines = []
+    if name in HELP:
+        lines.append('# HELP {}{} {}'.format(PREFIX, name, HELP[name]))
+    lines.append('# TYPE {}{} {}'.format(PREFIX, name, kind))
+    return lines
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(
+        key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for key, value in labels) + '}'
+
+
+registry = Registry()
+atexit.register(registry.flush)
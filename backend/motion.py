@@ -1,10 +1,13 @@
 import cv2
+import multiprocessing
 import numpy as np  # type: ignore
-import pandas as pd  # type: ignore
 from backend.utils import timeit
+from backend.overlay import detections_overlay
+from backend.detections import Detections
 
 DELTA_THRESH = 10
 MIN_AREA = 4000
+FOLLOW_UP = 5
 
 
 class Detector():
@@ -15,10 +18,11 @@ class Detector():
         self.avg = None
         self.colors = np.random.uniform(0, 255, size=(100, 3))
 
-    @timeit
-    def prediction(self, image):
+    def preprocess(self, image):
         image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        image = cv2.GaussianBlur(image, (21, 21), 0)
+        return cv2.GaussianBlur(image, (21, 21), 0)
+
+    def forward(self, image):
         if self.avg is None:
             self.avg = image.copy().astype(float)
         cv2.accumulateWeighted(image, self.avg, 0.5)
@@ -38,35 +42,81 @@ class Detector():
         self.avg = image.copy().astype(float)
         return cnts
 
+    @timeit
+    def prediction(self, image):
+        return self.forward(self.preprocess(image))
+
+    @timeit
+    def predict_batch(self, images):
+        """Predict each image in turn, the background model is shared so
+        the images should come from the same camera."""
+        return [self.prediction(image) for image in images]
+
     @timeit
     def filter_prediction(self, output, image):
         if len(output) < 2:
-            return pd.DataFrame()
+            return Detections()
+        rects = np.array([cv2.boundingRect(contour) for contour in output
+                          if cv2.contourArea(contour) > MIN_AREA]).reshape(-1, 4)
+        x1 = rects[:, 0].clip(0)
+        y1 = rects[:, 1].clip(0)
+        boxes = np.stack([x1, y1, x1 + rects[:, 2], y1 + rects[:, 3]], axis=1)
+        # moving areas are numbered, their number is the class name
+        return Detections.from_arrays(boxes, np.arange(len(boxes)))
+
+    def overlay(self, detections):
+        return detections_overlay(detections, self.colors, thickness=6, boxed=False)
+
+    def draw_boxes(self, image, detections):
+        return self.overlay(detections).draw(image)
+
+
+class MotionGate():
+    """Cheap first stage in front of the heavy model of a camera.
+
+    Frames only go through to the model when the motion detector finds a
+    moving area, and for ``follow_up`` frames after the motion stopped.
+    ``scale`` downsizes the frames before the motion detection, the
+    minimum area is given in full size pixels.
+
+    The counters are shared memory values, so the web server can read the
+    ones of the task processes.
+    """
+
+    def __init__(self, min_area=MIN_AREA, follow_up=FOLLOW_UP, scale=1.0):
+        self.detector = Detector()
+        self.min_area = min_area
+        self.follow_up = follow_up
+        self.scale = scale
+        self.remaining = 0
+        self.gated = multiprocessing.Value('L', 0)
+        self.inferred = multiprocessing.Value('L', 0)
+
+    def moving(self, image):
+        if self.scale != 1:
+            image = cv2.resize(image, None, fx=self.scale, fy=self.scale,
+                               interpolation=cv2.INTER_AREA)
+        min_area = self.min_area * self.scale ** 2
+        return any(cv2.contourArea(contour) > min_area
+                   for contour in self.detector.prediction(image))
+
+    def allow(self, image):
+        """True if the heavy model should run on ``image``."""
+        if self.moving(image):
+            self.remaining = self.follow_up
+            allowed = True
+        elif self.remaining > 0:
+            self.remaining -= 1
+            allowed = True
         else:
-            df = pd.DataFrame(output)
-            df = df.assign(
-                    area=lambda x: df[0].apply(lambda x: cv2.contourArea(x)),
-                    bounding=lambda x: df[0].apply(lambda x: cv2.boundingRect(x))
-                    )
-            df = df[df['area'] > MIN_AREA]
-            df_filtered = pd.DataFrame(
-                    df['bounding'].values.tolist(), columns=['x1', 'y1', 'w', 'h'])
-            df_filtered = df_filtered.assign(
-                    x1=lambda x: x['x1'].clip(0),
-                    y1=lambda x: x['y1'].clip(0),
-                    x2=lambda x: (x['x1'] + x['w']),
-                    y2=lambda x: (x['y1'] + x['h']),
-                    label=lambda x: x.index.astype(str),
-                    class_name=lambda x: x.index.astype(str),
-                    )
-            return df_filtered
-
-    def draw_boxes(self, image, df):
-        for idx, box in df.iterrows():
-            color = self.colors[int(box['label'])]
-            cv2.rectangle(image, (box['x1'], box['y1']), (box['x2'], box['y2']), color, 6)
-            cv2.putText(image, box['label'], (box['x1'], box['y1'] - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-        return image
+            allowed = False
+        counter = self.inferred if allowed else self.gated
+        with counter.get_lock():
+            counter.value += 1
+        return allowed
+
+    def stats(self):
+        return dict(gated=self.gated.value, inferred=self.inferred.value)
 
 
 if __name__ == "__main__":
@@ -82,8 +132,8 @@ if __name__ == "__main__":
     detector.avg = image2.astype(float)
 
     output = detector.prediction(image)
-    df = detector.filter_prediction(output, image)
-    print(df)
-    image = detector.draw_boxes(image, df)
+    detections = detector.filter_prediction(output, image)
+    print(detections)
+    image = detector.draw_boxes(image, detections)
 
     cv2.imwrite("./imgs/outputcv.jpg", image)
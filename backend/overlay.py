@@ -0,0 +1,162 @@
+"""Drawing of detection boxes, labels and tracking ids on the frames.
+
+The annotations of a frame are collected in an ``Overlay`` instead of being
+drawn right away, so the same raw frame can be stored or streamed untouched
+and the annotated version is only produced where it is needed.
+"""
+import cv2
+import threading
+import numpy as np
+from collections import OrderedDict
+
+ALPHA = 0.5
+FONT = cv2.FONT_HERSHEY_PLAIN
+TEXT_SCALE = 1.0
+TEXT_THICKNESS = 1
+BLACK = (0, 0, 0)
+WHITE = (255, 255, 255)
+GREEN = (0, 255, 0)
+LABEL_CACHE_SIZE = 512
+# colors by class id when the detector isn't at hand
+PALETTE = np.random.uniform(0, 255, size=(100, 3))
+
+
+def render_label(text, color):
+    """Boxed text in white over a patch of ``color`` surrounded by a black
+    border."""
+    margin = 3
+    size = cv2.getTextSize(text, FONT, TEXT_SCALE, TEXT_THICKNESS)
+    w = size[0][0] + margin * 2
+    h = size[0][1] + margin * 2
+    patch = np.zeros((h, w, 3), dtype=np.uint8)
+    patch[...] = color
+    cv2.putText(patch, text, (margin+1, h-margin-2), FONT, TEXT_SCALE,
+                WHITE, thickness=TEXT_THICKNESS, lineType=cv2.LINE_8)
+    cv2.rectangle(patch, (0, 0), (w-1, h-1), BLACK, thickness=1)
+    return patch
+
+
+class LabelSprites():
+    """Bounded LRU cache of the rendered label patches.
+
+    Labels like "person: 0.8" come back on most frames, so the text is laid
+    out and rasterized once per (text, color). Shared by the overlay
+    producers and the request threads, the lock guards the order of the
+    entries.
+    """
+
+    def __init__(self, maxsize=LABEL_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.patches = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, text, color):
+        key = (text, color)
+        with self.lock:
+            patch = self.patches.get(key)
+            if patch is not None:
+                self.patches.move_to_end(key)
+                return patch
+        # rendered outside the lock, a concurrent miss renders it twice
+        patch = render_label(text, color)
+        with self.lock:
+            self.patches[key] = patch
+            if len(self.patches) > self.maxsize:
+                self.patches.popitem(last=False)
+        return patch
+
+
+sprites = LabelSprites()
+
+
+def blend_patch(img, patch, topleft, alpha=ALPHA):
+    """Alpha blend a patch into img at topleft, clipped at the border."""
+    img_h, img_w = img.shape[:2]
+    x, y = topleft
+    if x >= img_w or y >= img_h:
+        return img
+    h = min(patch.shape[0], img_h - y)
+    w = min(patch.shape[1], img_w - x)
+    roi = img[y:y+h, x:x+w, :]
+    cv2.addWeighted(patch[0:h, 0:w, :], alpha, roi, 1 - alpha, 0, roi)
+    return img
+
+
+def to_color(color):
+    return tuple(int(round(c)) for c in color)
+
+
+class Overlay():
+    """Annotations of a frame, kept apart from the frame itself."""
+
+    def __init__(self):
+        self.boxes = []
+        self.labels = []
+        self.texts = []
+        self.points = []
+
+    def add_boxes(self, boxes, colors, thickness=2):
+        """``boxes`` is an (N, 4) integer array of x1, y1, x2, y2."""
+        self.boxes.append((np.asarray(boxes, dtype=int), colors, thickness))
+
+    def add_label(self, text, topleft, color):
+        self.labels.append((text, topleft, color))
+
+    def add_text(self, text, origin, color):
+        self.texts.append((text, origin, color))
+
+    def add_point(self, center, color, radius=4):
+        self.points.append((center, color, radius))
+
+    def add_tracking(self, objects):
+        """Tracked object ids and centroids, as returned by
+        ``CentroidTracker.update``."""
+        for object_id, centroid in objects.items():
+            x, y = int(centroid[0]), int(centroid[1])
+            self.add_text("ID {}".format(object_id), (x - 10, y - 10), GREEN)
+            self.add_point((x, y), GREEN)
+
+    def draw(self, image):
+        """Draw the annotations on ``image`` in place."""
+        for boxes, colors, thickness in self.boxes:
+            for (x1, y1, x2, y2), color in zip(boxes.tolist(), colors):
+                cv2.rectangle(image, (x1, y1), (x2, y2), color, thickness)
+        for text, topleft, color in self.labels:
+            blend_patch(image, sprites.get(text, color), topleft)
+        for text, origin, color in self.texts:
+            cv2.putText(image, text, origin, cv2.FONT_HERSHEY_SIMPLEX, 0.5,
+                        color, 2)
+        for center, color, radius in self.points:
+            cv2.circle(image, center, radius, color, -1)
+        return image
+
+    def compose(self, frame, out=None):
+        """Return an annotated copy of ``frame``, leaving the frame as it is.
+
+        ``out`` is an optional buffer reused from one frame to the next.
+        """
+        if out is None or out.shape != frame.shape:
+            out = np.empty_like(frame)
+        np.copyto(out, frame)
+        return self.draw(out)
+
+
+def detections_overlay(detections, colors, thickness=2, boxed=True):
+    """Overlay of the boxes and labels of a ``Detections``.
+
+    Labels are boxed sprites by default, or plain text above the box.
+    """
+    overlay = Overlay()
+    if len(detections) == 0:
+        return overlay
+    boxes = detections.boxes
+    box_colors = [to_color(colors[class_id % len(colors)])
+                  for class_id in detections['class_id'].tolist()]
+    overlay.add_boxes(boxes, box_colors, thickness)
+    for (x1, y1, _, _), color, label in zip(
+            boxes.tolist(), box_colors, detections.label):
+        if boxed:
+            overlay.add_label(label, (max(x1+2, 0), max(y1+2, 0)), color)
+        else:
+            overlay.add_text(label, (x1, y1 - 5), color)
+    return overlay
@@ -0,0 +1,95 @@
+"""Models loaded once by the web server and shared with the forked tasks.
+
+Each task used to load its own copy of the weights from the SD card. With
+``preload_models: true`` the web server loads and warms up the models
+before forking the first task, the tasks then share the weights with it
+through copy-on-write instead of reading and holding their own.
+"""
+import os
+import gc
+import time
+import logging
+import threading
+import numpy as np
+from .dnn import ModelSpec
+from .metrics import registry as metrics
+
+# frame of the warm up forward pass, allocating the buffers of the model
+WARMUP_SHAPE = (480, 640, 3)
+# no weights, and a background model each camera needs for itself
+STATEFUL = ('motion',)
+
+logger = logging.getLogger(__name__)
+
+preloaded = dict()
+timings = dict()
+owner = None
+lock = threading.Lock()
+
+
+def preload(models, shape=WARMUP_SHAPE):
+    """Load and warm up ``models``, names or ModelSpec, in this process,
+    once."""
+    global owner
+    with lock:
+        loaded = False
+        for model in map(ModelSpec.parse, models):
+            if model in preloaded or model.name in STATEFUL:
+                continue
+            loaded = True
+            start = time.perf_counter()
+            detector = model.load()
+            load = time.perf_counter()
+            detector.prediction(np.zeros(shape, dtype=np.uint8))
+            warm = time.perf_counter()
+            preloaded[model] = detector
+            timings[str(model)] = dict(load_ms=1000 * (load - start),
+                                       warmup_ms=1000 * (warm - load))
+            logger.info('Preloaded %s in %.0f ms, warm up %.0f ms', model,
+                        timings[str(model)]['load_ms'],
+                        timings[str(model)]['warmup_ms'])
+        owner = os.getpid()
+        if loaded:
+            # the objects created so far are left out of the collections,
+            # which would otherwise write to their pages in every forked
+            # task, after the garbage is collected so it isn't kept forever
+            gc.collect()
+            gc.freeze()
+
+
+def get_detector(model):
+    """Detector of ``model``, the preloaded one in a forked task.
+
+    The web server loads its own, its threads would otherwise share the
+    detector of every task with each other.
+    """
+    model = ModelSpec.parse(model)
+    if model in preloaded and os.getpid() != owner:
+        return preloaded[model]
+    return model.load()
+
+
+def memory(pid):
+    """Resident memory of a process in MB, and how much of it is shared
+    with other processes, from /proc on Linux."""
+    fields = dict()
+    try:
+        with open('/proc/{}/smaps_rollup'.format(pid)) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == 'kB':
+                    fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    except OSError:
+        return None
+    shared = fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0)
+    return dict(rss_mb=fields.get('Rss', 0), pss_mb=fields.get('Pss', 0),
+                shared_mb=shared, private_mb=fields.get('Rss', 0) - shared)
+
+
+def first_detection(camera, started, preloaded_model):
+    """Record the time from the start of a task to its first detection."""
+    seconds = time.time() - started
+    metrics.observe('first_detection_seconds', seconds, camera=camera,
+                    preloaded=str(preloaded_model).lower())
+    logger.info('%s: first detection %.2f s after the task start', camera,
+                seconds)
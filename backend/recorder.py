@@ -0,0 +1,148 @@
+"""Video clips of the detected events.
+
+The recorder keeps the last seconds of the stream as JPEG data in memory,
+so when an event starts its clip begins a few seconds before the
+detection, and writes the event as a single video next to a poster image.
+"""
+import os
+import cv2
+import time
+import queue
+import threading
+from collections import deque
+
+PRE_ROLL = 5
+POST_ROLL = 5
+FPS = 10
+QUALITY = 80
+FOURCC = 'MJPG'
+CLIP_EXTENSION = '.avi'
+
+
+def clip_path(poster):
+    """Clip recorded with a poster image."""
+    return os.path.splitext(poster)[0] + CLIP_EXTENSION
+
+
+class Clip():
+    """Event being recorded, its frames are written by a thread."""
+
+    def __init__(self, filename, end, fps):
+        self.filename = filename
+        self.end = end
+        self.frames = queue.Queue()
+        # frames after the end, kept in case another event extends the clip
+        self.tail = []
+        self.thread = threading.Thread(target=self._write, args=(fps,),
+                                       daemon=True)
+        self.thread.start()
+
+    def _write(self, fps):
+        writer = None
+        while True:
+            data = self.frames.get()
+            if data is None:
+                break
+            image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+            if writer is None:
+                os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+                h, w = image.shape[:2]
+                writer = cv2.VideoWriter(
+                        self.filename, cv2.VideoWriter_fourcc(*FOURCC), fps,
+                        (w, h))
+            writer.write(image)
+        if writer is not None:
+            writer.release()
+
+
+class EventRecorder():
+    """Ring buffer of the recent frames and writer of the event clips.
+
+    ``add`` is fed every frame, at most ``fps`` of them per second are
+    compressed and kept for ``pre_roll`` seconds. ``trigger`` starts a clip
+    with the buffered frames, recording goes on until ``post_roll``
+    seconds after the last trigger. A trigger within ``pre_roll`` seconds
+    of the end of a clip extends it instead of starting an overlapping one.
+    """
+
+    def __init__(self, pre_roll=PRE_ROLL, post_roll=POST_ROLL, fps=FPS,
+                 quality=QUALITY, classes=None):
+        self.pre_roll = pre_roll
+        self.post_roll = post_roll
+        self.fps = fps
+        self.quality = quality
+        # detected classes starting an event, a regular expression
+        self.classes = classes
+        self.buffer = deque()
+        self.clip = None
+        # clips still being written
+        self.writing = []
+        # earliest timestamp of the next buffered frame
+        self.next = float('-inf')
+        self.lock = threading.Lock()
+
+    def start(self, get_frame):
+        """Feed the recorder with the frames returned by ``get_frame`` in a
+        thread."""
+        def feed():
+            while True:
+                frame = get_frame()
+                if frame is not None:
+                    self.add(frame)
+        threading.Thread(target=feed, daemon=True).start()
+
+    def add(self, frame, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        period = 1 / self.fps
+        # a tenth of a period of slack for the jitter of the capture
+        if timestamp < self.next - 0.1 * period:
+            return
+        self.next = max(self.next, timestamp - period) + period
+        data = cv2.imencode('.jpg', frame,
+                            [cv2.IMWRITE_JPEG_QUALITY, self.quality])[1]
+        with self.lock:
+            self.buffer.append((timestamp, data))
+            while self.buffer[0][0] < timestamp - self.pre_roll:
+                self.buffer.popleft()
+            clip = self.clip
+            if clip is None:
+                return
+            if timestamp <= clip.end:
+                clip.frames.put(data)
+            elif timestamp <= clip.end + self.pre_roll:
+                clip.tail.append(data)
+            else:
+                clip.frames.put(None)
+                self.clip = None
+
+    def trigger(self, filename, timestamp=None):
+        """Record an event in the clip ``filename``.
+
+        Return False if the event was merged into the clip being recorded.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        with self.lock:
+            clip = self.clip
+            if clip is not None:
+                for data in clip.tail:
+                    clip.frames.put(data)
+                clip.tail = []
+                clip.end = max(clip.end, timestamp + self.post_roll)
+                return False
+            self.writing = [c for c in self.writing if c.thread.is_alive()]
+            self.clip = Clip(filename, timestamp + self.post_roll, self.fps)
+            self.writing.append(self.clip)
+            for _, data in self.buffer:
+                self.clip.frames.put(data)
+            return True
+
+    def stop(self):
+        """Close the clip being recorded and wait for the clips to be
+        written."""
+        with self.lock:
+            if self.clip is not None:
+                self.clip.frames.put(None)
+                self.clip = None
+            writing, self.writing = self.writing, []
+        for clip in writing:
+            clip.thread.join()
@@ -0,0 +1,84 @@
+"""Regions of interest and exclusion masks of a camera.
+
+The model input is downsampled to a few hundred pixels, so on a wide scene
+cropping the regions that matter keeps distant objects big enough to be
+found, and masked areas (sky, a road, a tree) can't trigger detections.
+"""
+import cv2
+import numpy as np
+from .detections import Detections
+from .centroidtracker import iou_cost
+
+# overlap above which two boxes of the same class from different crops are
+# the same object
+NMS_IOU = 0.5
+
+
+class Regions():
+    """``roi`` is a list of [x1, y1, x2, y2] rectangles, ``mask`` a list of
+    polygons given as [[x, y], ...] points, both in full frame pixels.
+
+    Without rectangles the whole frame is a single region.
+    """
+
+    def __init__(self, roi=None, mask=None):
+        self.roi = [tuple(int(v) for v in rect) for rect in roi or []]
+        self.polygons = [np.array(polygon, dtype=np.int32).reshape(-1, 2)
+                         for polygon in mask or []]
+        self.mask = None
+
+    def __bool__(self):
+        return bool(self.roi or self.polygons)
+
+    def masked(self, image):
+        """Copy of ``image`` with the excluded areas blacked out."""
+        if not self.polygons:
+            return image
+        if self.mask is None or self.mask.shape != image.shape[:2]:
+            self.mask = np.full(image.shape[:2], 255, dtype=np.uint8)
+            cv2.fillPoly(self.mask, self.polygons, 0)
+        return cv2.bitwise_and(image, image, mask=self.mask)
+
+    def split(self, image):
+        """Return the model inputs of ``image`` and their top left corner
+        in the frame."""
+        image = self.masked(image)
+        if not self.roi:
+            return [image], [(0, 0)]
+        h, w = image.shape[:2]
+        crops = []
+        offsets = []
+        for x1, y1, x2, y2 in self.roi:
+            x1, x2 = max(x1, 0), min(x2, w)
+            y1, y2 = max(y1, 0), min(y2, h)
+            if x2 <= x1 or y2 <= y1:
+                continue
+            crops.append(image[y1:y2, x1:x2])
+            offsets.append((x1, y1))
+        return crops, offsets
+
+    @staticmethod
+    def join(detections, offsets, iou=NMS_IOU):
+        """Detections of every crop in full frame coordinates, an object
+        seen by overlapping crops is kept once."""
+        joined = Detections.concatenate([
+            d.shift(x, y) for d, (x, y) in zip(detections, offsets)])
+        if len(offsets) < 2 or len(joined) < 2:
+            return joined
+        return suppress(joined, iou)
+
+
+def suppress(detections, iou=NMS_IOU):
+    """Non maximum suppression across the crops: the boxes overlapping a
+    more confident box of the same class by ``iou`` or more are dropped."""
+    order = np.argsort(-detections.data['confidence'], kind='stable')
+    boxes = detections.boxes[order]
+    class_ids = detections.data['class_id'][order]
+    overlap = 1 - iou_cost(boxes, boxes)
+    same = overlap >= iou
+    same &= class_ids[:, None] == class_ids[None, :]
+    dropped = np.zeros(len(order), dtype=bool)
+    for i in range(len(order)):
+        if not dropped[i]:
+            dropped[i + 1:] |= same[i, i + 1:]
+    return detections[np.sort(order[~dropped])]
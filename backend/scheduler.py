@@ -0,0 +1,295 @@
+"""Pace of the capture tasks.
+
+A task used to sleep ``beat_interval`` after each iteration, so its rate
+dropped with the inference time. The scheduler sleeps until the next beat
+instead, shortens the interval while the camera sees something, lengthens
+it while the scene stays quiet, and keeps the camera tasks together within
+a CPU budget.
+"""
+import os
+import time
+import logging
+import multiprocessing
+from .metrics import registry as metrics, alive
+
+ACTIVE_FOR = 10
+IDLE_AFTER = 60
+BACKOFF = 1.5
+LOG_INTERVAL = 60
+# weight of the last beat in the load average
+SMOOTHING = 0.2
+MAX_TASKS = 32
+# seconds without a beat after which a task no longer counts in the budget
+STALE = 300
+FIELDS = ('rate', 'interval', 'load')
+SHARE_FIELDS = ('fps', 'wait_ms', 'served', 'missed')
+
+logger = logging.getLogger(__name__)
+
+
+class CpuBudget():
+    """Load of the running tasks, in shared memory so every forked task
+    sees the others.
+
+    The load of a task is the fraction of the time it would be busy at its
+    own pace, ``cores`` bounds the sum of the loads. Each task writes its
+    own slot, the slots of dead processes and of tasks not heard of for
+    ``stale`` seconds are reused.
+    """
+
+    def __init__(self, cores=None, slots=MAX_TASKS, stale=STALE):
+        self.cores = cores
+        self.stale = stale
+        self.pids = multiprocessing.Array('i', slots)
+        self.loads = multiprocessing.Array('d', slots)
+        self.updated = multiprocessing.Array('d', slots)
+
+    def claim(self):
+        """Return a free slot for the calling task."""
+        with self.pids.get_lock():
+            for slot, pid in enumerate(self.pids[:]):
+                if pid == 0 or not alive(pid) or self._stale(slot):
+                    self.pids[slot] = os.getpid()
+                    self.loads[slot] = 0
+                    self.updated[slot] = time.time()
+                    return slot
+        raise RuntimeError('More than {} scheduled tasks'.format(
+            len(self.pids)))
+
+    def release(self, slot):
+        with self.pids.get_lock():
+            self.pids[slot] = 0
+            self.loads[slot] = 0
+
+    def update(self, slot, load):
+        self.loads[slot] = load
+        self.updated[slot] = time.time()
+
+    def _stale(self, slot):
+        return (self.stale is not None
+                and time.time() - self.updated[slot] > self.stale)
+
+    def total(self):
+        return sum(load for slot, (pid, load) in
+                   enumerate(zip(self.pids[:], self.loads[:]))
+                   if pid != 0 and not self._stale(slot))
+
+    def factor(self):
+        """Stretch of the intervals bringing the total load within the
+        budget, 1 when there is no budget or room is left."""
+        if not self.cores:
+            return 1
+        return max(1, self.total() / self.cores)
+
+
+class BeatScheduler():
+    """Fixed rate beats of a task, adapted to the activity of the camera.
+
+    ``beat`` is called at the end of each iteration and sleeps until the
+    next beat, the time spent processing is taken out of the interval and
+    a late iteration starts the next one right away without catching up.
+
+    The interval is ``active_interval`` for ``active_for`` seconds after
+    an active beat, ``interval`` in between, and grows by ``backoff`` each
+    beat up to ``max_interval`` once nothing happened for ``idle_after``
+    seconds. Every interval is stretched when the tasks go over the
+    ``budget``.
+    """
+
+    def __init__(self, name, interval, active_interval=None,
+                 max_interval=None, active_for=ACTIVE_FOR,
+                 idle_after=IDLE_AFTER, backoff=BACKOFF, budget=None,
+                 log_interval=LOG_INTERVAL):
+        self.name = name
+        self.interval = interval
+        self.active_interval = (interval / 2 if active_interval is None
+                                else active_interval)
+        self.max_interval = (interval * 4 if max_interval is None
+                             else max_interval)
+        self.active_for = active_for
+        self.idle_after = idle_after
+        self.backoff = backoff
+        self.budget = budget
+        self.log_interval = log_interval
+        # readable from the web server
+        self.counters = multiprocessing.Array('d', len(FIELDS))
+        self.pid = None
+
+    def start(self):
+        """Start beating in the current process, a forked task."""
+        self.pid = os.getpid()
+        self.slot = None if self.budget is None else self.budget.claim()
+        now = time.time()
+        self.last_active = now
+        self.idle_interval = self.interval
+        self.load = 0
+        self.beat_start = now
+        self.next_beat = now
+        self.log_start = now
+        self.beats = 0
+
+    def stop(self):
+        if self.slot is not None:
+            self.budget.release(self.slot)
+            self.slot = None
+
+    def next_interval(self, now, active):
+        """Interval until the next beat, without the budget."""
+        if active:
+            self.last_active = now
+            self.idle_interval = self.interval
+        quiet = now - self.last_active
+        if quiet < self.active_for:
+            return self.active_interval
+        if quiet < self.idle_after:
+            return self.interval
+        self.idle_interval = min(self.idle_interval * self.backoff,
+                                 self.max_interval)
+        return self.idle_interval
+
+    def beat(self, active=False):
+        """End an iteration, ``active`` if the camera saw something, and
+        wait for the next one."""
+        if self.pid != os.getpid():
+            self.start()
+        now = time.time()
+        interval = self.next_interval(now, active)
+        busy = now - self.beat_start
+        # the load before the stretch, so the stretch is load / budget
+        self.load += SMOOTHING * (busy / max(interval, busy) - self.load)
+        if self.slot is not None:
+            self.budget.update(self.slot, self.load)
+            interval *= self.budget.factor()
+
+        self.next_beat = max(self.next_beat + interval, now)
+        time.sleep(self.next_beat - now)
+        self.beat_start = time.time()
+        self._record(interval)
+
+    def _record(self, interval):
+        self.beats += 1
+        metrics.inc('beats_total', camera=self.name)
+        self.counters[1] = interval
+        self.counters[2] = self.load
+        elapsed = self.beat_start - self.log_start
+        if elapsed <= 0:
+            return
+        # beats since the start of the log window, updated every beat
+        rate = self.beats / elapsed
+        self.counters[0] = rate
+        if elapsed >= self.log_interval:
+            logger.info('%s: %.2f beats/s, interval %.2f s, load %.2f',
+                        self.name, rate, interval, self.load)
+            self.log_start = self.beat_start
+            self.beats = 0
+
+    def stats(self):
+        return dict(zip(FIELDS, self.counters[:]))
+
+
+class Share():
+    """A camera of the fair scheduler and its counters."""
+
+    def __init__(self, name, priority=1, max_rate=None, deadline=None):
+        if priority <= 0:
+            raise ValueError('The priority of {} must be positive'.format(
+                name))
+        self.name = name
+        self.priority = priority
+        self.period = 1 / max_rate if max_rate else 0
+        self.deadline = deadline
+        # readable from the web server
+        self.counters = multiprocessing.Array('d', len(SHARE_FIELDS))
+
+    def reset(self, now):
+        self.credit = 0
+        self.last_start = now - self.period
+        self.last_done = now
+        # start of the previous turn and average time between turns
+        self.previous = None
+        self.interval = None
+
+    def ready(self):
+        """Time from which the camera can be served again."""
+        return max(self.last_start + self.period, self.last_done)
+
+    def stats(self):
+        return dict(zip(SHARE_FIELDS, self.counters[:]))
+
+
+class FairScheduler():
+    """Turns of the cameras sharing a single detector.
+
+    The cameras ready to be served take turns in smooth weighted
+    round-robin, a camera of priority 2 gets twice the turns of a camera
+    of priority 1. A camera is not served more than ``max_rate`` times per
+    second, and a camera waiting longer than its ``deadline`` goes first,
+    counted as missed. The freed turns of an idle or rate limited camera go
+    to the others.
+    """
+
+    def __init__(self):
+        self.shares = dict()
+        self.pid = None
+
+    def add(self, name, priority=1, max_rate=None, deadline=None):
+        self.shares[name] = Share(name, priority, max_rate, deadline)
+
+    def start(self):
+        self.pid = os.getpid()
+        now = time.time()
+        for share in self.shares.values():
+            share.reset(now)
+        self.current = None
+
+    def next(self):
+        """Wait for a camera to be ready and return its name."""
+        if self.pid != os.getpid():
+            self.start()
+        now = time.time()
+        ready = [share for share in self.shares.values()
+                 if share.ready() <= now]
+        if not ready:
+            start = min(share.ready() for share in self.shares.values())
+            time.sleep(start - now)
+            now = time.time()
+            ready = [share for share in self.shares.values()
+                     if share.ready() <= now]
+        overdue = [share for share in ready if share.deadline is not None
+                   and now - share.ready() > share.deadline]
+        if overdue:
+            share = max(overdue, key=lambda s: now - s.ready() - s.deadline)
+            share.counters[SHARE_FIELDS.index('missed')] += 1
+        else:
+            for share in ready:
+                share.credit += share.priority
+            share = max(ready, key=lambda s: s.credit)
+            share.credit -= sum(s.priority for s in ready)
+        self._start(share, now)
+        return share.name
+
+    def _start(self, share, now):
+        wait = now - share.ready()
+        if share.previous is not None:
+            interval = now - share.previous
+            if share.interval is None:
+                share.interval = interval
+            share.interval += SMOOTHING * (interval - share.interval)
+        share.previous = share.last_start = now
+        share.last_done = float('inf')
+        self.current = share
+        share.counters[:] = [
+                1 / share.interval if share.interval else 0,
+                1000 * wait,
+                share.counters[SHARE_FIELDS.index('served')] + 1,
+                share.counters[SHARE_FIELDS.index('missed')]]
+        metrics.observe('scheduler_wait_seconds', wait, camera=share.name)
+
+    def done(self, retry_after=0):
+        """End the turn of the camera returned by ``next``, which is not
+        served again for ``retry_after`` seconds, like a failed camera."""
+        self.current.last_done = time.time() + retry_after
+        self.current = None
+
+    def stats(self):
+        return {name: share.stats() for name, share in self.shares.items()}
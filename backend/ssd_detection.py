@@ -1,82 +1,85 @@
 import os
-import json
 import cv2
 import numpy as np
-import pandas as pd
-from backend.utils import timeit, draw_boxed_text
+from backend.utils import timeit
+from backend.overlay import detections_overlay
+from backend.detections import Detections, class_lookup, load_labels
+from backend.dnn import configure, network_size, set_threads
 
 DETECTION_MODEL = 'ssd_mobilenet/'
 SWAPRB = True
-
-with open(os.path.join('models', DETECTION_MODEL, 'labels.json')) as json_data:
-    CLASS_NAMES = json.load(json_data)
+INPUT_SIZE = (300, 300)
+THRESHOLD = 0.5
+LABELS = os.path.join('models', DETECTION_MODEL, 'labels.json')
 
 
 class Detector():
     """Class ssd"""
 
     @timeit
-    def __init__(self):
+    def __init__(self, input_size=None, backend=None, target=None,
+                 threads=None, conf_th=THRESHOLD):
         self.model = cv2.dnn.readNetFromTensorflow(
                 'models/ssd_mobilenet/frozen_inference_graph.pb',
                 'models/ssd_mobilenet/ssd_mobilenet_v2_coco_2018_03_29.pbtxt')
+        configure(self.model, backend, target)
+        self.input_size = network_size(input_size, INPUT_SIZE)
+        # OpenCV threads, set before each forward pass, None is the default
+        self.threads = threads
+        self.conf_th = conf_th
         self.colors = np.random.uniform(0, 255, size=(100, 3))
+        self.class_lookup = class_lookup(load_labels(LABELS))
+
+    def preprocess(self, image):
+        return cv2.dnn.blobFromImage(image, size=self.input_size,
+                                     swapRB=SWAPRB)
+
+    def forward(self, blob):
+        set_threads(self.threads)
+        self.model.setInput(blob)
+        return self.model.forward()[0, 0, :, :]
 
     @timeit
     def prediction(self, image):
-        self.model.setInput(
-                cv2.dnn.blobFromImage(image, size=(300, 300), swapRB=SWAPRB))
-        output = self.model.forward()
-        result = output[0, 0, :, :]
-        return result
+        return self.forward(self.preprocess(image))
 
     @timeit
-    def filter_prediction(self, output, image, conf_th=0.5, conf_class=[]):
+    def predict_batch(self, images):
+        """Run a single forward pass over several images, returns the
+        prediction of each image in the layout of ``prediction``."""
+        blob = cv2.dnn.blobFromImages(images, size=self.input_size,
+                                      swapRB=SWAPRB)
+        output = self.forward(blob)
+        # first column is the index of the image in the batch
+        return [output[output[:, 0] == i] for i in range(len(images))]
+
+    @timeit
+    def filter_prediction(self, output, image, conf_th=None, conf_class=[]):
+        conf_th = self.conf_th if conf_th is None else conf_th
         height, width = image.shape[:-1]
-        df = pd.DataFrame(
-                output,
-                columns=[
-                    '_', 'class_id', 'confidence', 'x1', 'y1', 'x2', 'y2'])
-        df = df.assign(
-                x1=lambda x: (x['x1'] * width).astype(int).clip(0),
-                y1=lambda x: (x['y1'] * height).astype(int).clip(0),
-                x2=lambda x: (x['x2'] * width).astype(int),
-                y2=lambda x: (x['y2'] * height).astype(int),
-                class_name=lambda x: (
-                    x['class_id'].astype(int).astype(str).replace(CLASS_NAMES)
-                    ),
-                # TODO: don't work in python 3.5
-                # label=lambda x: (
-                #     x.class_name + ': ' + (
-                #         x['confidence'].astype(str).str.slice(stop=4)
-                #         )
-                #     )
-                )
-        df['label'] = (df['class_name'] + ': ' +
-                       df['confidence'].astype(str).str.slice(stop=4))
-        df = df[df['confidence'] > conf_th]
+        # rows are [image_id, class_id, confidence, x1, y1, x2, y2]
+        output = output[output[:, 2] > conf_th]
         if len(conf_class) > 0:
-            df = df[df['class_id'].isin(conf_class)]
-        return df
+            output = output[np.isin(output[:, 1], conf_class)]
+        boxes = (output[:, 3:7] * [width, height, width, height]).astype(int)
+        boxes[:, :2] = boxes[:, :2].clip(0)
+        return Detections.from_arrays(
+                boxes, output[:, 1].astype(int), output[:, 2], self.class_lookup)
+
+    def overlay(self, detections):
+        return detections_overlay(detections, self.colors)
 
-    def draw_boxes(self, image, df):
-        for idx, box in df.iterrows():
-            x_min, y_min, x_max, y_max = box['x1'], box['y1'], box['x2'], box['y2']
-            color = self.colors[int(box['class_id'])]
-            cv2.rectangle(image, (x_min, y_min), (x_max, y_max), color, 2)
-            txt_loc = (max(x_min+2, 0), max(y_min+2, 0))
-            txt = box['label']
-            image = draw_boxed_text(image, txt, txt_loc, color)
-        return image
+    def draw_boxes(self, image, detections):
+        return self.overlay(detections).draw(image)
 
 
 if __name__ == "__main__":
     image = cv2.imread("./imgs/image.jpeg")
-    print(CLASS_NAMES)
+    print(load_labels(LABELS))
 
     detector = Detector()
     output = detector.prediction(image)
-    df = detector.filter_prediction(output, image)
-    print(df)
-    image = detector.draw_boxes(image, df)
+    detections = detector.filter_prediction(output, image)
+    print(detections)
+    image = detector.draw_boxes(image, detections)
     cv2.imwrite("./imgs/outputcv.jpg", image)
@@ -1,20 +1,17 @@
-import os
 import cv2
-import json
 import ctypes
 import numpy as np
-import pandas as pd
 import tensorrt as trt
 import pycuda.driver as cuda
 import pycuda.autoinit  # This is needed for initializing CUDA driver
-from backend.utils import timeit, draw_boxed_text
+from backend.utils import timeit
+from backend.overlay import detections_overlay
+from backend.detections import Detections, class_lookup, load_labels
 
 conf_th = 0.3
 INPUT_HW = (300, 300)
 OUTPUT_LAYOUT=7
-
-with open(os.path.join('models/ssd_mobilenet/labels.json')) as json_data:
-    CLASS_NAMES = json.load(json_data)
+LABELS = 'models/ssd_mobilenet/labels.json'
 
 
 def _preprocess_trt(img, shape=(300, 300)):
@@ -54,8 +51,11 @@ class Detector():
         return self.engine.create_execution_context()
 
     @timeit
-    def __init__(self):
+    def __init__(self, conf_th=conf_th):
+        # the input size, backend and target are fixed by the TensorRT engine
+        self.conf_th = conf_th
         self.colors = np.random.uniform(0, 255, size=(100, 3))
+        self.class_lookup = class_lookup(load_labels(LABELS))
         self.input_shape = INPUT_HW
         self.trt_logger = trt.Logger(trt.Logger.INFO)
         self._load_plugins()
@@ -76,9 +76,10 @@ class Detector():
         del self.cuda_inputs
 
 
-    @timeit
-    def prediction(self, img):
-        img_resized = _preprocess_trt(img, self.input_shape)
+    def preprocess(self, img):
+        return _preprocess_trt(img, self.input_shape)
+
+    def forward(self, img_resized):
         np.copyto(self.host_inputs[0], img_resized.ravel())
 
         cuda.memcpy_htod_async(
@@ -96,46 +97,42 @@ class Detector():
         output = self.host_outputs[0]
         return np.reshape(output, (-1, OUTPUT_LAYOUT))
 
+    @timeit
+    def prediction(self, img):
+        return self.forward(self.preprocess(img))
+
+
+    @timeit
+    def predict_batch(self, images):
+        """The engine is built for a batch size of one, predict each image
+        in turn."""
+        return [self.prediction(image) for image in images]
 
     @timeit
-    def filter_prediction(self, output, image, conf_th=0.3, conf_class=[]):
+    def filter_prediction(self, output, image, conf_th=None, conf_class=[]):
+        conf_th = self.conf_th if conf_th is None else conf_th
         height, width = image.shape[:-1]
-        df = pd.DataFrame(
-                output,
-                columns=[
-                    '_', 'class_id', 'confidence', 'x1', 'y1', 'x2', 'y2'])
-        df = df.assign(
-                x1=lambda x: (x['x1'] * width).astype(int).clip(0),
-                y1=lambda x: (x['y1'] * height).astype(int).clip(0),
-                x2=lambda x: (x['x2'] * width).astype(int),
-                y2=lambda x: (x['y2'] * height).astype(int),
-                class_name=lambda x: (
-                    x['class_id'].astype(int).astype(str).replace(CLASS_NAMES)
-                    ),
-                )
-        df['label'] = (df['class_name'] + ': ' +
-                df['confidence'].astype(str).str.slice(stop=4))
-        df = df[df['confidence'] > conf_th]
+        # rows are [image_id, class_id, confidence, x1, y1, x2, y2]
+        output = output[output[:, 2] > conf_th]
         if len(conf_class) > 0:
-            df = df[df['class_id'].isin(conf_class)]
-        return df
-
-    def draw_boxes(self, image, df):
-        for idx, box in df.iterrows():
-            x_min, y_min, x_max, y_max = box['x1'], box['y1'], box['x2'], box['y2']
-            color = self.colors[int(box['class_id'])]
-            cv2.rectangle(image, (x_min, y_min), (x_max, y_max), color, 2)
-            txt_loc = (max(x_min+2, 0), max(y_min+2, 0))
-            txt = box['label']
-            image = draw_boxed_text(image, txt, txt_loc, color)
-        return image
+            output = output[np.isin(output[:, 1], conf_class)]
+        boxes = (output[:, 3:7] * [width, height, width, height]).astype(int)
+        boxes[:, :2] = boxes[:, :2].clip(0)
+        return Detections.from_arrays(
+                boxes, output[:, 1].astype(int), output[:, 2], self.class_lookup)
+
+    def overlay(self, detections):
+        return detections_overlay(detections, self.colors)
+
+    def draw_boxes(self, image, detections):
+        return self.overlay(detections).draw(image)
 
 if __name__ == "__main__":
     image = cv2.imread("./imgs/image.jpeg")
 
     detector = Detector()
     output = detector.prediction(image)
-    df = detector.filter_prediction(output, image, conf_th=0.3)
-    image = detector.draw_boxes(image, df)
-    print(df)
+    detections = detector.filter_prediction(output, image, conf_th=0.3)
+    image = detector.draw_boxes(image, detections)
+    print(detections)
     cv2.imwrite("./imgs/outputcv.jpg", image)
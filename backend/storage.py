@@ -0,0 +1,135 @@
+"""Background writer of the captured images.
+
+Encoding a JPEG and writing it to an SD card can take hundreds of
+milliseconds, the capture and detection loop hands the frames to a writer
+thread instead of waiting for the disk.
+"""
+import os
+import cv2
+import time
+import queue
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from .metrics import registry as metrics
+
+QUEUE_SIZE = 16
+LATENCY_WINDOW = 100
+FIELDS = ('written', 'dropped', 'errors', 'queue_depth', 'latency_ms',
+          'latency_p95_ms')
+
+logger = logging.getLogger(__name__)
+
+
+class StorageWriter():
+    """Bounded queue of images written by a thread of the worker process.
+
+    When the queue is full the ``drop`` policy discards the new image, the
+    ``block`` policy makes the caller wait for a free slot, at most
+    ``timeout`` seconds. Day directories known to exist are cached. The
+    stage durations are labelled with ``camera``.
+
+    The thread is started by the first ``submit``, in the process of the
+    task, while the counters live in shared memory created with the camera
+    so the web server can read them.
+    """
+
+    def __init__(self, queue_size=QUEUE_SIZE, policy='drop', timeout=None,
+                 camera=None):
+        if policy not in ('drop', 'block'):
+            raise ValueError('Unknown storage policy {}'.format(policy))
+        self.labels = dict() if camera is None else dict(camera=camera)
+        self.queue_size = queue_size
+        self.policy = policy
+        self.timeout = timeout
+        self.counters = multiprocessing.Array('d', len(FIELDS))
+        self.queue = None
+        self.pid = None
+
+    def start(self):
+        self.queue = queue.Queue(maxsize=self.queue_size)
+        self.pid = os.getpid()
+        self.directories = set()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, filename, image, overlay=None, callback=None):
+        """Queue ``image`` to be written to ``filename``, annotated by
+        ``overlay`` if given, then ``callback(filename, image)`` is called
+        by the writer. Return False if the image was dropped."""
+        if self.pid != os.getpid():
+            # first image of this process, a forked task
+            self.start()
+        job = (filename, image, overlay, callback)
+        try:
+            if self.policy == 'block':
+                self.queue.put(job, timeout=self.timeout)
+            else:
+                self.queue.put_nowait(job)
+        except queue.Full:
+            self._count('dropped')
+            logger.warning('Storage queue full, dropped %s', filename)
+            return False
+        self._set('queue_depth', self.queue.qsize())
+        return True
+
+    def join(self):
+        """Wait until the queued images are written."""
+        if self.queue is not None:
+            self.queue.join()
+
+    def stats(self):
+        return dict(zip(FIELDS, self.counters[:]))
+
+    def _count(self, field):
+        with self.counters.get_lock():
+            self.counters[FIELDS.index(field)] += 1
+
+    def _set(self, field, value):
+        self.counters[FIELDS.index(field)] = value
+
+    def _run(self):
+        while True:
+            filename, image, overlay, callback = self.queue.get()
+            try:
+                start = time.time()
+                if overlay is not None:
+                    with metrics.timer('stage_seconds', stage='draw',
+                                       **self.labels):
+                        image = overlay.compose(image)
+                with metrics.timer('stage_seconds', stage='storage',
+                                   **self.labels):
+                    self.write(filename, image)
+                self.latencies.append(time.time() - start)
+                self._count('written')
+                if callback is not None:
+                    callback(filename, image)
+            except Exception:
+                self._count('errors')
+                logger.exception('Could not store %s', filename)
+            finally:
+                self.queue.task_done()
+            window = sorted(self.latencies)
+            if window:
+                self._set('latency_ms', 1000 * sum(window) / len(window))
+                self._set('latency_p95_ms',
+                          1000 * window[int(0.95 * len(window))])
+            self._set('queue_depth', self.queue.qsize())
+
+    def write(self, filename, image):
+        directory = os.path.dirname(filename)
+        if directory not in self.directories:
+            os.makedirs(directory, exist_ok=True)
+            self.directories.add(directory)
+        ok, data = cv2.imencode(os.path.splitext(filename)[1], image)
+        if not ok:
+            raise RuntimeError('Could not encode {}'.format(filename))
+        try:
+            f = open(filename, 'wb')
+        except FileNotFoundError:
+            # the directory was removed since it was cached
+            os.makedirs(directory, exist_ok=True)
+            f = open(filename, 'wb')
+        with f:
+            f.write(data.tobytes())
@@ -0,0 +1,75 @@
+"""Encode once, serve many: MJPEG streaming of camera frames."""
+import time
+from .channel import FrameChannel
+
+BOUNDARY = 'frame'
+MIMETYPE = 'multipart/x-mixed-replace; boundary={}'.format(BOUNDARY)
+
+
+class FrameBroadcast(FrameChannel):
+    """Holds the latest encoded frame of a stream.
+
+    The producer publishes every frame without waiting for anybody, each
+    viewer picks the newest frame when it is ready for one, so slow viewers
+    skip frames instead of stalling the producer.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.viewers = 0
+        self.last_viewer = time.time()
+
+    def subscribe(self, keepalive=None, timeout=5):
+        """Multipart chunks for a single viewer, counted as a viewer from
+        now until the chunks are closed."""
+        with self.condition:
+            self.viewers += 1
+        return Subscription(self, self._chunks(keepalive, timeout))
+
+    def _chunks(self, keepalive, timeout):
+        seq = 0
+        header = ('--{}\r\nContent-Type: image/jpeg\r\n'
+                  'Content-Length: {{}}\r\n\r\n').format(BOUNDARY)
+        while True:
+            if keepalive is not None:
+                keepalive()
+            new_seq, data = self.wait_newer(seq, timeout)
+            if new_seq == seq or data is None:
+                continue
+            seq = new_seq
+            yield header.format(len(data)).encode()
+            yield data
+            yield b'\r\n'
+
+    def unsubscribe(self):
+        with self.condition:
+            self.viewers -= 1
+            self.last_viewer = time.time()
+
+    def idle_for(self):
+        """Seconds elapsed since the last viewer left, 0 while watched."""
+        if self.viewers > 0:
+            return 0
+        return time.time() - self.last_viewer
+
+
+class Subscription():
+    """Chunks of a viewer, the viewer leaves when the server closes them,
+    even before the first chunk was read."""
+
+    def __init__(self, broadcast, chunks):
+        self.broadcast = broadcast
+        self.chunks = chunks
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.chunks)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.chunks.close()
+            self.broadcast.unsubscribe()
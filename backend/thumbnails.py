@@ -0,0 +1,130 @@
+"""On-disk cache of the resized and annotated previews of the gallery.
+
+OpenCV is imported by the first preview rendered, serving the cached ones
+doesn't need it.
+"""
+import os
+import shutil
+import hashlib
+import threading
+from datetime import datetime
+
+THUMBNAIL_FOLDER = os.path.join('cache', 'thumbnails')
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def render_preview(image, w=None, h=None, date=None):
+    """Resize the image to (w, h) or write the capture date on it."""
+    import cv2
+    if w and h:
+        image = cv2.resize(image, (int(w), int(h)))
+    elif date:
+        date = (datetime
+                .strptime(date, "%Y%m%d_%H%M%S")
+                .strftime("%d %b %-H:%M")
+                )
+        img_h, img_w = image.shape[:-1]
+        cv2.putText(
+                image, "{}".format(date), (0, int(img_h*0.98)),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+    return cv2.imencode('.jpg', image)[1].tobytes()
+
+
+def _digest(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class ThumbnailCache():
+    """Previews stored as ``<folder>/<source hash>/<variant hash>.jpg``.
+
+    The variant hash covers the mtime of the source and the requested size
+    and overlay, so a modified source never hits a stale entry. Reads only
+    open a file; entries are written to a temporary file and renamed, so a
+    reader never sees a partial preview and doesn't need a lock. Entries are
+    touched when read and the least recently used ones are evicted once the
+    cache grows past ``max_bytes``.
+    """
+
+    def __init__(self, folder=THUMBNAIL_FOLDER, max_bytes=MAX_CACHE_BYTES):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.size = None
+        self.lock = threading.Lock()
+
+    def source_folder(self, path):
+        return os.path.join(self.folder, _digest(os.path.normpath(path)))
+
+    def entry(self, path, w=None, h=None, date=None):
+        mtime = os.stat(path).st_mtime_ns
+        variant = _digest('{}:{}:{}:{}'.format(mtime, w, h, date))
+        return os.path.join(self.source_folder(path), variant[:20] + '.jpg')
+
+    def get(self, path, w=None, h=None, date=None, image=None):
+        """Return the jpeg bytes of a preview, rendering it on a miss.
+
+        ``image`` is the decoded source when the caller already has it.
+        """
+        entry = self.entry(path, w, h, date)
+        try:
+            with open(entry, 'rb') as cached:
+                data = cached.read()
+            os.utime(entry)
+            return data
+        except FileNotFoundError:
+            pass
+        if image is None:
+            import cv2
+            image = cv2.imread(path)
+        data = render_preview(image, w, h, date)
+        self.store(entry, data)
+        return data
+
+    def store(self, entry, data):
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        tmp_entry = '{}.{}.{}.tmp'.format(
+                entry, os.getpid(), threading.get_ident())
+        with open(tmp_entry, 'wb') as cached:
+            cached.write(data)
+        os.replace(tmp_entry, entry)
+        with self.lock:
+            if self.size is None:
+                self.size = sum(size for _, size, _ in self._entries())
+            else:
+                self.size += len(data)
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _evict(self):
+        """Drop the least recently used entries down to 80% of the limit."""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        self.size = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if self.size <= self.max_bytes * 0.8:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.size -= size
+
+    def invalidate(self, path):
+        """Forget every preview of a source image."""
+        folder = self.source_folder(path)
+        removed = 0
+        if os.path.isdir(folder):
+            removed = sum(os.path.getsize(os.path.join(folder, name))
+                          for name in os.listdir(folder))
+        shutil.rmtree(folder, ignore_errors=True)
+        with self.lock:
+            if self.size is not None:
+                self.size = max(0, self.size - removed)
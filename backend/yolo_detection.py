@@ -1,104 +1,113 @@
 import os
 import cv2
-import json
 import numpy as np
-import pandas as pd
-from backend.utils import timeit, draw_boxed_text
+from backend.utils import timeit
+from backend.overlay import detections_overlay
+from backend.detections import Detections, class_lookup, load_labels
+from backend.dnn import configure, network_size, set_threads
 
 DETECTION_MODEL = 'yolo'
 THRESHOLD = 0.3
 SCALE = 0.00392  # 1/255
 NMS_THRESHOLD = 0.4  # Non Maximum Supression threshold
 SWAPRB = True
+# a multiple of 32, smaller is faster and misses the small objects
+INPUT_SIZE = (416, 416)
+LABELS = os.path.join('./models', DETECTION_MODEL, 'labels.json')
 
-with open(
-        os.path.join('./models', DETECTION_MODEL, 'labels.json')
-        ) as json_data:
-    CLASS_NAMES = json.load(json_data)
 
-
-def filter_yolo(chunk):
-    pred = np.argmax(chunk[:, 5:], axis=1)
-    prob = np.max(chunk[:, 5:], axis=1)
-    df = pd.DataFrame(
-            np.concatenate(
-                [chunk[:, :4], pred.reshape(-1, 1), prob.reshape(-1, 1)],
-                axis=1
-                ),
-            columns=[
-                'center_x', 'center_y', 'w', 'h', 'class_id', 'confidence'])
-    df = df[df['confidence'] > THRESHOLD]
-    return df
+def filter_yolo(chunk, conf_th=THRESHOLD):
+    """Best class of each row of an output layer, thresholded before any
+    other work. Rows are [center_x, center_y, w, h, objectness, scores...]"""
+    scores = chunk[:, 5:]
+    class_id = np.argmax(scores, axis=1)
+    confidence = scores[np.arange(len(scores)), class_id]
+    keep = confidence > conf_th
+    return chunk[keep, :4], class_id[keep], confidence[keep]
 
 
 class Detector():
     """Class yolo"""
 
     @timeit
-    def __init__(self):
+    def __init__(self, input_size=None, backend=None, target=None,
+                 threads=None, conf_th=THRESHOLD):
         self.model = cv2.dnn.readNetFromDarknet(
                 # 'models/yolo/yolov3.cfg',
                 # 'models/yolo/yolov3.weights')
                 'models/yolo/yolov3-tiny.cfg',
                 'models/yolo/yolov3-tiny.weights')
-        self.colors = np.random.uniform(0, 255, size=(len(CLASS_NAMES), 3))
+        configure(self.model, backend, target)
+        self.input_size = network_size(input_size, INPUT_SIZE)
+        # OpenCV threads, set before each forward pass, None is the default
+        self.threads = threads
+        self.conf_th = conf_th
+        class_names = load_labels(LABELS)
+        self.class_lookup = class_lookup(class_names)
+        self.colors = np.random.uniform(0, 255, size=(len(class_names), 3))
 
     def get_output_layers(self, net):
         layer_names = net.getLayerNames()
-        output_layers = [layer_names[i[0] - 1]
-                         for i in net.getUnconnectedOutLayers()]
+        output_layers = [layer_names[i - 1]
+                         for i in np.array(net.getUnconnectedOutLayers()).flatten()]
         return output_layers
 
-    @timeit
-    def prediction(self, image):
-        blob = cv2.dnn.blobFromImage(image, SCALE, (416, 416), (0, 0, 0),
+    def preprocess(self, image):
+        return cv2.dnn.blobFromImage(image, SCALE, self.input_size, (0, 0, 0),
                                      swapRB=SWAPRB, crop=False)
+
+    def forward(self, blob):
+        set_threads(self.threads)
         self.model.setInput(blob)
-        output = self.model.forward(self.get_output_layers(self.model))
-        return output
+        return self.model.forward(self.get_output_layers(self.model))
 
     @timeit
-    def filter_prediction(self, output, image):
+    def prediction(self, image):
+        return self.forward(self.preprocess(image))
+
+    @timeit
+    def predict_batch(self, images):
+        """Run a single forward pass over several images, returns the
+        prediction of each image in the layout of ``prediction``."""
+        blob = cv2.dnn.blobFromImages(images, SCALE, self.input_size,
+                                      (0, 0, 0), swapRB=SWAPRB, crop=False)
+        output = self.forward(blob)
+        if len(images) == 1:
+            return [output]
+        # each output layer is (batch, boxes, 85)
+        return [[layer[i] for layer in output] for i in range(len(images))]
+
+    @timeit
+    def filter_prediction(self, output, image, conf_th=None, conf_class=[]):
+        conf_th = self.conf_th if conf_th is None else conf_th
         image_height, image_width, _ = image.shape
-        df = pd.concat([filter_yolo(i) for i in output])
-        df = df.assign(
-                center_x=lambda x: (x['center_x'] * image_width),
-                center_y=lambda x: (x['center_y'] * image_height),
-                w=lambda x: (x['w'] * image_width),
-                h=lambda x: (x['h'] * image_height),
-                x1=lambda x: (x.center_x - (x.w / 2)).astype(int).clip(0),
-                y1=lambda x: (x.center_y - (x.h / 2)).astype(int).clip(0),
-                x2=lambda x: (x.x1 + x.w).astype(int),
-                y2=lambda x: (x.y1 + x.h).astype(int),
-                class_name=lambda x: (
-                    x['class_id']
-                    .astype(int).astype(str).replace(CLASS_NAMES)),
-                # TODO: python 3.5 fix
-                # label=lambda x: (
-                #     x.class_name + ': ' + (
-                #         x['confidence'].astype(str).str.slice(stop=4)
-                #         )
-                #     )
-                )
-        df['label'] = (df['class_name'] + ': ' +
-                       df['confidence'].astype(str).str.slice(stop=4))
-        cols = ['x1', 'y1', 'w', 'h']
+        chunks = [filter_yolo(i, conf_th) for i in output]
+        boxes = np.concatenate([chunk[0] for chunk in chunks])
+        class_id = np.concatenate([chunk[1] for chunk in chunks])
+        confidence = np.concatenate([chunk[2] for chunk in chunks])
+        if len(conf_class) > 0:
+            keep = np.isin(class_id, conf_class)
+            boxes, class_id, confidence = (
+                    boxes[keep], class_id[keep], confidence[keep])
+        boxes = boxes * [image_width, image_height, image_width, image_height]
+        w, h = boxes[:, 2], boxes[:, 3]
+        x1 = (boxes[:, 0] - (w / 2)).astype(int).clip(0)
+        y1 = (boxes[:, 1] - (h / 2)).astype(int).clip(0)
+        x2 = (x1 + w).astype(int)
+        y2 = (y1 + h).astype(int)
         indices = cv2.dnn.NMSBoxes(
-                df[cols].values.tolist(),
-                df['confidence'].tolist(), THRESHOLD, NMS_THRESHOLD)
-        if len(indices) > 0:
-            df = df.iloc[indices.flatten()]
-        return df
-
-    def draw_boxes(self, image, df):
-        for idx, box in df.iterrows():
-            x_min, y_min, x_max, y_max = box['x1'], box['y1'], box['x2'], box['y2']
-            color = self.colors[int(box['class_id'])]
-            cv2.rectangle(image, (x_min, y_min), (x_max, y_max), color, 2)
-            txt_loc = (max(x_min+2, 0), max(y_min+2, 0))
-            txt = box['label']
-            image = draw_boxed_text(image, txt, txt_loc, color)
-        return image
+                np.stack([x1, y1, w, h], axis=1).tolist(),
+                confidence.tolist(), conf_th, NMS_THRESHOLD)
+        indices = np.array(indices, dtype=int).flatten()
+        return Detections.from_arrays(
+                np.stack([x1, y1, x2, y2], axis=1)[indices],
+                class_id[indices], confidence[indices], self.class_lookup)
+
+    def overlay(self, detections):
+        return detections_overlay(detections, self.colors)
+
+    def draw_boxes(self, image, detections):
+        return self.overlay(detections).draw(image)
 
 
 if __name__ == "__main__":
@@ -106,8 +115,8 @@ if __name__ == "__main__":
 
     detector = Detector()
     output = detector.prediction(image)
-    df = detector.filter_prediction(output, image)
-    print(df)
-    image = detector.draw_boxes(image, df)
+    detections = detector.filter_prediction(output, image)
+    print(detections)
+    image = detector.draw_boxes(image, detections)
 
     cv2.imwrite("./imgs/outputcv.jpg", image)
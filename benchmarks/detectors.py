@@ -0,0 +1,209 @@
+"""Latency and throughput of the detectors, end to end and per stage.
+
+    python -m benchmarks.detectors
+    python -m benchmarks.detectors --models motion cascade \
+        --resolutions 640x480 --video imgs/sample.mp4 --compare previous.json
+
+Every model runs over synthetic frames (noise with moving boxes) and over
+recorded frames, the sample image or the frames of ``--video``, at each
+resolution. The stages are the detector's preprocess, forward,
+filter_prediction and draw_boxes, then CentroidTracker.update. The first
+``--warmup`` frames are timed apart from the measured ones.
+
+The results are printed and saved as JSON in benchmarks/results, with
+``--compare`` the p95 latencies are checked against a previous run.
+"""
+import os
+import cv2
+import sys
+import json
+import time
+import argparse
+import platform
+import numpy as np
+from datetime import datetime
+from importlib import import_module
+from backend.centroidtracker import CentroidTracker
+
+MODELS = ['ssd_detection', 'yolo_detection', 'motion', 'cascade']
+RESOLUTIONS = ['640x480', '1280x720', '1920x1080']
+STAGES = ['preprocess', 'forward', 'filter_prediction', 'draw_boxes',
+          'tracker_update']
+FRAMES = 50
+WARMUP = 5
+SAMPLE_IMAGE = 'imgs/image.jpeg'
+RESULTS_FOLDER = 'benchmarks/results'
+# slowdown of the p95 latency reported by --compare
+TOLERANCE = 0.2
+
+
+def synthetic_frames(width, height, count, seed=0):
+    """Noisy background crossed by a few moving boxes."""
+    rng = np.random.default_rng(seed)
+    background = rng.integers(0, 255, size=(height, width, 3), dtype=np.uint8)
+    boxes = rng.uniform(0, 1, size=(4, 2)) * [width, height]
+    speeds = rng.uniform(-0.01, 0.01, size=(4, 2)) * [width, height]
+    size = max(width, height) // 10
+    for _ in range(count):
+        frame = background.copy()
+        boxes = (boxes + speeds) % [width, height]
+        for x, y in boxes.astype(int):
+            frame[y:y+size, x:x+size] = 255
+        yield frame
+
+
+def recorded_frames(width, height, count, video=None):
+    """Frames of a video, looped if too short, or the sample image."""
+    if video is None:
+        frames = [cv2.imread(SAMPLE_IMAGE)]
+    else:
+        capture = cv2.VideoCapture(video)
+        frames = []
+        while len(frames) < count:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            frames.append(frame)
+        capture.release()
+        if not frames:
+            raise RuntimeError('Could not read {}'.format(video))
+    for i in range(count):
+        yield cv2.resize(frames[i % len(frames)], (width, height))
+
+
+def percentiles(values):
+    values = np.array(values) * 1000
+    return dict(
+            mean_ms=float(values.mean()),
+            p50_ms=float(np.percentile(values, 50)),
+            p95_ms=float(np.percentile(values, 95)),
+            p99_ms=float(np.percentile(values, 99)))
+
+
+def run(detector, frames, warmup):
+    """Time each stage over ``frames``, the first ``warmup`` apart."""
+    tracker = CentroidTracker()
+    timings = {stage: [] for stage in STAGES + ['end_to_end']}
+    for frame in frames:
+        times = []
+        start = time.perf_counter()
+        inputs = detector.preprocess(frame)
+        times.append(time.perf_counter())
+        output = detector.forward(inputs)
+        times.append(time.perf_counter())
+        detections = detector.filter_prediction(output, frame)
+        times.append(time.perf_counter())
+        detector.draw_boxes(frame, detections)
+        times.append(time.perf_counter())
+        tracker.update(detections.boxes)
+        times.append(time.perf_counter())
+        previous = start
+        for stage, end in zip(STAGES, times):
+            timings[stage].append(end - previous)
+            previous = end
+        timings['end_to_end'].append(previous - start)
+    result = dict()
+    for stage, values in timings.items():
+        result[stage] = dict(warmup_ms=1000 * float(np.mean(values[:warmup])),
+                             **percentiles(values[warmup:]))
+    result['throughput_fps'] = 1 / float(np.mean(timings['end_to_end'][warmup:]))
+    return result
+
+
+def benchmark(models, resolutions, frames, warmup, video=None):
+    results = dict()
+    for model in models:
+        try:
+            Detector = import_module('backend.{}'.format(model)).Detector
+            start = time.perf_counter()
+            detector = Detector()
+            load_ms = 1000 * (time.perf_counter() - start)
+        except Exception as e:
+            print('{}: skipped, {}'.format(model, str(e).splitlines()[0]))
+            results[model] = dict(error=str(e))
+            continue
+        results[model] = dict(load_ms=load_ms)
+        for resolution in resolutions:
+            width, height = map(int, resolution.split('x'))
+            count = frames + warmup
+            sources = dict(
+                    synthetic=synthetic_frames(width, height, count),
+                    recorded=recorded_frames(width, height, count, video))
+            for source, source_frames in sources.items():
+                key = '{} {}'.format(source, resolution)
+                results[model][key] = result = run(
+                        detector, source_frames, warmup)
+                print('{:<16}{:<22}{:>8.1f} ms p50 {:>8.1f} ms p95 '
+                      '{:>8.1f} ms p99 {:>8.1f} fps'.format(
+                          model, key, result['end_to_end']['p50_ms'],
+                          result['end_to_end']['p95_ms'],
+                          result['end_to_end']['p99_ms'],
+                          result['throughput_fps']))
+    return results
+
+
+def compare(results, previous, tolerance=TOLERANCE):
+    """Stages whose p95 latency grew more than ``tolerance``."""
+    regressions = []
+    for model, runs in results.items():
+        for key, stages in runs.items():
+            if not isinstance(stages, dict):
+                continue
+            before = previous.get('results', {}).get(model, {}).get(key)
+            if not isinstance(before, dict):
+                continue
+            for stage, timing in stages.items():
+                if not isinstance(timing, dict) or stage not in before:
+                    continue
+                old, new = before[stage]['p95_ms'], timing['p95_ms']
+                if new > old * (1 + tolerance) and new - old > 0.1:
+                    regressions.append((model, key, stage, old, new))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--models', nargs='+', default=MODELS)
+    parser.add_argument('--resolutions', nargs='+', default=RESOLUTIONS)
+    parser.add_argument('--frames', type=int, default=FRAMES)
+    parser.add_argument('--warmup', type=int, default=WARMUP)
+    parser.add_argument('--video', help='recorded frames, instead of '
+                        'the sample image')
+    parser.add_argument('--output', help='JSON file of the results')
+    parser.add_argument('--compare', help='JSON file of a previous run')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help='p95 slowdown reported as a regression')
+    args = parser.parse_args(argv)
+
+    results = benchmark(args.models, args.resolutions, args.frames,
+                        args.warmup, args.video)
+    report = dict(
+            date=datetime.now().isoformat(),
+            machine=platform.machine(),
+            python=platform.python_version(),
+            opencv=cv2.__version__,
+            frames=args.frames,
+            warmup=args.warmup,
+            video=args.video,
+            results=results)
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_FOLDER, exist_ok=True)
+        output = os.path.join(RESULTS_FOLDER, '{}.json'.format(
+            datetime.now().strftime('%Y%m%d%H%M%S')))
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('Results saved to {}'.format(output))
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for model, key, stage, old, new in regressions:
+            print('Regression {} {} {}: p95 {:.1f} ms -> {:.1f} ms'.format(
+                model, key, stage, old, new))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""Latency of the HTTP API under concurrent clients.
+
+    python -m benchmarks.load --url http://localhost:5000/
+    python -m benchmarks.load --url http://localhost:5000/ --clients 1 8 32 \
+        --slow 'api/single_image?cameraName=webcam&detection=true'
+
+Run it against the Flask server (``make up``) then against the ASGI server
+(``make up-asgi``) and compare. Each level of ``--clients`` sends requests
+for ``--duration`` seconds: every fifth client calls the ``--slow`` route,
+which waits for a frame and runs the model, the others call the ``--fast``
+routes, which should not wait behind the slow ones.
+
+The results are printed and saved as JSON in benchmarks/results.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import numpy as np
+import urllib.request
+from datetime import datetime
+from urllib.parse import urljoin
+
+CLIENTS = [1, 4, 16, 64]
+DURATION = 10
+SLOW = 'api/single_image?cameraName=webcam&detection=true'
+FAST = ['api/task/status', 'api/list_files?condition=years']
+TIMEOUT = 60
+RESULTS_FOLDER = 'benchmarks/results'
+
+
+def client(url, deadline, latencies, errors):
+    while time.time() < deadline:
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url, timeout=TIMEOUT) as response:
+                response.read()
+            latencies.append(time.perf_counter() - start)
+        except Exception:
+            errors.append(url)
+
+
+def percentiles(values):
+    if not values:
+        return dict(count=0)
+    values = np.array(values) * 1000
+    return dict(
+            count=len(values),
+            mean_ms=float(values.mean()),
+            p50_ms=float(np.percentile(values, 50)),
+            p95_ms=float(np.percentile(values, 95)),
+            p99_ms=float(np.percentile(values, 99)))
+
+
+def run(url, clients, duration, slow, fast):
+    """Latencies of each route with ``clients`` concurrent clients."""
+    routes = [slow if i % 5 == 0 else fast[i % len(fast)]
+              for i in range(clients)]
+    latencies = {route: [] for route in routes}
+    errors = []
+    deadline = time.time() + duration
+    threads = [threading.Thread(target=client, args=(
+        urljoin(url, route), deadline, latencies[route], errors))
+        for route in routes]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result = {route: percentiles(values)
+              for route, values in latencies.items()}
+    result['throughput_rps'] = sum(
+            len(values) for values in latencies.values()) / duration
+    result['errors'] = len(errors)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:5000/')
+    parser.add_argument('--clients', nargs='+', type=int, default=CLIENTS)
+    parser.add_argument('--duration', type=float, default=DURATION)
+    parser.add_argument('--slow', default=SLOW)
+    parser.add_argument('--fast', nargs='+', default=FAST)
+    parser.add_argument('--output', help='JSON file of the results')
+    args = parser.parse_args(argv)
+
+    results = dict()
+    for clients in args.clients:
+        results[clients] = result = run(args.url, clients, args.duration,
+                                        args.slow, args.fast)
+        for route in [args.slow] + args.fast:
+            if route in result and result[route]['count']:
+                print('{:>4} clients {:<48}{:>9.1f} ms p50 {:>9.1f} ms p95'
+                      .format(clients, route, result[route]['p50_ms'],
+                              result[route]['p95_ms']))
+        print('{:>4} clients {:.1f} requests/s, {} errors'.format(
+            clients, result['throughput_rps'], result['errors']))
+    report = dict(date=datetime.now().isoformat(), url=args.url,
+                  duration=args.duration, results=results)
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_FOLDER, exist_ok=True)
+        output = os.path.join(RESULTS_FOLDER, 'load-{}.json'.format(
+            datetime.now().strftime('%Y%m%d%H%M%S')))
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('Results saved to {}'.format(output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
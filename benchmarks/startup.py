@@ -0,0 +1,103 @@
+"""Cold start time of the web server.
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 10 --camera webcam
+
+Each run is a new Python process, which imports backend.app, creates the
+app and serves a first gallery request, then with ``--camera`` a first
+frame of that camera. The heavy modules loaded after each stage are
+listed, the gallery should not need OpenCV, numpy or pandas.
+
+The results are printed and saved as JSON in benchmarks/results.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from datetime import datetime
+
+RUNS = 5
+HEAVY_MODULES = ['cv2', 'numpy', 'pandas', 'scipy', 'backend.camera']
+RESULTS_FOLDER = 'benchmarks/results'
+
+
+def loaded():
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+
+def child(camera=None):
+    """Time the stages of a single start, in the current process."""
+    stages = dict()
+    start = time.perf_counter()
+    import backend.app
+    stages['import'] = dict(seconds=time.perf_counter() - start,
+                            modules=loaded())
+    client = backend.app.create_app().test_client()
+    stages['create_app'] = dict(seconds=time.perf_counter() - start,
+                                modules=loaded())
+    client.get('/api/images')
+    stages['gallery_request'] = dict(seconds=time.perf_counter() - start,
+                                     modules=loaded())
+    if camera is not None:
+        client.get('/api/single_image?cameraName={}'.format(camera))
+        stages['first_frame'] = dict(seconds=time.perf_counter() - start,
+                                     modules=loaded())
+    return stages
+
+
+def benchmark(runs, camera=None):
+    """Stages of ``runs`` cold starts, seconds since the start."""
+    samples = []
+    for _ in range(runs):
+        command = [sys.executable, '-m', 'benchmarks.startup', '--child']
+        if camera is not None:
+            command += ['--camera', camera]
+        output = subprocess.run(command, stdout=subprocess.PIPE, check=True,
+                                universal_newlines=True).stdout
+        samples.append(json.loads(output.splitlines()[-1]))
+    results = dict()
+    for stage in samples[0]:
+        seconds = [sample[stage]['seconds'] for sample in samples]
+        results[stage] = dict(
+                median_ms=1000 * statistics.median(seconds),
+                max_ms=1000 * max(seconds),
+                modules=samples[0][stage]['modules'])
+        print('{:<18}{:>8.1f} ms median {:>8.1f} ms max  loaded: {}'.format(
+            stage, results[stage]['median_ms'], results[stage]['max_ms'],
+            ', '.join(results[stage]['modules']) or '-'))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=RUNS)
+    parser.add_argument('--camera', help='also time a first frame of it')
+    parser.add_argument('--output', help='JSON file of the results')
+    parser.add_argument('--child', action='store_true',
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(child(args.camera)), flush=True)
+        # the camera threads and the task processes are not waited for
+        os._exit(0)
+    results = benchmark(args.runs, args.camera)
+    report = dict(date=datetime.now().isoformat(),
+                  python=sys.version.split()[0], runs=args.runs,
+                  camera=args.camera, results=results)
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_FOLDER, exist_ok=True)
+        output = os.path.join(RESULTS_FOLDER, 'startup-{}.json'.format(
+            datetime.now().strftime('%Y%m%d%H%M%S')))
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('Results saved to {}'.format(output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
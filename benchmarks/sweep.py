@@ -0,0 +1,199 @@
+"""Latency and detection agreement of the model settings of a camera.
+
+    python -m benchmarks.sweep
+    python -m benchmarks.sweep --models yolo_detection --input-sizes 416 320 \
+        --targets cpu opencl_fp16 --threads 1 2 4 --video imgs/sample.mp4
+
+Each combination of the settings runs over the recorded frames, the sample
+image or the frames of ``--video``. The detections are compared with the
+ones of the model's default settings: the agreement is the F1 score of the
+boxes matched with the same class and an IoU of at least ``--iou``.
+
+The fastest settings agreeing with the defaults by at least
+``--min-agreement`` are printed as a ``model:`` entry of config.yml. The
+results are saved as JSON in benchmarks/results.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import numpy as np
+from datetime import datetime
+from backend.dnn import ModelSpec
+from backend.centroidtracker import iou_cost
+from benchmarks.detectors import recorded_frames, percentiles
+
+MODELS = ['ssd_detection', 'yolo_detection']
+FRAMES = 50
+WARMUP = 5
+RESOLUTION = '1280x720'
+IOU = 0.5
+MIN_AGREEMENT = 0.9
+RESULTS_FOLDER = 'benchmarks/results'
+
+
+def grid(model, input_sizes, backends, targets, threads, conf_th):
+    """Specs of every combination of the settings, None is the default."""
+    for values in itertools.product(input_sizes, backends, targets, threads,
+                                    conf_th):
+        settings = dict(zip(('input_size', 'backend', 'target', 'threads',
+                             'conf_th'), values), name=model)
+        yield ModelSpec.parse({key: value for key, value in settings.items()
+                               if value is not None})
+
+
+def agreement(detections, reference, iou=IOU):
+    """F1 score of ``detections`` against ``reference``, a pair of boxes
+    matches with the same class and an IoU of at least ``iou``."""
+    if not len(detections) and not len(reference):
+        return 1.0
+    if not len(detections) or not len(reference):
+        return 0.0
+    overlap = 1 - iou_cost(reference.boxes, detections.boxes)
+    overlap[reference.data['class_id'][:, None]
+            != detections.data['class_id'][None, :]] = 0
+    rows, cols = set(), set()
+    # greedy matching, best overlaps first
+    for row, col in zip(*np.unravel_index(np.argsort(-overlap, axis=None),
+                                          overlap.shape)):
+        if overlap[row, col] < iou:
+            break
+        if row not in rows and col not in cols:
+            rows.add(row)
+            cols.add(col)
+    return 2 * len(rows) / (len(detections) + len(reference))
+
+
+def run(detector, frames, warmup):
+    """Latency of each frame after ``warmup`` frames, and detections."""
+    for frame in frames[:warmup]:
+        detector.prediction(frame)
+    latencies, detections = [], []
+    for frame in frames:
+        start = time.perf_counter()
+        output = detector.prediction(frame)
+        result = detector.filter_prediction(output, frame)
+        latencies.append(time.perf_counter() - start)
+        detections.append(result)
+    return latencies, detections
+
+
+def sweep(specs, frames, warmup, iou):
+    """Result of each spec, the first one is the reference."""
+    results = dict()
+    reference = None
+    for spec in specs:
+        try:
+            detector = spec.load()
+            latencies, detections = run(detector, frames, warmup)
+        except Exception as e:
+            print('{}: skipped, {}'.format(spec, str(e).splitlines()[0]))
+            results[str(spec)] = dict(error=str(e))
+            continue
+        if reference is None:
+            reference = detections
+        scores = [agreement(found, expected, iou)
+                  for found, expected in zip(detections, reference)]
+        results[str(spec)] = result = dict(
+                settings=dict(spec.settings),
+                agreement=float(np.mean(scores)),
+                detections=sum(len(found) for found in detections),
+                **percentiles(latencies))
+        print('{:<64}{:>8.1f} ms p50 {:>8.1f} ms p95 {:>6.1%} agreement'
+              .format(str(spec), result['p50_ms'], result['p95_ms'],
+                      result['agreement']))
+    return results
+
+
+def best(model, results, min_agreement):
+    """Fastest settings agreeing enough with the reference."""
+    candidates = [result for result in results.values()
+                  if result.get('agreement', 0) >= min_agreement]
+    if not candidates:
+        return None
+    fastest = min(candidates, key=lambda result: result['p95_ms'])
+    return dict(name=model, **fastest['settings'])
+
+
+def config_entry(model):
+    lines = ['model:'] + ['  {}: {}'.format(
+        key, list(value) if isinstance(value, tuple) else value)
+        for key, value in model.items()]
+    return '\n'.join(lines)
+
+
+def size(value):
+    """Input size argument, a side or WIDTHxHEIGHT, 'default' is None."""
+    if value == 'default':
+        return None
+    if 'x' in value:
+        return list(map(int, value.split('x')))
+    return int(value)
+
+
+def setting(cast):
+    def parse(value):
+        return None if value == 'default' else cast(value)
+    return parse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--models', nargs='+', default=MODELS)
+    parser.add_argument('--input-sizes', nargs='+', type=size,
+                        default=[None, 320])
+    parser.add_argument('--backends', nargs='+', type=setting(str),
+                        default=[None])
+    parser.add_argument('--targets', nargs='+', type=setting(str),
+                        default=[None])
+    parser.add_argument('--threads', nargs='+', type=setting(int),
+                        default=[None])
+    parser.add_argument('--conf-th', nargs='+', type=setting(float),
+                        default=[None])
+    parser.add_argument('--resolution', default=RESOLUTION)
+    parser.add_argument('--frames', type=int, default=FRAMES)
+    parser.add_argument('--warmup', type=int, default=WARMUP)
+    parser.add_argument('--video', help='recorded frames instead of the '
+                        'sample image')
+    parser.add_argument('--iou', type=float, default=IOU)
+    parser.add_argument('--min-agreement', type=float, default=MIN_AGREEMENT)
+    parser.add_argument('--output', help='JSON file of the results')
+    args = parser.parse_args(argv)
+
+    width, height = map(int, args.resolution.split('x'))
+    frames = list(recorded_frames(width, height, args.frames, args.video))
+    results = dict()
+    for model in args.models:
+        # the default settings first, they are the reference
+        specs = [ModelSpec.parse(model)] + [
+            spec for spec in grid(model, args.input_sizes, args.backends,
+                                  args.targets, args.threads, args.conf_th)
+            if spec.settings]
+        results[model] = sweep(specs, frames, args.warmup, args.iou)
+        chosen = best(model, results[model], args.min_agreement)
+        if chosen is None:
+            print('{}: no settings agree with the defaults'.format(model))
+            continue
+        print(config_entry(chosen))
+        results[model]['best'] = chosen
+
+    report = dict(date=datetime.now().isoformat(),
+                  python=sys.version.split()[0],
+                  resolution=args.resolution, frames=args.frames,
+                  video=args.video, iou=args.iou,
+                  min_agreement=args.min_agreement, results=results)
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_FOLDER, exist_ok=True)
+        output = os.path.join(RESULTS_FOLDER, 'sweep-{}.json'.format(
+            datetime.now().strftime('%Y%m%d%H%M%S')))
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('Results saved to {}'.format(output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
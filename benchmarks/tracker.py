@@ -0,0 +1,48 @@
+"""Cost of ``CentroidTracker.update`` with many simultaneous objects.
+
+    python -m benchmarks.tracker
+
+Each object moves a few pixels per frame, the tracker is warmed up with
+the first frames and the update time averaged over the next ones.
+"""
+import time
+import numpy as np
+from backend.centroidtracker import CentroidTracker, linear_sum_assignment
+
+SIZES = (10, 100, 1000)
+FRAMES = 20
+
+
+def scene(n, frames, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(0, 4000, size=(n, 2))
+    speeds = rng.uniform(-3, 3, size=(n, 2))
+    for _ in range(frames):
+        centers = centers + speeds
+        yield np.hstack([centers - 10, centers + 10]).astype(int)
+
+
+def run(n, **kwargs):
+    tracker = CentroidTracker(**kwargs)
+    frames = list(scene(n, FRAMES + 2))
+    for rects in frames[:2]:
+        tracker.update(rects)
+    start = time.perf_counter()
+    for rects in frames[2:]:
+        objects = tracker.update(rects)
+    elapsed = (time.perf_counter() - start) / FRAMES
+    assert len(objects) == n and tracker.nextObjectID == n
+    return 1000 * elapsed
+
+
+if __name__ == '__main__':
+    variants = [('greedy', dict(optimal=False)),
+                ('iou greedy', dict(optimal=False, metric='iou'))]
+    if linear_sum_assignment is not None:
+        variants += [('hungarian', dict(optimal=True)),
+                     ('iou hungarian', dict(optimal=True, metric='iou'))]
+    print('{:<16}'.format('objects') +
+          ''.join('{:>10}'.format(n) for n in SIZES))
+    for name, kwargs in variants:
+        print('{:<16}'.format(name + ' (ms)') +
+              ''.join('{:>10.2f}'.format(run(n, **kwargs)) for n in SIZES))
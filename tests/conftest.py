@@ -0,0 +1,13 @@
+import os
+import pytest
+
+
+@pytest.fixture
+def touch():
+    """Create empty files, like captured images, under a folder."""
+    def touch(folder, *names):
+        for name in names:
+            path = os.path.join(folder, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, 'w').close()
+    return touch
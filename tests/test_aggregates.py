@@ -0,0 +1,58 @@
+import os
+from backend.aggregates import Aggregates
+from backend.catalog import Catalog
+
+
+def test_aggregates(tmp_path, touch):
+    folder = str(tmp_path)
+    touch(folder,
+          'webcam/20200612/101530_person-dog_.jpg',
+          'webcam/20200701/090000_person_1-2_.jpg')
+    catalog = Catalog(os.path.join(folder, 'catalog.db'), folder)
+    snapshot = os.path.join(folder, 'aggregates.json')
+    aggregates = Aggregates(snapshot)
+    aggregates.sync(catalog)
+    assert aggregates.get('years') == {'2020': 2}
+    assert aggregates.get('year_month') == {'2020': {'06': 1, '07': 1}}
+    assert aggregates.get('detected_objects') == {'person': 2, 'dog': 1}
+    assert aggregates.get('tracking_objects') == {'1': 1, '2': 1}
+
+    path = os.path.join(folder, 'webcam/20210101/000000_cat_.jpg')
+    touch(folder, path)
+    catalog.add(path)
+    aggregates.sync(catalog)
+    assert aggregates.get('years') == {'2020': 2, '2021': 1}
+
+    # counts survive a restart
+    restarted = Aggregates(snapshot)
+    restarted.sync(catalog)
+    assert restarted.get('days') == {'12': 1, '01': 2}
+
+    os.remove(path)
+    assert catalog.remove(path)
+    restarted.remove(path)
+    assert restarted.get('years') == {'2020': 2}
+    assert 'cat' not in restarted.get('detected_objects')
+
+    catalog.rebuild()
+    restarted.sync(catalog)
+    assert restarted.get('hours') == {'10': 1, '09': 1}
+
+
+def test_aggregates_new_catalog(tmp_path, touch):
+    folder = str(tmp_path)
+    touch(folder, 'webcam/20200612/101530_person-dog_.jpg')
+    db_path = os.path.join(folder, 'catalog.db')
+    snapshot = os.path.join(folder, 'aggregates.json')
+    aggregates = Aggregates(snapshot)
+    aggregates.sync(Catalog(db_path, folder))
+    assert aggregates.get('years') == {'2020': 1}
+
+    # a new database starts over at the same generation
+    os.remove(db_path)
+    os.remove(os.path.join(folder, 'webcam/20200612/101530_person-dog_.jpg'))
+    touch(folder, 'webcam/20210101/000000_cat_.jpg')
+    restarted = Aggregates(snapshot)
+    restarted.sync(Catalog(db_path, folder))
+    assert restarted.get('years') == {'2021': 1}
+    assert restarted.get('detected_objects') == {'cat': 1}
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+from flask import Flask, Response, request
+from backend.aio import WsgiApp
+from backend.stream import MIMETYPE
+
+app = Flask(__name__)
+closed = threading.Event()
+
+
+@app.route('/echo', methods=['GET', 'POST'])
+def echo():
+    return '{} {}'.format(request.args.get('name'), request.get_data(
+        as_text=True))
+
+
+@app.route('/stream')
+def stream():
+    def chunks():
+        try:
+            while True:
+                yield b'frame'
+        finally:
+            closed.set()
+    return Response(chunks(), mimetype='text/plain')
+
+
+@app.route('/mjpeg')
+def mjpeg():
+    def chunks():
+        while True:
+            yield threading.current_thread().name.encode()
+    return Response(chunks(), mimetype=MIMETYPE)
+
+
+def call(path, query=b'', body=b'', method='GET', disconnect_after=None,
+         asgi_app=None):
+    scope = dict(type='http', method=method, path=path, query_string=query,
+                 headers=[(b'content-type', b'text/plain')],
+                 http_version='1.1')
+    messages = [dict(type='http.request', body=body)]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        while disconnect_after is None or len(sent) < disconnect_after:
+            await asyncio.sleep(0.001)
+        return dict(type='http.disconnect')
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.get_event_loop().run_until_complete(
+            (asgi_app or WsgiApp(app))(scope, receive, send))
+    return sent
+
+
+def test_request():
+    sent = call('/echo', query=b'name=front', body=b'hello', method='POST')
+    assert sent[0]['status'] == 200
+    assert b''.join(m.get('body', b'') for m in sent[1:]) == b'front hello'
+
+
+def test_stream_closed_on_disconnect():
+    sent = call('/stream', disconnect_after=5)
+    assert sent[1]['body'] == b'frame'
+    assert closed.wait(5)
+
+
+def test_mjpeg_chunks_read_in_stream_executor():
+    sent = call('/mjpeg', disconnect_after=3)
+    assert sent[1]['body'].startswith(b'stream')
+
+
+def test_single_image(monkeypatch):
+    import json
+    import numpy as np
+    from backend import asgi
+
+    class Camera():
+        def get_frame(self):
+            return np.zeros((4, 4, 3), dtype=np.uint8)
+
+        def prediction(self, frame, conf_th, conf_class):
+            self.predicted = threading.current_thread().name
+            return frame
+
+    camera = Camera()
+    monkeypatch.setattr('backend.app.cameras', {'front': camera})
+    monkeypatch.setattr(asgi, 'cameras', {'front': camera})
+    sent = call(asgi.SINGLE_IMAGE, query=b'cameraName=front&detection=true',
+                asgi_app=asgi.App(app))
+    assert sent[0]['status'] == 200
+    assert json.loads(sent[1]['body'])['img']
+    # the model runs in the cpu executor
+    assert camera.predicted.startswith('cpu')
+    sent = call(asgi.SINGLE_IMAGE, asgi_app=asgi.App(app))
+    assert json.loads(sent[1]['body']) == dict(msg='no image')
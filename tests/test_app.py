@@ -0,0 +1,38 @@
+import sys
+import subprocess
+
+LAZY_IMPORT = """
+import sys
+import backend.app
+import backend.config
+client = backend.app.create_app().test_client()
+assert client.get('/api/images').status_code == 200
+assert backend.config._config is None
+assert 'cv2' not in sys.modules and 'pandas' not in sys.modules
+"""
+
+
+def test_gallery_starts_without_cameras():
+    # a new interpreter, the other tests already imported OpenCV
+    subprocess.run([sys.executable, '-c', LAZY_IMPORT], check=True)
+
+
+def test_stats_routes_start_nothing(monkeypatch):
+    import backend.app
+    import backend.config
+    monkeypatch.setattr(backend.config, '_config', dict(
+        inference_service=True, model='cascade',
+        cameras=[dict(name='front', source=0)]))
+    client = backend.app.create_app().test_client()
+    assert client.get('/api/inference').json == dict(
+            msg='Inference service is not started')
+    assert client.get('/api/multiplex').json == dict(
+            msg='Multiplex task is not started')
+    assert client.get('/api/scheduler').json == dict(
+            front=dict(msg='Camera is not started'))
+    assert client.get('/api/motion_gate').json == dict(
+            front=dict(msg='Camera is not started'))
+    assert client.get('/api/storage').json == dict(
+            front=dict(msg='Camera is not started'))
+    assert backend.app.inference is None and backend.app.multiplexer is None
+    assert not backend.app.cameras.opened
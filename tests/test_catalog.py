@@ -0,0 +1,48 @@
+import os
+from backend.catalog import Catalog, parse_path, split_values
+
+
+def test_parse_path():
+    item = parse_path('imgs/webcam/20200612/101530_person-dog_.jpg')
+    assert item['camera'] == 'webcam'
+    assert (item['year'], item['month'], item['day']) == ('2020', '06', '12')
+    assert (item['hour'], item['minute']) == ('10', '15')
+    assert item['objects'] == ['person', 'dog']
+    assert item['tracking'] == []
+    item = parse_path('imgs/webcam/20200612/101530_person_3-4_.jpg')
+    assert item['tracking'] == [3, 4]
+    assert parse_path('imgs/image.jpeg') is None
+    assert split_values('1,12', 2) == ['01', '12']
+
+
+def test_catalog_query(tmp_path, touch):
+    folder = str(tmp_path)
+    touch(folder,
+          'webcam/20200612/101530_person-dog_.jpg',
+          'webcam/20200612/111530_dog_.jpg',
+          'webcam/20200701/090000_person_1-2_.jpg',
+          'pi/20210101/000000_cat_.jpg')
+    catalog = Catalog(os.path.join(folder, 'catalog.db'), folder)
+    assert len(catalog.query(page_size=10)) == 4
+
+    paths = catalog.query(page_size=10)
+    assert paths[0].endswith('20210101/000000_cat_.jpg')
+    assert paths[-1].endswith('101530_person-dog_.jpg')
+    assert catalog.query(page=1, page_size=3) == paths[3:]
+
+    assert len(catalog.query(years=['2020'])) == 3
+    assert len(catalog.query(months=['06'], hours=['11'])) == 1
+    assert len(catalog.query(date='20200612')) == 2
+    assert len(catalog.query(detected_object='person')) == 2
+    # names containing the filter, like the gallery's file name pattern
+    assert len(catalog.query(detected_object='do')) == 2
+    assert len(catalog.query(detected_object='%')) == 0
+    assert len(catalog.query(camera='pi')) == 1
+
+    new_path = os.path.join(folder, 'webcam/20200612/120000_person_.jpg')
+    touch(folder, 'webcam/20200612/120000_person_.jpg')
+    catalog.add(new_path)
+    assert len(catalog.query(date='20200612', detected_object='person')) == 2
+    assert catalog.remove(new_path)
+    assert not catalog.remove(new_path)
+    assert catalog.rebuild() == 5
@@ -0,0 +1,108 @@
+import sys
+import time
+import threading
+from backend.channel import FrameChannel
+
+
+def test_wait_newer():
+    channel = FrameChannel()
+    assert channel.wait_newer(0, timeout=0.01) == (0, None)
+    timer = threading.Timer(0.05, channel.publish, args=('frame',))
+    timer.start()
+    assert channel.wait_newer(0, timeout=5) == (1, 'frame')
+    channel.publish('other')
+    assert channel.wait_newer(1, timeout=0.01) == (2, 'other')
+
+
+def test_next_frame_bounded_clients():
+    channel = FrameChannel(max_clients=2)
+    channel.publish('frame')
+    assert channel.next_frame(timeout=0.01) == 'frame'
+    threads = [threading.Thread(target=channel.next_frame, args=(0.01,))
+               for i in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(channel.clients) <= 2
+
+
+def test_next_frame_info_counts_dropped():
+    channel = FrameChannel()
+    channel.publish('first', timestamp=1.0)
+    assert channel.next_frame_info(timeout=0.01) == ('first', 1.0, 0)
+    for i in range(3):
+        channel.publish(i, timestamp=2.0 + i)
+    # a slow reader gets the newest frame and the count of the skipped ones
+    assert channel.next_frame_info(timeout=0.01) == (2, 4.0, 2)
+
+
+def test_camera_thread_restarts_after_source_ends():
+    from backend.base_camera import BaseCamera
+
+    class Camera(BaseCamera):
+        starts = 0
+        released = 0
+
+        def frames(self):
+            self.starts += 1
+            yield 'frame'
+
+        def release(self):
+            self.released += 1
+
+    camera = Camera()
+    assert camera.get_frame(timeout=5) == 'frame'
+    deadline = time.time() + 5
+    while camera.thread is not None and time.time() < deadline:
+        time.sleep(0.01)
+    assert camera.thread is None and camera.released == 1
+    camera.get_frame(timeout=1)
+    assert camera.starts == 2
+
+
+def test_timeout_after_publish_returns_none():
+    channel = FrameChannel()
+    channel.publish('frame', timestamp=1.0)
+    assert channel.next_frame_info(timeout=0.01) == ('frame', 1.0, 0)
+    # a stalled producer must not hand out its last frame again
+    assert channel.next_frame_info(timeout=0.01) == (None, None, 0)
+    assert channel.next_frame(timeout=0.01) is None
+    assert channel.wait_newer(1, timeout=0.01) == (1, None)
+    channel.publish('next', timestamp=2.0)
+    assert channel.next_frame_info(timeout=0.01) == ('next', 2.0, 0)
+
+
+def test_camera_thread_started_once():
+    from backend.base_camera import BaseCamera
+
+    class Camera(BaseCamera):
+        starts = 0
+
+        def frames(self):
+            self.starts += 1
+            time.sleep(0.05)
+            yield 'frame'
+
+        def release(self):
+            pass
+
+    camera = Camera()
+    barrier = threading.Barrier(8)
+
+    def client():
+        barrier.wait()
+        camera.keepalive()
+
+    clients = [threading.Thread(target=client) for i in range(8)]
+    interval = sys.getswitchinterval()
+    # switch threads as often as possible to hit the race
+    sys.setswitchinterval(1e-6)
+    try:
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert camera.starts == 1
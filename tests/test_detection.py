@@ -13,9 +13,9 @@ def test_ssd():
     df = detector.filter_prediction(output, image)
     image = detector.draw_boxes(image, df)
     print(df)
-    assert df.shape[0] == 2
-    assert any(df['class_name'].str.contains('person'))
-    assert any(df['class_name'].str.contains('dog'))
+    assert len(df) == 2
+    assert df.contains('person')
+    assert df.contains('dog')
     cv2.imwrite("./imgs/outputcv.jpg", image)
 
 
@@ -27,11 +27,26 @@ def test_yolo():
     df = detector.filter_prediction(output, image)
     image = detector.draw_boxes(image, df)
     print(df)
-    assert df.shape[0] == 1
-    assert any(df['class_name'].str.contains('dog'))
+    assert len(df) == 1
+    assert df.contains('dog')
     cv2.imwrite("./imgs/outputcv.jpg", image)
 
 
+def test_batch():
+    image = cv2.imread("./imgs/image.jpeg")
+    images = [image, cv2.flip(image, 1)]
+
+    for Detector in (Detector_SSD, Detector_Yolo):
+        detector = Detector()
+        outputs = detector.predict_batch(images)
+        assert len(outputs) == 2
+        df = detector.filter_prediction(outputs[0], image)
+        df_single = detector.filter_prediction(
+                detector.prediction(image), image)
+        assert len(df) == len(df_single)
+        assert sorted(df['class_name']) == sorted(df_single['class_name'])
+
+
 def test_motion():
     image = cv2.imread("./imgs/image.jpeg")
     print(image.shape)
@@ -49,7 +64,7 @@ def test_motion():
     df = detector.filter_prediction(output, image)
     image = detector.draw_boxes(image, df)
     print(df)
-    assert df.shape[0] == 1
+    assert len(df) == 1
 
     cv2.imwrite("./imgs/outputcv.jpg", image)
 
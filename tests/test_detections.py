@@ -0,0 +1,26 @@
+import numpy as np
+from backend.detections import Detections, class_lookup
+
+
+def test_detections():
+    lookup = class_lookup({"1": "person", "18": "dog"})
+    detections = Detections.from_arrays(
+            [[0, 0, 10, 10], [5, 5, 20, 30], [1, 1, 2, 2]],
+            [18, 1, 7], np.array([0.9, 0.512, 0.6], dtype=np.float32),
+            lookup)
+    assert len(detections) == 3
+    assert detections.class_name.tolist() == ['dog', 'person', '7']
+    assert detections.label.tolist() == ['dog: 0.9', 'person: 0.51', '7: 0.6']
+    assert detections.contains('person|cat')
+    assert not detections.contains('cat')
+    assert detections.unique_classes() == ['dog', 'person', '7']
+    assert detections.boxes.tolist()[1] == [5, 5, 20, 30]
+    assert detections[detections['confidence'] > 0.7].class_name.tolist() == ['dog']
+    assert detections.to_frame().shape == (3, 8)
+
+
+def test_unscored_detections():
+    detections = Detections.from_arrays([[0, 0, 10, 10]], np.arange(1))
+    assert detections.label.tolist() == ['0']
+    assert len(Detections()) == 0
+    assert Detections().unique_classes() == []
@@ -0,0 +1,62 @@
+import cv2
+import pytest
+from backend.dnn import ModelSpec, network_size, configure, set_threads
+from benchmarks.sweep import agreement
+from backend.detections import Detections
+
+
+def test_model_spec():
+    assert ModelSpec.parse('cascade') == ModelSpec('cascade', ())
+    spec = ModelSpec.parse(dict(name='yolo_detection', threads=2,
+                                input_size=[320, 256]))
+    assert spec.settings == (('input_size', (320, 256)), ('threads', 2))
+    assert ModelSpec.parse(spec) is spec
+    assert str(spec) == 'yolo_detection(input_size=(320, 256), threads=2)'
+    # usable as a key of the loaded detectors
+    assert {spec: 1}[ModelSpec.parse(dict(
+        name='yolo_detection', input_size=[320, 256], threads=2))] == 1
+
+
+def test_network_size():
+    assert network_size(None, (300, 300)) == (300, 300)
+    assert network_size(320, (416, 416)) == (320, 320)
+    assert network_size([320, 256], (416, 416)) == (320, 256)
+
+
+def test_configure_unknown_backend():
+    class Model():
+        def setPreferableBackend(self, backend):
+            self.backend = backend
+
+        def setPreferableTarget(self, target):
+            self.target = target
+
+    model = Model()
+    configure(model, backend='opencv', target='cpu')
+    assert model.backend == cv2.dnn.DNN_BACKEND_OPENCV
+    assert model.target == cv2.dnn.DNN_TARGET_CPU
+    with pytest.raises(ValueError):
+        configure(model, backend='tpu')
+    with pytest.raises(ValueError):
+        configure(model, target='tpu')
+
+
+def test_agreement():
+    reference = Detections.from_arrays(
+            [[0, 0, 10, 10], [20, 20, 40, 40]], [1, 2])
+    assert agreement(reference, reference) == 1
+    shifted = Detections.from_arrays([[1, 1, 11, 11], [50, 50, 60, 60]],
+                                     [1, 2])
+    assert agreement(shifted, reference) == 0.5
+    other_class = Detections.from_arrays([[0, 0, 10, 10]], [2])
+    assert agreement(other_class, reference) == 0
+    assert agreement(Detections.from_arrays([], []), reference) == 0
+
+
+def test_set_threads_restores_default():
+    default = cv2.getNumThreads()
+    set_threads(1)
+    assert cv2.getNumThreads() == 1
+    # a detector without threads runs with the default of the process
+    set_threads(None)
+    assert cv2.getNumThreads() == default
@@ -0,0 +1,36 @@
+import os
+import pytest
+import multiprocessing
+import numpy as np
+from backend.framebuffer import FrameRing, shared_memory
+
+
+def reader(name, queue):
+    ring = FrameRing.attach(name, timeout=5)
+    seq, _, frame = ring.wait_newer(0, timeout=5)
+    queue.put((seq, int(frame[0, 0, 0]), frame.flags.writeable))
+    ring.close()
+
+
+@pytest.mark.skipif(shared_memory is None,
+                    reason='shared memory needs python 3.8 or newer')
+def test_frame_ring():
+    name = 'objdet_test_{}'.format(os.getpid())
+    ring = FrameRing.create(name, (4, 6, 3), slots=2)
+    assert ring.latest() == (0, None, None)
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=reader, args=(name, queue))
+    process.start()
+    frame = np.full((4, 6, 3), 7, dtype=np.uint8)
+    assert ring.write(frame, timestamp=1.0) == 1
+    assert queue.get(timeout=5) == (1, 7, False)
+    process.join()
+
+    ring.write(frame)
+    ring.write(frame)
+    assert not ring.is_valid(1)
+    assert ring.is_valid(3)
+    seq, _, latest = ring.latest()
+    assert seq == 3 and latest.shape == (4, 6, 3)
+    del latest
+    ring.close()
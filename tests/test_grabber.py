@@ -0,0 +1,80 @@
+import time
+import threading
+from backend.grabber import FrameGrabber
+
+
+class FakeCapture():
+    """Live source producing a frame every ``period`` seconds."""
+
+    def __init__(self, count, period=0.005):
+        self.count = count
+        self.period = period
+        self.grabbed = 0
+        self.retrieved = 0
+        self.properties = dict()
+
+    def set(self, prop, value):
+        self.properties[prop] = value
+
+    def grab(self):
+        time.sleep(self.period)
+        if self.grabbed == self.count:
+            return False
+        self.grabbed += 1
+        return True
+
+    def retrieve(self):
+        self.retrieved += 1
+        return True, self.grabbed
+
+
+def test_read_returns_newest_frame():
+    capture = FakeCapture(count=40)
+    grabber = FrameGrabber(capture)
+    seq, timestamp, frame = grabber.read(timeout=5)
+    assert frame == seq and timestamp <= time.time()
+    # the source keeps going while the reader is busy
+    time.sleep(0.05)
+    seq2, _, frame2 = grabber.read(timeout=5)
+    assert frame2 == seq2 and seq2 > seq + 1
+    assert grabber.dropped == seq2 - 2
+    grabber.close()
+    # only the frames asked for were decoded
+    assert capture.retrieved == 2
+
+
+def test_read_after_end_of_stream():
+    grabber = FrameGrabber(FakeCapture(count=1))
+    reader = threading.Thread(target=grabber.read, args=(5,))
+    reader.start()
+    reader.join()
+    assert grabber.read(timeout=5) == (grabber.frame_seq, None, None)
+    grabber.close()
+
+
+class StalledCapture(FakeCapture):
+    """Source stalling after its first frames until it is released."""
+
+    def __init__(self, count):
+        super().__init__(count)
+        self.released = threading.Event()
+
+    def grab(self):
+        if self.grabbed == self.count:
+            self.released.wait()
+            return False
+        return super().grab()
+
+    def release(self):
+        self.released.set()
+
+
+def test_close_stalled_source():
+    capture = StalledCapture(count=1)
+    grabber = FrameGrabber(capture)
+    assert grabber.read(timeout=5)[2] == 1
+    assert grabber.read(timeout=0.1)[2] is None
+    start = time.time()
+    grabber.close(timeout=0.1)
+    assert capture.released.is_set() and time.time() - start < 1
+    assert not grabber.thread.is_alive()
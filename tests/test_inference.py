@@ -0,0 +1,38 @@
+import pytest
+import numpy as np
+from backend.inference import InferenceService
+
+
+@pytest.fixture(scope='module')
+def service():
+    service = InferenceService(['cascade'], batch_size=2)
+    service.start()
+    yield service
+    service.stop()
+
+
+def test_detect(service):
+    client = service.client()
+    image = np.zeros((120, 160, 3), dtype=np.uint8)
+    assert len(client.detect('cascade', image)) == 0
+    results = client.detect_batch('cascade', [image] * 3)
+    assert [len(result) for result in results] == [0, 0, 0]
+
+
+def test_load_error_reaches_caller(service):
+    client = service.client()
+    with pytest.raises(ImportError):
+        client.detect('no_such_model', np.zeros((8, 8, 3), dtype=np.uint8))
+    # the service keeps serving the other models
+    assert len(client.detect(
+        'cascade', np.zeros((120, 160, 3), dtype=np.uint8))) == 0
+
+
+def test_stats(service):
+    client = service.client()
+    client.detect_batch('cascade', [np.zeros((120, 160, 3),
+                                             dtype=np.uint8)] * 2)
+    stats = service.stats['cascade']
+    assert stats['requests'] >= 2
+    assert 1 <= stats['batch_size'] <= 2
+    assert stats['latency_p95_ms'] >= 0
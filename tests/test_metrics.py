@@ -0,0 +1,41 @@
+import os
+import multiprocessing
+from backend.metrics import Registry
+
+
+def record(registry, ready, done):
+    registry.inc('frames_total', camera='webcam')
+    registry.observe('stage_seconds', 0.2, stage='inference')
+    registry.flush()
+    ready.set()
+    done.wait(5)
+
+
+def test_registry(tmp_path):
+    registry = Registry(folder=os.path.join(str(tmp_path), 'metrics'))
+    registry.inc('frames_total', camera='webcam')
+    registry.inc('detections_total', 2, camera='webcam', **{'class': 'person'})
+    registry.observe('stage_seconds', 0.003, stage='inference')
+    with registry.timer('stage_seconds', stage='draw'):
+        pass
+
+    # a task process forked from the web server
+    ready, done = multiprocessing.Event(), multiprocessing.Event()
+    process = multiprocessing.Process(target=record,
+                                      args=(registry, ready, done))
+    process.start()
+    assert ready.wait(5)
+    text = registry.render()
+    done.set()
+    process.join()
+    assert 'objdet_frames_total{camera="webcam"} 2' in text
+    assert 'objdet_detections_total{camera="webcam",class="person"} 2' in text
+    assert '# TYPE objdet_stage_seconds histogram' in text
+    assert 'objdet_stage_seconds_bucket{stage="inference",le="0.005"} 1' in text
+    assert 'objdet_stage_seconds_bucket{stage="inference",le="0.25"} 2' in text
+    assert 'objdet_stage_seconds_count{stage="draw"} 1' in text
+
+    # the snapshot of a finished task is dropped
+    counters, _ = registry.collect()
+    assert counters[('frames_total', (('camera', 'webcam'),))] == 1
+    assert not os.listdir(registry.folder)
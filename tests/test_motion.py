@@ -0,0 +1,16 @@
+import numpy as np
+from backend.motion import MotionGate
+
+
+def test_motion_gate():
+    gate = MotionGate(min_area=100, follow_up=2, scale=0.5)
+    still = np.zeros((120, 160, 3), dtype=np.uint8)
+    moving = still.copy()
+    moving[20:80, 40:100] = 255
+    assert not gate.allow(still)
+    assert gate.allow(moving)
+    # the scene is static again, two follow up frames go through
+    assert gate.allow(moving)
+    assert gate.allow(moving)
+    assert not gate.allow(moving)
+    assert gate.stats() == dict(gated=2, inferred=3)
@@ -0,0 +1,40 @@
+import threading
+import numpy as np
+from backend.detections import Detections
+from backend.overlay import LabelSprites, detections_overlay
+
+
+def test_label_sprites():
+    sprites = LabelSprites(maxsize=2)
+    patch = sprites.get('person: 0.8', (0, 0, 255))
+    assert sprites.get('person: 0.8', (0, 0, 255)) is patch
+    sprites.get('dog: 0.5', (0, 0, 255))
+    sprites.get('cat: 0.5', (0, 0, 255))
+    assert len(sprites.patches) == 2
+    assert ('person: 0.8', (0, 0, 255)) not in sprites.patches
+
+
+def test_label_sprites_threads():
+    sprites = LabelSprites(maxsize=8)
+
+    def draw():
+        for i in range(500):
+            sprites.get('id {}'.format(i % 20), (0, 255, 0))
+
+    threads = [threading.Thread(target=draw) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(sprites.patches) == 8
+
+
+def test_compose_keeps_frame():
+    frame = np.zeros((120, 160, 3), dtype=np.uint8)
+    detections = Detections.from_arrays(
+            [[10, 10, 60, 80]], [1], np.array([0.9], dtype=np.float32))
+    overlay = detections_overlay(detections, np.full((100, 3), 255.0))
+    annotated = overlay.compose(frame)
+    assert frame.sum() == 0
+    assert annotated.sum() > 0
+    assert (annotated[10, 10:60] == 255).all()
@@ -0,0 +1,38 @@
+import os
+import gc
+import multiprocessing
+from backend import preload
+from backend.dnn import ModelSpec
+
+
+def forked_detector(queue):
+    queue.put(id(preload.get_detector('cascade')))
+
+
+def test_forked_task_reuses_preloaded_model():
+    preload.preload(['cascade', 'motion'])
+    gc.unfreeze()
+    assert set(preload.timings) == {'cascade'}
+    detector = preload.preloaded[ModelSpec.parse('cascade')]
+    # the web server keeps loading its own detectors
+    assert preload.get_detector('cascade') is not detector
+    queue = multiprocessing.get_context('fork').Queue()
+    task = multiprocessing.get_context('fork').Process(
+            target=forked_detector, args=(queue,))
+    task.start()
+    assert queue.get(timeout=10) == id(detector)
+    task.join()
+
+
+def test_memory():
+    usage = preload.memory(os.getpid())
+    if usage is not None:
+        assert usage['rss_mb'] >= usage['shared_mb'] > 0
+
+
+def test_freeze_only_when_loading():
+    preload.preload(['cascade'])
+    gc.unfreeze()
+    # the models are loaded, nothing new to keep out of the collections
+    preload.preload(['cascade', 'motion'])
+    assert gc.get_freeze_count() == 0
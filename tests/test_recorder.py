@@ -0,0 +1,64 @@
+import os
+import cv2
+import numpy as np
+from backend.recorder import EventRecorder, clip_path
+
+
+def frames(recorder, start, end, fps=10):
+    for i in range(int(start * fps), int(end * fps)):
+        frame = np.full((32, 48, 3), i % 256, dtype=np.uint8)
+        recorder.add(frame, timestamp=i / fps)
+
+
+def count_frames(filename):
+    video = cv2.VideoCapture(filename)
+    count = 0
+    while video.read()[0]:
+        count += 1
+    return count
+
+
+def test_event_clip(tmp_path):
+    poster = os.path.join(str(tmp_path), 'day', '120000_person_.jpg')
+    clip = clip_path(poster)
+    assert clip.endswith('120000_person_.avi')
+    recorder = EventRecorder(pre_roll=1, post_roll=1, fps=10)
+    frames(recorder, 0, 5)
+    assert recorder.trigger(clip, timestamp=5)
+    frames(recorder, 5, 6.5)
+    # within pre roll of the end, merged into the same clip
+    assert not recorder.trigger(clip + '.other', timestamp=6.5)
+    frames(recorder, 6.5, 10)
+    assert recorder.clip is None
+    recorder.stop()
+    # 4 to 7.5 s, pre roll, events and post roll
+    assert count_frames(clip) == 36
+
+
+def test_batch_task_starts_recorders(monkeypatch):
+    from backend import camera as camera_module
+
+    class Stop(Exception):
+        pass
+
+    class Camera():
+        started = False
+
+        def start_recorder(self):
+            self.started = True
+
+        def capture_image(self):
+            # the clips of the saved detections are fed by the recorders
+            assert self.started
+            raise Stop()
+
+    monkeypatch.setattr(camera_module, 'get_config',
+                        lambda: dict(beat_interval=0.01, model='cascade'))
+    monkeypatch.setattr(camera_module, 'get_detector', lambda model: None)
+    monkeypatch.setattr(camera_module, 'budget', None)
+    cameras = [Camera(), Camera()]
+    try:
+        camera_module.PeriodicBatchCapture(cameras)
+    except Stop:
+        pass
+    assert all(camera.started for camera in cameras)
@@ -0,0 +1,41 @@
+import pytest
+import numpy as np
+from backend.detections import Detections
+from backend.regions import Regions
+
+
+def test_split_and_join():
+    image = np.full((100, 200, 3), 255, dtype=np.uint8)
+    regions = Regions(roi=[[0, 0, 100, 100], [150, 50, 250, 100]],
+                      mask=[[[0, 0], [20, 0], [20, 20], [0, 20]]])
+    crops, offsets = regions.split(image)
+    assert [crop.shape for crop in crops] == [(100, 100, 3), (50, 50, 3)]
+    assert offsets == [(0, 0), (150, 50)]
+    assert crops[0][5, 5].sum() == 0
+    assert crops[0][50, 50].sum() == 255 * 3
+    assert image[5, 5].sum() == 255 * 3
+
+    found = [Detections.from_arrays([[1, 2, 3, 4]], [1], [0.9]),
+             Detections.from_arrays([[10, 10, 20, 30]], [2], [0.8])]
+    detections = Regions.join(found, offsets)
+    assert detections.boxes.tolist() == [[1, 2, 3, 4], [160, 60, 170, 80]]
+    assert detections['class_id'].tolist() == [1, 2]
+
+
+def test_join_overlapping_crops():
+    offsets = [(0, 0), (50, 0)]
+    # the same person seen by both crops, and a dog in the overlap
+    found = [Detections.from_arrays([[60, 10, 90, 80], [55, 5, 65, 15]],
+                                    [1, 2], [0.7, 0.6]),
+             Detections.from_arrays([[11, 11, 41, 81]], [1], [0.9])]
+    detections = Regions.join(found, offsets)
+    assert detections.boxes.tolist() == [[55, 5, 65, 15], [61, 11, 91, 81]]
+    assert detections['confidence'].tolist() == pytest.approx([0.6, 0.9])
+
+
+def test_whole_frame():
+    image = np.zeros((10, 10, 3), dtype=np.uint8)
+    regions = Regions()
+    assert not regions
+    crops, offsets = regions.split(image)
+    assert crops[0] is image and offsets == [(0, 0)]
@@ -0,0 +1,97 @@
+import time
+import pytest
+from backend.scheduler import BeatScheduler, CpuBudget, FairScheduler
+
+
+def test_beat_subtracts_processing_time():
+    scheduler = BeatScheduler('test', 0.05, active_interval=0.05)
+    scheduler.start()
+    start = time.time()
+    for _ in range(5):
+        time.sleep(0.03)
+        scheduler.beat()
+    # five beats of 50 ms, not five times 30 + 50 ms
+    assert time.time() - start == pytest.approx(0.25, abs=0.04)
+    # the rate is known before the first log interval
+    assert scheduler.stats()['rate'] == pytest.approx(20, rel=0.2)
+
+
+def test_interval_follows_activity():
+    scheduler = BeatScheduler('test', 1, active_interval=0.5, max_interval=3,
+                              active_for=10, idle_after=60, backoff=2)
+    scheduler.start()
+    now = scheduler.last_active
+    assert scheduler.next_interval(now, active=True) == 0.5
+    assert scheduler.next_interval(now + 20, active=False) == 1
+    assert scheduler.next_interval(now + 70, active=False) == 2
+    assert scheduler.next_interval(now + 72, active=False) == 3
+    assert scheduler.next_interval(now + 75, active=False) == 3
+    assert scheduler.next_interval(now + 76, active=True) == 0.5
+
+
+def test_budget_stretches_intervals():
+    budget = CpuBudget(cores=1)
+    first, second = budget.claim(), budget.claim()
+    assert first != second
+    budget.update(first, 0.5)
+    assert budget.factor() == 1
+    budget.update(second, 1.5)
+    assert budget.factor() == 2
+    budget.release(second)
+    assert budget.factor() == 1
+    assert budget.claim() == second
+
+
+def serve(scheduler, turns, duration=0):
+    served = []
+    for _ in range(turns):
+        served.append(scheduler.next())
+        time.sleep(duration)
+        scheduler.done()
+    return served
+
+
+def test_fair_scheduler_weighted_round_robin():
+    scheduler = FairScheduler()
+    scheduler.add('front', priority=2)
+    scheduler.add('back')
+    scheduler.add('garden')
+    served = serve(scheduler, 40)
+    assert served.count('front') == 20
+    assert served.count('back') == served.count('garden') == 10
+    stats = scheduler.stats()
+    assert stats['front']['served'] == 20
+    assert stats['back']['fps'] > 0
+
+
+def test_fair_scheduler_max_rate_and_deadline():
+    scheduler = FairScheduler()
+    scheduler.add('limited', max_rate=20)
+    scheduler.add('busy')
+    start = time.time()
+    served = serve(scheduler, 50, duration=0.002)
+    elapsed = time.time() - start
+    # the time the limited camera leaves goes to the busy one
+    assert served.count('limited') <= 20 * elapsed + 1
+    assert served.count('busy') > served.count('limited')
+
+    scheduler = FairScheduler()
+    scheduler.add('urgent', priority=1, deadline=0.001)
+    scheduler.add('heavy', priority=100)
+    served = serve(scheduler, 20, duration=0.002)
+    assert served.count('urgent') >= 5
+    assert scheduler.stats()['urgent']['missed'] > 0
+
+
+def test_fair_scheduler_retry_after():
+    scheduler = FairScheduler()
+    scheduler.add('dead')
+    scheduler.add('alive')
+    served = []
+    for _ in range(10):
+        name = scheduler.next()
+        served.append(name)
+        scheduler.done(retry_after=60 if name == 'dead' else 0)
+    # the failed camera sits out, the other one keeps its turns
+    assert served.count('dead') == 1
+    assert served.count('alive') == 9
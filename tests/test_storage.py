@@ -0,0 +1,42 @@
+import os
+import threading
+import numpy as np
+from backend.overlay import Overlay
+from backend.storage import StorageWriter
+from backend.metrics import registry as metrics
+
+
+def test_storage_writer(tmp_path):
+    writer = StorageWriter(queue_size=4, camera='front')
+    stored = []
+    image = np.zeros((10, 10, 3), dtype=np.uint8)
+    overlay = Overlay()
+    overlay.add_boxes([[0, 0, 9, 9]], [(255, 255, 255)])
+    filename = os.path.join(str(tmp_path), 'day', 'image.jpg')
+    assert writer.submit(filename, image, overlay,
+                         lambda name, img: stored.append((name, img)))
+    writer.join()
+    assert os.path.getsize(filename) > 0
+    assert stored[0][0] == filename and stored[0][1].max() > 0
+    assert image.max() == 0
+    stats = writer.stats()
+    assert stats['written'] == 1 and stats['dropped'] == 0
+    # labelled like the stages recorded by the camera
+    for stage in ('draw', 'storage'):
+        assert metrics.key('stage_seconds', stage=stage, camera='front') \
+            in metrics.histograms
+
+
+def test_storage_drop(tmp_path):
+    writer = StorageWriter(queue_size=1)
+    writer.start()
+    blocked = os.path.join(str(tmp_path), 'blocked.jpg')
+    image = np.zeros((10, 10, 3), dtype=np.uint8)
+    # keep the writer busy until the queue is full
+    release = threading.Event()
+    writer.submit(blocked, image, callback=lambda *args: release.wait(5))
+    results = [writer.submit(blocked, image) for _ in range(5)]
+    release.set()
+    writer.join()
+    assert not all(results)
+    assert writer.stats()['dropped'] == results.count(False)
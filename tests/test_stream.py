@@ -0,0 +1,18 @@
+from backend.stream import FrameBroadcast
+
+
+def test_viewer_counted_until_closed():
+    broadcast = FrameBroadcast()
+    chunks = broadcast.subscribe(timeout=0.01)
+    # counted before the first chunk is read
+    assert broadcast.viewers == 1 and broadcast.idle_for() == 0
+    chunks.close()
+    chunks.close()
+    assert broadcast.viewers == 0
+
+    chunks = broadcast.subscribe(timeout=0.01)
+    broadcast.publish(b'jpeg')
+    assert next(chunks).startswith(b'--frame')
+    assert next(chunks) == b'jpeg'
+    chunks.close()
+    assert broadcast.viewers == 0
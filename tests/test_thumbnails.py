@@ -0,0 +1,25 @@
+import os
+import cv2
+import numpy as np
+from backend.thumbnails import ThumbnailCache
+
+
+def test_thumbnail_cache(tmp_path):
+    source = os.path.join(str(tmp_path), 'image.jpg')
+    cv2.imwrite(source, cv2.imread('./imgs/image.jpeg'))
+    cache = ThumbnailCache(os.path.join(str(tmp_path), 'cache'))
+
+    data = cache.get(source, w='32', h='24')
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), 1)
+    assert image.shape == (24, 32, 3)
+    entry = cache.entry(source, w=32, h=24)
+    assert os.path.exists(entry)
+    assert cache.get(source, w=32, h=24) == data
+
+    cache.invalidate(source)
+    assert not os.path.exists(entry)
+
+    cache.max_bytes = len(data) * 2
+    for size in range(8, 16):
+        cache.get(source, w=size, h=size)
+    assert cache.size <= cache.max_bytes
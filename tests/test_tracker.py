@@ -0,0 +1,55 @@
+import numpy as np
+from backend.centroidtracker import CentroidTracker, greedy_assignment
+
+
+def boxes(*centers):
+    return [[x - 5, y - 5, x + 5, y + 5] for x, y in centers]
+
+
+def test_crossing_objects():
+    tracker = CentroidTracker(optimal=False)
+    tracker.update(boxes((0, 0), (100, 0), (200, 0)))
+    objects = tracker.update(boxes((205, 0), (4, 0), (103, 0)))
+    assert {k: v.tolist() for k, v in objects.items()} == {
+        0: [4, 0], 1: [103, 0], 2: [205, 0]}
+
+
+def test_gating_and_disappearance():
+    tracker = CentroidTracker(maxDisappeared=1, maxDistance=20)
+    tracker.update(boxes((0, 0)))
+    objects = tracker.update(boxes((300, 300)))
+    assert list(objects) == [0, 1]
+    assert tracker.disappeared == {0: 1, 1: 0}
+    assert list(tracker.update(boxes((301, 300)))) == [1]
+    assert list(tracker.update([])) == [1]
+    assert tracker.update([]) == {}
+
+
+def test_iou_metric_and_growth():
+    tracker = CentroidTracker(metric='iou', maxDistance=0.9, capacity=2)
+    centers = [(i * 50, 0) for i in range(10)]
+    tracker.update(boxes(*centers))
+    objects = tracker.update(boxes(*[(x + 2, y) for x, y in centers]))
+    assert sorted(objects) == list(range(10))
+    assert tracker.nextObjectID == 10
+
+
+def test_greedy_assignment():
+    cost = np.array([[1., 2.], [0.5, 10.], [3., 4.]])
+    rows, cols = greedy_assignment(cost)
+    assert sorted(zip(rows.tolist(), cols.tolist())) == [(0, 1), (1, 0)]
+
+
+def test_predict_between_detections():
+    tracker = CentroidTracker()
+    tracker.update(boxes((0, 0)))
+    tracker.update(boxes((10, 0)))
+    assert tracker.predict()[0].tolist() == [15, 0]
+    assert tracker.drift() == 5
+    # 30 pixels in three steps, averaged with the previous estimate
+    tracker.predict()
+    objects = tracker.update(boxes((40, 0)))
+    assert objects[0].tolist() == [40, 0]
+    assert tracker.velocity[0].tolist() == [7.5, 0]
+    ids, tracked = tracker.tracks()
+    assert ids.tolist() == [0] and tracked.tolist() == [[35, -5, 45, 5]]